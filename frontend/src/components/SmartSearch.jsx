@@ -33,9 +33,8 @@ const SmartSearch = () => {
             }
             setLoading(true);
             try {
-                // Using existing search API
-                const res = await axios.get(`${API_BASE_URL}/api/stocks/?search=${query}`);
-                // API paginates, so results are in res.data.results
+                // Lightweight typeahead endpoint (in-memory index, no prices/scores computed)
+                const res = await axios.get(`${API_BASE_URL}/api/stocks/suggest/`, { params: { q: query } });
                 setResults(res.data.results || []);
                 setIsOpen(true);
             } catch (err) {
@@ -45,7 +44,7 @@ const SmartSearch = () => {
             }
         };
 
-        const timeoutId = setTimeout(fetchResults, 300); // Debounce
+        const timeoutId = setTimeout(fetchResults, 150); // Debounce
         return () => clearTimeout(timeoutId);
     }, [query]);
 
@@ -84,7 +83,7 @@ const SmartSearch = () => {
                                 <div className="text-gray-400 text-xs truncate max-w-[150px]">{stock.company_name}</div>
                             </div>
                             <div className="text-right">
-                                <div className="font-mono text-neon-green font-bold">₹{stock.current_price}</div>
+                                <div className="text-gray-400 text-xs truncate max-w-[120px]">{stock.sector}</div>
                                 {stock.health_badge === "Strong Buy" && (
                                     <div className="text-[10px] text-neon-green bg-neon-green/10 px-1 rounded inline-block">BUY</div>
                                 )}
@@ -26,9 +26,23 @@ const StockDetail = () => {
         };
 
         fetchStockData(true);
-        const interval = setInterval(() => fetchStockData(false), 5000);
 
-        return () => clearInterval(interval);
+        // Live updates: refetch when the server pushes a price / score / news delta.
+        // Fall back to polling if the backend can't stream (e.g. served over WSGI).
+        let interval = null;
+        const source = new EventSource(`${API_BASE_URL}/api/stocks/stream/?tickers=${encodeURIComponent(ticker)}`);
+        const onDelta = () => fetchStockData(false);
+        ['price', 'score', 'news'].forEach(event => source.addEventListener(event, onDelta));
+        source.onerror = () => {
+            if (source.readyState === EventSource.CLOSED && !interval) {
+                interval = setInterval(() => fetchStockData(false), 5000);
+            }
+        };
+
+        return () => {
+            source.close();
+            if (interval) clearInterval(interval);
+        };
     }, [ticker]);
 
     if (loading) return <div className="h-96 flex items-center justify-center"><Loader2 className="animate-spin text-blue-600" /></div>;
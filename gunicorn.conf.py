@@ -0,0 +1,19 @@
+"""
+gunicorn settings, picked up from the working directory (render.yaml's startCommand).
+
+The app is loaded once in the master and then forked, so the warm-up
+(stocks/warmup.py) runs once and every worker shares its imports, lexicon,
+index and cached rows copy-on-write instead of building its own.
+"""
+import gc
+import os
+
+preload_app = True
+
+# Heavy imports and the lexicon are worth building in the master, the workers inherit them
+os.environ.setdefault("WARMUP_STEPS", "imports,lexicon,scores,search,rows")
+
+
+def when_ready(server):
+    # Keep the collector from touching (and so copying) the preloaded objects in every worker
+    gc.freeze()
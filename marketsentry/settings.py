@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 
 
 import os
+import sys
 from pathlib import Path
 import dj_database_url
 
@@ -48,6 +49,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "stocks.perf.PerfMiddleware",  # First, so its timings cover everything below
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware", # Add WhiteNoise
     "corsheaders.middleware.CorsMiddleware",  # Add this before CommonMiddleware
@@ -128,6 +130,50 @@ STATIC_URL = "static/"
 STATIC_ROOT = BASE_DIR / "staticfiles"
 STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
+# Cache
+# Responses are cached per data version (see stocks/cache.py). The versions are bumped by
+# ingestion jobs and management commands running in other processes, so the cache has to be
+# shared by every gunicorn worker and command: it lives in CACHE_DIR (default .cache/ in the
+# project). A per-process cache (LocMem) would keep serving the old data after a bump.
+# Data versions are written with a plain set of a clock-based value rather than incr() (a get +
+# set on this backend, not atomic across processes), see stocks/cache.py.
+CACHE_DIR = os.environ.get("CACHE_DIR") or str(BASE_DIR / ".cache")
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": CACHE_DIR,
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    }
+}
+# The test suite clears the cache all the time, it gets its own instead of the project's
+if sys.argv[1:2] == ["test"]:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "marketsentry-tests",
+        }
+    }
+
+# Ingestion jobs queued through /api/stocks/setup/ingest/ are drained by `manage.py run_jobs`.
+# Hosts without a separate worker process can opt in to draining them on a background thread of the
+# web process instead (INGEST_EMBEDDED_WORKER=True). Off by default: the thread runs a whole job
+# with its own connection inside every web worker that receives an ingest request.
+INGEST_EMBEDDED_WORKER = os.environ.get("INGEST_EMBEDDED_WORKER", "False").lower() == "true"
+# Providers the unauthenticated ingest endpoint may queue; the synthetic 'fake' one is for
+# management commands and tests only
+INGEST_HTTP_PROVIDERS = ["yahoo"]
+
+# Optional memory-mapped copy of the price history (see stocks/store.py), shared by all workers.
+# Ingestion keeps it up to date; `manage.py build_price_store` regenerates it from the database.
+PRICE_STORE_DIR = os.environ.get("PRICE_STORE_DIR") or None
+
+# Requests slower than this (ms) are logged with their query breakdown (see stocks/perf.py)
+PERF_SLOW_REQUEST_MS = float(os.environ.get("PERF_SLOW_REQUEST_MS", "500"))
+
+# Structures built at boot, before the first request (see stocks/warmup.py). gunicorn.conf.py
+# adds the imports / lexicon steps, which only pay off when preload_app shares them with the workers.
+WARMUP_STEPS = [step.strip() for step in os.environ.get("WARMUP_STEPS", "scores,search,rows").split(",") if step.strip()]
+
 # CORS Settings
 CORS_ALLOW_ALL_ORIGINS = True # For now allow all, or configure specifics via env
 
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "marketsentry.settings")
 
 application = get_wsgi_application()
+
+# Build caches / indexes before serving (once in the master when gunicorn preloads the app)
+from stocks.warmup import warm_up_on_boot  # noqa: E402
+
+warm_up_on_boot()
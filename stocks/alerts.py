@@ -0,0 +1,119 @@
+"""
+Watchlist alert engine.
+
+After an ingest batch every changed ticker is checked against its watchlist
+thresholds. A threshold T is crossed on bar i when the close moved through it:
+
+    up:    close[i-1] <  T <= close[i]
+    down:  close[i-1] >  T >= close[i]
+
+All the bars a batch added for a ticker span [low, high], so the candidate
+rows come from a single range query per ticker on the (ticker, alert_price)
+index; scanning the whole watchlist table is never needed. Each bar's
+crossings are a contiguous slice of the sorted thresholds (two
+searchsorted calls). A crossing is stored once per (watchlist row, bar,
+direction): re-ingesting the same day is a no-op.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.db.models import BigIntegerField, F
+from django.db.models.functions import Cast, Round
+
+from .history import from_days, load_histories, to_days
+from .models import FiredAlert, Watchlist
+
+# How far before the first new bar we look for the previous close (weekends, holidays)
+BASELINE_LOOKBACK = timedelta(days=14)
+
+
+def crossings(thresholds, closes):
+    """
+    thresholds: sorted int64 paise, closes: int64 paise (baseline close first).
+    Yields (bar index into closes, direction, slice of thresholds) for every bar that crossed any.
+    """
+    for i in range(1, len(closes)):
+        previous, close = closes[i - 1], closes[i]
+        if close > previous:
+            lo = np.searchsorted(thresholds, previous, side='right')
+            hi = np.searchsorted(thresholds, close, side='right')
+            direction = FiredAlert.UP
+        elif close < previous:
+            lo = np.searchsorted(thresholds, close, side='left')
+            hi = np.searchsorted(thresholds, previous, side='left')
+            direction = FiredAlert.DOWN
+        else:
+            continue
+        if hi > lo:
+            yield i, direction, slice(lo, hi)
+
+
+def evaluate_alerts(start_dates):
+    """
+    Checks the bars stored on or after start_dates[ticker] (the first bar of the last ingest).
+    Returns {'checked': watchlist rows looked at, 'fired': new FiredAlert rows, 'duplicates': already recorded}.
+    """
+    report = {'checked': 0, 'fired': 0, 'duplicates': 0}
+    if not start_dates:
+        return report
+
+    histories = load_histories(list(start_dates), min(start_dates.values()) - BASELINE_LOOKBACK)
+    candidates = []
+    for ticker, start in start_dates.items():
+        history = histories.get(ticker)
+        if history is None:
+            continue
+        first_new = int(np.searchsorted(history['dates'], to_days(start), side='left'))
+        if first_new == 0:
+            continue  # no close before the batch to compare against
+        dates = history['dates'][first_new - 1:]
+        closes = np.rint(history['close'][first_new - 1:] * 100).astype(np.int64)
+        if len(closes) < 2 or closes.min() == closes.max():
+            continue  # nothing new, or the price never moved
+
+        low, high = Decimal(int(closes.min())).scaleb(-2), Decimal(int(closes.max())).scaleb(-2)
+        rows = np.array(
+            Watchlist.objects.filter(ticker=ticker, alert_price__gte=low, alert_price__lte=high)
+            .annotate(alert_paise=Cast(Round(F('alert_price') * 100), BigIntegerField()))
+            .order_by('alert_price').values_list('id', 'alert_paise'),
+            dtype=np.int64,
+        ).reshape(-1, 2)
+        report['checked'] += len(rows)
+        if not len(rows):
+            continue
+        ids, thresholds = rows[:, 0], rows[:, 1]
+
+        for i, direction, hits in crossings(thresholds, closes):
+            bar = (ticker, from_days(dates[i]), direction, int(closes[i - 1]), int(closes[i]))
+            candidates.extend((watchlist_id, threshold, bar) for watchlist_id, threshold
+                              in zip(ids[hits].tolist(), thresholds[hits].tolist()))
+
+    if not candidates:
+        return report
+
+    # Leave out crossings that were already recorded: one range query over the batch's tickers,
+    # the exact bars are matched here (an OR term per bar overflows SQLite's expression depth)
+    bars = {bar[:3] for _, _, bar in candidates}
+    existing = {
+        (watchlist_id, day, direction)
+        for watchlist_id, ticker, day, direction in FiredAlert.objects.filter(
+            ticker__in={ticker for ticker, _, _ in bars}, date__gte=min(day for _, day, _ in bars),
+        ).order_by().values_list('watchlist_id', 'ticker_id', 'date', 'direction')
+        if (ticker, day, direction) in bars
+    }
+    fresh = [
+        FiredAlert(
+            watchlist_id=watchlist_id, ticker_id=ticker, date=day, direction=direction,
+            threshold=Decimal(threshold).scaleb(-2),
+            previous_close=Decimal(previous_close).scaleb(-2),
+            close=Decimal(close).scaleb(-2),
+        )
+        for watchlist_id, threshold, (ticker, day, direction, previous_close, close) in candidates
+        if (watchlist_id, day, direction) not in existing
+    ]
+    # The unique constraint still guards against a concurrent run
+    FiredAlert.objects.bulk_create(fresh, batch_size=1000, ignore_conflicts=True)
+    report['fired'] = len(fresh)
+    report['duplicates'] = len(candidates) - len(fresh)
+    return report
@@ -0,0 +1,69 @@
+"""
+Cross-stock analytics for the compare endpoint.
+
+Histories are aligned on one trading calendar (the union of every ticker's
+dates, gaps forward-filled, starting once every ticker has a price) so all
+metrics and the correlation matrix are computed on the same days as
+whole-matrix NumPy operations.
+"""
+import numpy as np
+
+from .history import from_days
+
+TRADING_DAYS = 252
+
+
+def align_closes(histories):
+    """DataFrame of close prices, one column per ticker (in the given order), indexed by date."""
+    import pandas as pd  # kept off the import path of every other endpoint
+
+    series = {
+        ticker: pd.Series(history['close'], index=history['dates'])
+        for ticker, history in histories.items()
+    }
+    closes = pd.DataFrame(series).sort_index().ffill()
+    # Start from the first day every ticker has a price
+    return closes.dropna()
+
+
+def compare_metrics(closes):
+    """
+    Per-ticker return, annualized volatility and max drawdown plus the correlation matrix
+    of daily returns for an aligned close frame. NaN results (too little data) become None.
+    """
+    values = closes.to_numpy(dtype=np.float64)
+    tickers = list(closes.columns)
+    n_days, n_tickers = values.shape
+    result = {
+        'start': from_days(closes.index[0]) if n_days else None,
+        'end': from_days(closes.index[-1]) if n_days else None,
+        'days': n_days,
+        'metrics': {ticker: {'total_return': None, 'volatility': None, 'max_drawdown': None} for ticker in tickers},
+        'correlation': [[None] * n_tickers for _ in range(n_tickers)],
+    }
+    if n_days < 2:
+        return result
+
+    returns = values[1:] / values[:-1] - 1
+    total_return = values[-1] / values[0] - 1
+    max_drawdown = (values / np.maximum.accumulate(values, axis=0) - 1).min(axis=0)
+    if n_days > 2:
+        volatility = returns.std(axis=0, ddof=1) * np.sqrt(TRADING_DAYS)
+        # A flat price series has no variance, its correlations are undefined (NaN)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            correlation = np.corrcoef(returns, rowvar=False).reshape(n_tickers, n_tickers)
+    else:
+        volatility = np.full(n_tickers, np.nan)
+        correlation = np.full((n_tickers, n_tickers), np.nan)
+
+    def clean(value):
+        return None if np.isnan(value) else round(float(value), 6)
+
+    for i, ticker in enumerate(tickers):
+        result['metrics'][ticker] = {
+            'total_return': clean(total_return[i]),
+            'volatility': clean(volatility[i]),
+            'max_drawdown': clean(max_drawdown[i]),
+        }
+    result['correlation'] = [[clean(value) for value in row] for row in correlation]
+    return result
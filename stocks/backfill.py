@@ -0,0 +1,303 @@
+"""
+Offline price backfill from local CSV / Parquet files (manage.py import_prices).
+
+Files are read a chunk at a time (pandas for CSV, optionally compressed,
+pyarrow record batches for Parquet). Each chunk is validated and deduplicated
+on column arrays, then loaded with the fastest path of the database:
+
+* PostgreSQL - COPY into a temporary staging table, then one
+               INSERT ... SELECT ... ON CONFLICT DO UPDATE merge
+* SQLite     - one executemany of INSERT ... ON CONFLICT DO UPDATE
+* others     - bulk_create(update_conflicts=True)
+
+The merges only rewrite bars whose values changed. A chunk and the file's
+ImportCheckpoint are committed together, so an interrupted import resumes
+with the first chunk that isn't in the database yet.
+
+Accepted columns (case-insensitive): ticker (or symbol), date, open, close,
+volume; extra columns such as High / Low / Adj Close are ignored, so both the
+export_history dumps and yfinance CSV dumps load as they are. A file without
+a ticker column belongs to the ticker given on the command line, or to the
+one in its file name (RELIANCE.NS.csv).
+
+Backfilled bars are history: they don't fire watchlist alerts. At the end the
+price store and indicators of the imported tickers are rebuilt and their health
+scores and whole score history recomputed, including tickers loaded by an interrupted earlier run of the
+same files (the checkpoints remember them until that has happened).
+"""
+import io
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .cache import bump_data_version
+from .export import import_pyarrow
+from .indicators import rebuild as rebuild_indicators
+from .models import ImportCheckpoint, Stock, StockPrice
+from .score_history import update_score_history
+from .store import get_store, rebuild as rebuild_store
+from .utils import refresh_health_scores
+
+CHUNK_SIZE = 100_000
+MAX_PAISE = 10 ** 12  # DECIMAL(12, 2)
+MAX_TICKER = Stock._meta.get_field('ticker').max_length
+ALIASES = {'symbol': 'ticker', 'open_price': 'open', 'close_price': 'close'}
+REQUIRED = ('date', 'open', 'close', 'volume')
+SUFFIXES = ('.csv', '.parquet')
+
+
+def find_files(paths):
+    """The given files, with directories expanded to the CSV / Parquet files in them (sorted)."""
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(p for p in path.iterdir() if any(s in p.suffixes for s in SUFFIXES)))
+        else:
+            files.append(path)
+    return files
+
+
+def default_ticker(path):
+    name = Path(path).name
+    for suffix in ('.gz', '.bz2', '.zip', '.xz', '.zst') + SUFFIXES:
+        name = name.removesuffix(suffix)
+    return name
+
+
+def read_chunks(path, chunk_size):
+    if '.parquet' in Path(path).suffixes:
+        pa = import_pyarrow()
+        for batch in pa.parquet.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size)
+
+
+def parse_dates(values):
+    """Calendar dates as datetime64[D] (NaT when unparseable). Timestamps keep their local date."""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        if values.dt.tz is not None:
+            values = values.dt.tz_localize(None)
+        return values.to_numpy(dtype='datetime64[D]')
+    # Strings, or datetime.date objects from Parquet date columns
+    days = pd.to_datetime(values.astype(str).str.slice(0, 10), format='%Y-%m-%d', errors='coerce')
+    return days.to_numpy(dtype='datetime64[D]')
+
+
+def clean(frame, ticker=None):
+    """
+    Validates a raw chunk. Returns (rows, invalid, duplicates), rows being a DataFrame of
+    ticker, date ('YYYY-MM-DD'), open_paise, close_paise, volume with one row per (ticker, date),
+    the last one of the chunk winning.
+    """
+    frame = frame.rename(columns=lambda column: ALIASES.get(str(column).strip().lower(), str(column).strip().lower()))
+    missing = [column for column in REQUIRED if column not in frame.columns]
+    if 'ticker' not in frame.columns and not ticker:
+        missing.insert(0, 'ticker')
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+
+    if 'ticker' in frame.columns:
+        tickers = frame['ticker'].fillna('').astype(str).str.strip()
+    else:
+        tickers = pd.Series(ticker, index=frame.index)
+    days = parse_dates(frame['date'])
+    opens = pd.to_numeric(frame['open'], errors='coerce').to_numpy(dtype=np.float64) * 100
+    closes = pd.to_numeric(frame['close'], errors='coerce').to_numpy(dtype=np.float64) * 100
+    volumes = pd.to_numeric(frame['volume'], errors='coerce').to_numpy(dtype=np.float64)
+
+    with np.errstate(invalid='ignore'):
+        valid = (
+            ~np.isnat(days)
+            & tickers.str.len().between(1, MAX_TICKER).to_numpy()
+            & (opens > 0) & (opens < MAX_PAISE)
+            & (closes > 0) & (closes < MAX_PAISE)
+            & (volumes >= 0) & (volumes < 2 ** 63)
+        )
+    rows = pd.DataFrame({
+        'ticker': tickers.to_numpy()[valid],
+        'date': days[valid].astype(str),
+        'open_paise': np.rint(opens[valid]).astype(np.int64),
+        'close_paise': np.rint(closes[valid]).astype(np.int64),
+        'volume': volumes[valid].astype(np.int64),
+    })
+    deduped = rows.drop_duplicates(['ticker', 'date'], keep='last')
+    return deduped, int((~valid).sum()), len(rows) - len(deduped)
+
+
+def _names():
+    meta = StockPrice._meta
+    quote = connection.ops.quote_name
+    return quote(meta.db_table), [quote(meta.get_field(name).column) for name in ('ticker', 'date', 'open_price', 'close_price', 'volume')]
+
+
+def load_postgresql(rows):
+    table, (ticker, day, open_price, close_price, volume) = _names()
+    copy = "COPY price_import (ticker, date, open_paise, close_paise, volume) FROM STDIN WITH (FORMAT csv)"
+    buffer = io.StringIO()
+    rows.to_csv(buffer, header=False, index=False)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "CREATE TEMPORARY TABLE IF NOT EXISTS price_import "
+            "(ticker varchar(20), date date, open_paise bigint, close_paise bigint, volume bigint) ON COMMIT DELETE ROWS"
+        )
+        if hasattr(cursor, 'copy_expert'):  # psycopg2
+            buffer.seek(0)
+            cursor.copy_expert(copy, buffer)
+        else:  # psycopg 3
+            with cursor.copy(copy) as stream:
+                stream.write(buffer.getvalue())
+        cursor.execute(f"""
+            INSERT INTO {table} ({ticker}, {day}, {open_price}, {close_price}, {volume})
+            SELECT ticker, date, open_paise / 100.0, close_paise / 100.0, volume FROM price_import
+            ON CONFLICT ({ticker}, {day}) DO UPDATE SET
+                {open_price} = EXCLUDED.{open_price}, {close_price} = EXCLUDED.{close_price}, {volume} = EXCLUDED.{volume}
+            WHERE ({table}.{open_price}, {table}.{close_price}, {table}.{volume})
+                IS DISTINCT FROM (EXCLUDED.{open_price}, EXCLUDED.{close_price}, EXCLUDED.{volume})
+        """)
+        return cursor.rowcount
+
+
+def load_sqlite(rows):
+    table, (ticker, day, open_price, close_price, volume) = _names()
+    # NUMERIC affinity stores 101.5 and Decimal('101.50') alike
+    params = zip(
+        rows['ticker'].tolist(), rows['date'].tolist(), (rows['open_paise'] / 100).tolist(),
+        (rows['close_paise'] / 100).tolist(), rows['volume'].tolist(),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(f"""
+            INSERT INTO {table} ({ticker}, {day}, {open_price}, {close_price}, {volume}) VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT ({ticker}, {day}) DO UPDATE SET
+                {open_price} = excluded.{open_price}, {close_price} = excluded.{close_price}, {volume} = excluded.{volume}
+            WHERE {open_price} != excluded.{open_price} OR {close_price} != excluded.{close_price}
+                OR {volume} != excluded.{volume}
+        """, params)
+        return cursor.rowcount
+
+
+def load_generic(rows):
+    prices = [
+        StockPrice(ticker_id=ticker, date=day, open_price=open_paise / 100, close_price=close_paise / 100, volume=volume)
+        for ticker, day, open_paise, close_paise, volume in rows.itertuples(index=False)
+    ]
+    StockPrice.objects.bulk_create(
+        prices, batch_size=1000, update_conflicts=True, unique_fields=['ticker', 'date'],
+        update_fields=['open_price', 'close_price', 'volume'],
+    )
+    return len(prices)
+
+
+LOADERS = {'postgresql': load_postgresql, 'sqlite': load_sqlite}
+
+
+class PriceImporter:
+    def __init__(self, chunk_size=CHUNK_SIZE, ticker=None, restart=False, refresh=True, log=None):
+        self.chunk_size = max(1, chunk_size)
+        self.ticker = ticker
+        self.restart = restart
+        self.refresh = refresh
+        self.log = log or (lambda message, style=None: None)
+        self.load = LOADERS.get(connection.vendor, load_generic)
+        self.known = set()
+        self.checkpoints = []
+
+    def run(self, paths):
+        """
+        Imports the files in order.
+        Returns {'files', 'read', 'invalid', 'duplicates', 'written', 'unchanged', 'resumed',
+                 'tickers': set of tickers that got bars, 'refreshed': health scores refreshed, 'elapsed'}.
+        """
+        report = {'files': 0, 'read': 0, 'invalid': 0, 'duplicates': 0, 'written': 0, 'unchanged': 0,
+                  'resumed': 0, 'tickers': set(), 'refreshed': 0}
+        started = time.perf_counter()
+        for path in find_files(paths):
+            self.import_file(path, report)
+            report['files'] += 1
+        report['elapsed'] = time.perf_counter() - started
+
+        if report['tickers']:
+            store = get_store()
+            if store is not None:
+                rebuild_store(store, report['tickers'])
+            rebuild_indicators(report['tickers'])
+            if self.refresh:
+                # Backfilled days can lie before the last stored history day, recompute all of it
+                update_score_history(report['tickers'], full=True)
+                report['refreshed'] = refresh_health_scores(report['tickers'])
+            # Cached history / detail responses of these tickers are stale either way
+            bump_data_version(report['tickers'])
+        ImportCheckpoint.objects.filter(pk__in=[checkpoint.pk for checkpoint in self.checkpoints]).update(
+            refreshed_at=timezone.now())
+        return report
+
+    def checkpoint(self, path):
+        stat = os.stat(path)
+        checkpoint, created = ImportCheckpoint.objects.get_or_create(
+            path=str(Path(path).resolve()),
+            defaults={'size': stat.st_size, 'modified': stat.st_mtime, 'chunk_size': self.chunk_size},
+        )
+        if not created and (self.restart or (checkpoint.size, checkpoint.modified) != (stat.st_size, stat.st_mtime)):
+            checkpoint.size, checkpoint.modified, checkpoint.chunk_size = stat.st_size, stat.st_mtime, self.chunk_size
+            checkpoint.chunks_done = checkpoint.rows_done = 0
+            checkpoint.started_at, checkpoint.finished_at = timezone.now(), None
+            checkpoint.tickers, checkpoint.refreshed_at = [], None
+            checkpoint.save()
+        return checkpoint
+
+    def import_file(self, path, report):
+        checkpoint = self.checkpoint(path)
+        self.checkpoints.append(checkpoint)
+        if checkpoint.refreshed_at is None:
+            # Loaded by an earlier run that stopped before rebuilding / rescoring them
+            report['tickers'].update(checkpoint.tickers)
+        if checkpoint.finished_at:
+            self.log(f"{path}: already imported, skipping (--restart to load it again)")
+            return
+        if checkpoint.chunks_done:
+            self.log(f"{path}: resuming after {checkpoint.rows_done} rows")
+            report['resumed'] += checkpoint.rows_done
+
+        ticker = self.ticker or default_ticker(path)
+        # Resume with the chunk size the checkpoint counts in
+        for index, frame in enumerate(read_chunks(path, checkpoint.chunk_size)):
+            if index < checkpoint.chunks_done:
+                continue
+            rows, invalid, duplicates = clean(frame, ticker)
+            tickers = rows['ticker'].unique().tolist()
+            with transaction.atomic():
+                self.create_stocks(tickers)
+                written = self.load(rows) if len(rows) else 0
+                checkpoint.chunks_done += 1
+                checkpoint.rows_done += len(frame)
+                checkpoint.tickers = sorted(set(checkpoint.tickers).union(tickers))
+                checkpoint.updated_at = timezone.now()
+                checkpoint.save(update_fields=['chunks_done', 'rows_done', 'tickers', 'updated_at'])
+
+            report['read'] += len(frame)
+            report['invalid'] += invalid
+            report['duplicates'] += duplicates
+            report['written'] += written
+            report['unchanged'] += len(rows) - written
+            report['tickers'].update(tickers)
+            self.log(f"{path}: {checkpoint.rows_done} rows, {written} bars written")
+
+        checkpoint.finished_at = timezone.now()
+        checkpoint.save(update_fields=['finished_at'])
+
+    def create_stocks(self, tickers):
+        # Bars need their Stock row, the company info comes with the next ingest_data
+        new = [ticker for ticker in tickers if ticker not in self.known]
+        if not new:
+            return
+        existing = set(Stock.objects.filter(ticker__in=new).values_list('ticker', flat=True))
+        Stock.objects.bulk_create(
+            [Stock(ticker=ticker, company_name=ticker) for ticker in new if ticker not in existing],
+            ignore_conflicts=True,
+        )
+        self.known.update(new)
@@ -0,0 +1,195 @@
+"""
+Deterministic synthetic market and the benchmark suite run by `manage.py bench`.
+
+seed_market() fills the database with N tickers x Y years of FakeProvider bars
+and seeded headlines, so two runs (or two machines) benchmark exactly the same
+data. Every case is timed over a few repeats (median) and its query count is
+recorded; results are compared against a JSON baseline. Query counts must not
+grow at all. Timings depend on the machine that recorded the baseline, so a
+case slower than the tolerance is only reported unless asked to fail on it.
+"""
+import json
+import statistics
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from .ingestion import IngestionPipeline, upsert_prices
+from .models import NewsArticle, Stock
+from .news import NewsPipeline
+from .providers import NIFTY_100, FakeProvider
+from .sentiment import analyze_many, headline_hash
+from .fixture_feeds import FixtureFeedServer, rss_feed
+from .utils import calculate_health_score, calculate_health_scores, refresh_health_scores
+
+BASELINE_PATH = Path(__file__).resolve().parent / 'bench_baseline.json'
+DEFAULT_CONFIG = {'tickers': 20, 'years': 1, 'news': 10}
+MARKET_END = date(2025, 12, 31)
+
+# Timings below this many ms are too noisy to compare with a relative tolerance
+SLACK_MS = 2.0
+
+# Every case starts with a cache.clear(), so the suite runs on its own cache and not on the
+# project's shared one (live responses and data versions)
+BENCH_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'marketsentry-bench',
+    }
+}
+
+HEADLINES = [
+    "{name} shares surge after record quarterly profit",
+    "{name} slumps as margins come under pressure",
+    "{name} announces buyback, analysts upbeat",
+    "Regulator opens probe into {name} accounting",
+    "{name} wins large order, stock hits 52-week high",
+    "{name} misses estimates on weak demand",
+    "{name} trades flat ahead of results",
+    "Brokerages cut {name} target citing slowdown",
+    "{name} expands capacity with new plant",
+    "{name} CEO resigns unexpectedly",
+]
+
+
+def market_tickers(count):
+    """The first `count` NIFTY 100 tickers, then synthetic ones."""
+    return NIFTY_100[:count] + [f"SYN{i:04d}.NS" for i in range(max(0, count - len(NIFTY_100)))]
+
+
+def market_start(years):
+    """First day of a market of `years` years, the FakeProvider `since` of seed_market() and the suite."""
+    return (MARKET_END - timedelta(days=365 * years)).isoformat()
+
+
+def seed_market(tickers=20, years=1, news=10, seed=0):
+    """Creates the synthetic market (prices, headlines, health scores). Returns the tickers."""
+    symbols = market_tickers(tickers)
+    provider = FakeProvider(end=MARKET_END, since=market_start(years))
+    for ticker in symbols:
+        info = provider.fetch_info(ticker)
+        stock = Stock.objects.create(ticker=ticker, company_name=info['longName'], sector=info['sector'])
+        upsert_prices(stock, provider.fetch_history(ticker, provider.since), batch_size=2000)
+
+    rng = np.random.default_rng(seed)
+    rows = []
+    for ticker in symbols:
+        name = ticker.split('.')[0].title()
+        for i in rng.choice(len(HEADLINES), size=min(news, len(HEADLINES)), replace=False).tolist():
+            rows.append((ticker, HEADLINES[i].format(name=name)))
+    scores = analyze_many([headline for _, headline in rows])
+    NewsArticle.objects.bulk_create([
+        NewsArticle(ticker_id=ticker, headline=headline, headline_hash=headline_hash(headline),
+                    story_hash=headline_hash(headline), sentiment_score=score)
+        for (ticker, headline), score in zip(rows, scores)
+    ], batch_size=1000)
+    refresh_health_scores(symbols)
+    return symbols
+
+
+class Suite:
+    """The benchmark cases over a seeded market. Each case runs with a cold response cache."""
+    def __init__(self, tickers, years=DEFAULT_CONFIG['years']):
+        self.tickers = tickers
+        self.since = market_start(years)
+        self.client = Client()
+        self.cases = {
+            'list_plain': lambda: self.get('/api/stocks/'),
+            'list_search': lambda: self.get('/api/stocks/', {'search': 'ba'}),
+            'list_health_asc': lambda: self.get('/api/stocks/', {'ordering': 'health_score'}),
+            'list_health_desc': lambda: self.get('/api/stocks/', {'ordering': '-health_score'}),
+            'list_revalidate': self.list_revalidate,
+            'detail': lambda: self.get(f'/api/stocks/{tickers[0]}/'),
+            'history_chart': lambda: self.get(f'/api/stocks/{tickers[0]}/history/', {'max_points': 300}),
+            'compare_pair': lambda: self.get('/api/stocks/api/compare/', {'ticker1': tickers[0], 'ticker2': tickers[1]}),
+            'compare_10': lambda: self.get('/api/stocks/api/compare/', {'tickers': ','.join(tickers[:10])}),
+            'health_score_one': lambda: calculate_health_score(Stock(ticker=tickers[0])),
+            'health_scores_all': lambda: calculate_health_scores(tickers),
+            'ingest_incremental': self.ingest_incremental,
+            'fetch_news': self.fetch_news,
+            'export_prices_csv': self.export_prices,
+        }
+
+    def get(self, path, params=None):
+        cache.clear()
+        response = self.client.get(path, params or {})
+        assert response.status_code == 200, (path, response.status_code)
+        return response
+
+    def list_revalidate(self):
+        # Clients that already hold the page only revalidate it
+        etag = getattr(self, '_list_etag', None)
+        if etag is None:
+            etag = self._list_etag = self.client.get('/api/stocks/')['ETag']
+        response = self.client.get('/api/stocks/', HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304
+
+    def ingest_incremental(self):
+        # A week of new bars for every ticker, rolled back so each repeat starts from the same state
+        with transaction.atomic():
+            # The walk depends on where it starts, a different `since` would rewrite the seeded bars
+            provider = FakeProvider(end=MARKET_END + timedelta(days=7), since=self.since)
+            IngestionPipeline(provider, workers=4, batch_size=10).run(self.tickers)
+            transaction.set_rollback(True)
+
+    def fetch_news(self):
+        feeds = {
+            ticker: rss_feed([f"{ticker} headline {i}" for i in range(5)] + ["Markets close higher on broad buying"])
+            for ticker in self.tickers
+        }
+        with FixtureFeedServer(feeds) as server, transaction.atomic():
+            NewsPipeline(workers=8, url_template=server.url, conditional=False).run(Stock.objects.all())
+            transaction.set_rollback(True)
+
+    def export_prices(self):
+        # Every bar of every ticker through the streaming endpoint
+        response = self.get('/api/stocks/export/prices/')
+        assert sum(len(chunk) for chunk in response.streaming_content)
+
+    def run(self, repeat=5, only=None):
+        """Returns {case: {'ms': median milliseconds, 'queries': queries of one run}}."""
+        results = {}
+        for name, case in self.cases.items():
+            if only and name not in only:
+                continue
+            case()  # warm-up (imports, lexicon, prepared statements)
+            timings = []
+            for _ in range(repeat):
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    case()
+                    timings.append((time.perf_counter() - started) * 1000)
+            results[name] = {'ms': round(statistics.median(timings), 2), 'queries': len(queries)}
+        return results
+
+
+def compare(results, baseline, tolerance):
+    """(query regressions, slowdowns): messages for results that are worse than the baseline."""
+    regressions, slowdowns = [], []
+    for name, result in results.items():
+        base = baseline.get('cases', {}).get(name)
+        if base is None:
+            continue
+        if result['queries'] > base['queries']:
+            regressions.append(f"{name}: {base['queries']} -> {result['queries']} queries")
+        limit = base['ms'] * (1 + tolerance) + SLACK_MS
+        if result['ms'] > limit:
+            slowdowns.append(f"{name}: {base['ms']:.1f} -> {result['ms']:.1f} ms (limit {limit:.1f} ms)")
+    return regressions, slowdowns
+
+
+def load_baseline(path=BASELINE_PATH):
+    try:
+        return json.loads(Path(path).read_text())
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(results, config, path=BASELINE_PATH):
+    Path(path).write_text(json.dumps({'config': config, 'cases': results}, indent=2, sort_keys=True) + '\n')
@@ -0,0 +1,164 @@
+"""
+Versioned response cache.
+
+Stock data only changes when ingestion / news processing runs, so instead of
+expiring entries on a timer every cached value is keyed on data-version
+counters that those writers bump:
+
+* a global version, which every list response depends on,
+* one version per ticker, for detail / compare responses and per-row fragments.
+
+The counters live in the configured Django cache (CACHES['default'], the
+file-based cache in settings.CACHE_DIR), so a bump made by a management
+command is seen by every web worker. A request whose If-None-Match matches the
+current ETag is answered with 304 straight from the version counters, without
+touching the database.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.core.cache import cache
+from django.dispatch import Signal
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+
+GLOBAL_VERSION_KEY = 'ms:v:global'
+TICKER_VERSION_KEY = 'ms:v:t:{}'
+RESPONSE_KEY = 'ms:resp:h:{}'  # (content, content type, headers)
+FRAGMENT_KEY = 'ms:row:{}:{}'
+
+# Sent after every bump with tickers=set of tickers (empty for global-only changes)
+data_changed = Signal()
+
+# Entries are immutable for a given version, the timeout only bounds memory/disk use
+RESPONSE_TIMEOUT = 60 * 60 * 24
+
+
+def _initial_version():
+    # Start from a fresh value when a counter is missing (evicted, cache cleared) so
+    # entries cached under an older counter with the same number can never match again
+    return time.time_ns()
+
+
+def _incr(key):
+    # Not cache.incr(): on the file-based cache that is a get + set, and two processes bumping
+    # at once would both write v + 1, so a response computed between the two bumps would be
+    # cached under the final version. Every bump writes its own clock-based value instead
+    # (two racing bumps still leave one of them, but never a value a reader has seen before).
+    version = max(_initial_version(), (cache.get(key) or 0) + 1)
+    cache.set(key, version, None)
+    return version
+
+
+def bump_data_version(tickers=()):
+    """Invalidates everything that depends on the given tickers (and all list responses)."""
+    tickers = set(tickers)
+    for ticker in tickers:
+        _incr(TICKER_VERSION_KEY.format(ticker))
+    _incr(GLOBAL_VERSION_KEY)
+    data_changed.send(sender=None, tickers=tickers)
+
+
+def get_versions(tickers=None):
+    """Returns the version tokens for the global scope (tickers=None) or for the given tickers."""
+    if tickers is None:
+        keys = [GLOBAL_VERSION_KEY]
+    else:
+        keys = [TICKER_VERSION_KEY.format(ticker) for ticker in sorted(set(tickers))]
+    versions = cache.get_many(keys)
+    missing = {key: _initial_version() for key in keys if key not in versions}
+    if missing:
+        # add() so that two processes racing here agree on one value
+        for key, version in missing.items():
+            cache.add(key, version, None)
+        versions.update(cache.get_many(list(missing)))
+    return [f"{key}={versions[key]}" for key in keys]
+
+
+def get_fragments(name, tickers):
+    """Cached per-ticker fragments for the current ticker versions. Returns (fragments, versions)."""
+    versions = dict(zip(sorted(set(tickers)), get_versions(tickers)))
+    keys = {FRAGMENT_KEY.format(name, versions[ticker]): ticker for ticker in versions}
+    found = cache.get_many(list(keys))
+    return {keys[key]: value for key, value in found.items()}, versions
+
+
+def set_fragments(name, fragments, versions):
+    cache.set_many(
+        {FRAGMENT_KEY.format(name, versions[ticker]): value for ticker, value in fragments.items()},
+        RESPONSE_TIMEOUT,
+    )
+
+
+def _etag(request, versions):
+    digest = hashlib.sha1()
+    digest.update(request.get_full_path().encode())
+    digest.update(request.META.get('HTTP_ACCEPT', '').encode())
+    for version in versions:
+        digest.update(version.encode())
+    return f'"{digest.hexdigest()}"'
+
+
+def _matches(request, etag):
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    return etag in [tag.strip() for tag in header.split(',')]
+
+
+def _view_headers(response):
+    # Headers the views set themselves (X-Total-Points, X-Next-Cursor, ...), a cached hit repeats them
+    return [(name, value) for name, value in response.items()
+            if name.lower().startswith('x-') or name.lower() == 'content-disposition']
+
+
+def versioned_cache(scope=None):
+    """
+    View decorator (applied outside DRF's api_view / as_view()).
+    `scope(request, **kwargs)` returns the tickers the response depends on, or None when
+    it depends on the whole universe (list pages).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+
+            tickers = scope(request, **kwargs) if scope else None
+            etag = _etag(request, get_versions(tickers))
+            if _matches(request, etag):
+                response = HttpResponseNotModified()
+                response['ETag'] = etag
+                return response
+
+            key = RESPONSE_KEY.format(etag.strip('"'))
+            cached = cache.get(key)
+            if cached is not None:
+                content, content_type, headers = cached
+                response = HttpResponse(content, content_type=content_type)
+                for name, value in headers:
+                    response[name] = value
+            else:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                if hasattr(response, 'render'):
+                    response.render()
+                cache.set(key, (response.content, response['Content-Type'], _view_headers(response)), RESPONSE_TIMEOUT)
+
+            response['ETag'] = etag
+            # Let clients keep the body but revalidate it with If-None-Match every time
+            patch_cache_control(response, no_cache=True)
+            return response
+        return wrapper
+    return decorator
+
+
+def ticker_scope(request, ticker=None, **kwargs):
+    return [ticker]
+
+
+def compare_scope(request, **kwargs):
+    tickers = request.GET.get('tickers', '').split(',')
+    return [t.strip() for t in (*tickers, request.GET.get('ticker1'), request.GET.get('ticker2')) if t and t.strip()]
@@ -0,0 +1,199 @@
+"""
+Streaming bulk export of price and news history.
+
+Rows are read with values_list().iterator(chunk_size=...) and written out a
+chunk at a time, so an export only ever holds one chunk in memory however
+many rows it covers (PostgreSQL reads through a server-side cursor, SQLite
+steps its cursor lazily). Formats:
+
+* csv     - a header line, then one line per row
+* parquet - one row group per chunk
+* arrow   - Arrow IPC stream format, one record batch per chunk
+
+parquet and arrow need pyarrow, which is optional (pip install pyarrow).
+
+Datasets:
+
+* prices - ticker, date, open, close, volume (prices read as integer paise
+           like the history endpoint, float64 in the Arrow formats)
+* news   - ticker, published_at, headline, sentiment_score, url
+"""
+import csv
+import io
+from itertools import islice
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.db.models import BigIntegerField, F
+from django.db.models.functions import Cast, Round
+
+from .models import NewsArticle, StockPrice
+
+CHUNK_SIZE = 5000
+
+COLUMNS = {
+    'prices': ('ticker', 'date', 'open', 'close', 'volume'),
+    'news': ('ticker', 'published_at', 'headline', 'sentiment_score', 'url'),
+}
+
+# format -> (content type, file extension)
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+}
+
+
+def import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise ImportError("The parquet and arrow formats need pyarrow (pip install pyarrow)")
+    return pyarrow
+
+
+def price_rows(tickers=None, start=None, end=None):
+    qs = StockPrice.objects.all()
+    if tickers:
+        qs = qs.filter(ticker__in=tickers)
+    if start:
+        qs = qs.filter(date__gte=start)
+    if end:
+        qs = qs.filter(date__lte=end)
+    return qs.annotate(
+        open_paise=Cast(Round(F('open_price') * 100), BigIntegerField()),
+        close_paise=Cast(Round(F('close_price') * 100), BigIntegerField()),
+    ).order_by('ticker', 'date').values_list('ticker_id', 'date', 'open_paise', 'close_paise', 'volume')
+
+
+def news_rows(tickers=None, start=None, end=None):
+    qs = NewsArticle.objects.all()
+    if tickers:
+        qs = qs.filter(ticker__in=tickers)
+    if start:
+        qs = qs.filter(published_at__date__gte=start)
+    if end:
+        qs = qs.filter(published_at__date__lte=end)
+    return qs.order_by('ticker', 'published_at', 'id').values_list(
+        'ticker_id', 'published_at', 'headline', 'sentiment_score', 'url')
+
+
+ROWS = {'prices': price_rows, 'news': news_rows}
+
+
+def paise(value):
+    return f"{value // 100}.{value % 100:02d}"
+
+
+def csv_row(dataset, row):
+    if dataset == 'prices':
+        ticker, day, open_paise, close_paise, volume = row
+        return ticker, day.isoformat(), paise(open_paise), paise(close_paise), volume
+    ticker, published_at, headline, sentiment, url = row
+    return ticker, published_at.isoformat(), headline, sentiment, url or ''
+
+
+def arrow_schema(pa, dataset):
+    if dataset == 'prices':
+        return pa.schema([
+            ('ticker', pa.string()), ('date', pa.date32()), ('open', pa.float64()),
+            ('close', pa.float64()), ('volume', pa.int64()),
+        ])
+    return pa.schema([
+        ('ticker', pa.string()), ('published_at', pa.timestamp('us', tz='UTC')), ('headline', pa.string()),
+        ('sentiment_score', pa.float64()), ('url', pa.string()),
+    ])
+
+
+def arrow_batch(pa, schema, dataset, chunk):
+    columns = list(zip(*chunk))
+    if dataset == 'prices':
+        columns[2] = np.array(columns[2], dtype=np.int64) / 100
+        columns[3] = np.array(columns[3], dtype=np.int64) / 100
+    return pa.record_batch([pa.array(values, field.type) for values, field in zip(columns, schema)], schema=schema)
+
+
+class Export:
+    """
+    Iterating yields the encoded bytes chunk by chunk; `rows` counts the rows written so far.
+    Raises ValueError for an unknown dataset / format and ImportError when the format needs pyarrow.
+    """
+    def __init__(self, dataset, fmt='csv', tickers=None, start=None, end=None, chunk_size=CHUNK_SIZE):
+        if dataset not in COLUMNS:
+            raise ValueError(f"Unknown dataset '{dataset}'")
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown format '{fmt}'")
+        if fmt != 'csv':
+            import_pyarrow()
+        self.dataset = dataset
+        self.format = fmt
+        self.tickers = tickers
+        self.start = start
+        self.end = end
+        self.chunk_size = max(1, chunk_size)
+        self.rows = 0
+
+    @property
+    def content_type(self):
+        return FORMATS[self.format][0]
+
+    @property
+    def filename(self):
+        return f"{self.dataset}.{FORMATS[self.format][1]}"
+
+    def chunks(self):
+        rows = ROWS[self.dataset](self.tickers, self.start, self.end).iterator(chunk_size=self.chunk_size)
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                return
+            self.rows += len(chunk)
+            yield chunk
+
+    def __iter__(self):
+        if self.format == 'csv':
+            return self.write_csv()
+        return self.write_arrow()
+
+    def write_csv(self):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        writer.writerow(COLUMNS[self.dataset])
+        for chunk in self.chunks():
+            writer.writerows(csv_row(self.dataset, row) for row in chunk)
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode()  # no rows, just the header
+
+    def write_arrow(self):
+        pa = import_pyarrow()
+        schema = arrow_schema(pa, self.dataset)
+        # The writers keep their own position, so the sink can be emptied after every chunk
+        sink = io.BytesIO()
+        if self.format == 'parquet':
+            writer = pa.parquet.ParquetWriter(sink, schema)
+        else:
+            writer = pa.ipc.new_stream(sink, schema)
+        for chunk in self.chunks():
+            writer.write_batch(arrow_batch(pa, schema, self.dataset, chunk))
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+        writer.close()
+        yield sink.getvalue()
+
+    async def stream_async(self):
+        """
+        For ASGI: Django would read a sync iterator into a list before sending it, so every
+        chunk is produced on the sync thread (which holds this request's database connection) instead.
+        """
+        chunks = iter(self)
+        produce = sync_to_async(next)
+        while True:
+            chunk = await produce(chunks, None)
+            if chunk is None:
+                return
+            yield chunk
@@ -0,0 +1,54 @@
+"""
+Test helpers shared by the test suite and the benchmark suite (stocks/bench.py).
+Nothing here is used when serving requests.
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def rss_feed(titles):
+    items = "".join(f"<item><title>{title}</title><link>https://example.com/{i}</link></item>" for i, title in enumerate(titles))
+    return f'<?xml version="1.0"?><rss version="2.0"><channel><title>News</title>{items}</channel></rss>'.encode()
+
+
+class FixtureFeedServer:
+    """Local stand-in for the RSS endpoint: serves /<ticker>.xml from a dict and honours If-None-Match."""
+    def __init__(self, feeds):
+        self.feeds = feeds
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                ticker = self.path.strip('/').removesuffix('.xml')
+                server.requests.append(ticker)
+                body = server.feeds.get(ticker)
+                if body is None:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                etag = f'"{hash(body)}"'
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/rss+xml')
+                self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/{{ticker}}.xml"
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,228 @@
+"""
+Price history as columnar arrays, with shape-preserving downsampling for charts.
+
+Dates are carried as int32 days since 1970-01-01, prices as float64 and volumes
+as int64. `lttb` (Largest-Triangle-Three-Buckets) keeps the visually important
+points of the close series; `minmax` keeps the low and high of every bucket.
+"""
+import struct
+from datetime import date, timedelta
+
+import numpy as np
+from django.db.models import BigIntegerField, F
+from django.db.models.functions import Cast, Round
+
+from .models import StockPrice
+from .store import get_store
+
+EPOCH = date(1970, 1, 1)
+
+# Binary layout: header (magic, version, count) then the four columns back to back
+BINARY_MAGIC = b'MSPH'
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct('<4sHI')
+
+
+def to_days(day):
+    return (day - EPOCH).days
+
+
+def from_days(days):
+    return EPOCH + timedelta(days=int(days))
+
+
+def load_history(ticker, start=None, end=None):
+    """
+    Loads the bars of `ticker` between start and end (inclusive), oldest first.
+    Returns {'dates', 'open', 'close', 'volume'} NumPy arrays.
+    """
+    return load_histories([ticker], start, end)[ticker]
+
+
+def load_histories(tickers, start=None, end=None):
+    """
+    load_history for several tickers: {ticker: columns}.
+    Tickers found in the memory-mapped price store are sliced from it, the rest are
+    loaded together in one query.
+    """
+    histories = {}
+    store = get_store()
+    if store is not None:
+        for ticker in tickers:
+            columns = store.columns(ticker, to_days(start) if start else None, to_days(end) if end else None)
+            if columns is not None:
+                histories[ticker] = {
+                    'dates': columns['dates'].astype(np.int32),
+                    'open': columns['open'] / 100,
+                    'close': columns['close'] / 100,
+                    'volume': columns['volume'],
+                }
+
+    missing = [ticker for ticker in tickers if ticker not in histories]
+    if not missing:
+        return histories
+
+    qs = StockPrice.objects.filter(ticker__in=missing)
+    if start:
+        qs = qs.filter(date__gte=start)
+    if end:
+        qs = qs.filter(date__lte=end)
+    rows = _bars(qs.order_by('ticker', 'date'))
+
+    grouped = {ticker: [] for ticker in missing}
+    for ticker, *bar in rows:
+        grouped[ticker].append(bar)
+    for ticker, bars in grouped.items():
+        histories[ticker] = _columns(bars)
+    return histories
+
+
+def _bars(qs):
+    return qs.annotate(
+        open_paise=Cast(Round(F('open_price') * 100), BigIntegerField()),
+        close_paise=Cast(Round(F('close_price') * 100), BigIntegerField()),
+    ).values_list('ticker_id', 'date', 'open_paise', 'close_paise', 'volume')
+
+
+def _columns(bars):
+    # [(date, open paise, close paise, volume)] oldest first -> columns
+    return {
+        'dates': np.array([to_days(bar[0]) for bar in bars], dtype=np.int32),
+        'open': np.array([bar[1] for bar in bars], dtype=np.float64) / 100,
+        'close': np.array([bar[2] for bar in bars], dtype=np.float64) / 100,
+        'volume': np.array([bar[3] for bar in bars], dtype=np.int64),
+    }
+
+
+def load_history_page(ticker, limit, after=None, before=None, start=None, end=None):
+    """
+    One keyset page of raw bars, oldest first: the first `limit` bars after the date `after`,
+    or the last `limit` bars before the date `before`, within start..end.
+    Reads only the page (plus one bar to tell whether more follow). Returns (columns, more).
+    """
+    lo = max(filter(None, [start, after and after + timedelta(days=1)]), default=None)
+    hi = min(filter(None, [end, before and before - timedelta(days=1)]), default=None)
+    store = get_store()
+    columns = store.columns(ticker, to_days(lo) if lo else None, to_days(hi) if hi else None) if store else None
+    if columns is not None:
+        window = slice(-limit - 1, None) if before else slice(0, limit + 1)
+        page = {
+            'dates': columns['dates'][window].astype(np.int32),
+            'open': columns['open'][window] / 100,
+            'close': columns['close'][window] / 100,
+            'volume': columns['volume'][window],
+        }
+    else:
+        qs = StockPrice.objects.filter(ticker=ticker)
+        if lo:
+            qs = qs.filter(date__gte=lo)
+        if hi:
+            qs = qs.filter(date__lte=hi)
+        rows = list(_bars(qs.order_by('-date' if before else 'date'))[:limit + 1])
+        page = _columns([row[1:] for row in (rows[::-1] if before else rows)])
+
+    more = len(page['dates']) > limit
+    if more:
+        window = slice(1, None) if before else slice(0, limit)
+        page = {name: values[window] for name, values in page.items()}
+    return page, more
+
+
+def lttb(x, y, n_out):
+    """
+    Indices of the points kept by Largest-Triangle-Three-Buckets.
+    Each bucket's triangle areas are computed as one vectorized expression.
+    Below three points there are no buckets: two keeps the first and last point, one the last.
+    """
+    n = len(x)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1] if n_out == 2 else [n - 1], dtype=np.int64)
+
+    x = x.astype(np.float64)
+    # Bucket boundaries for the n - 2 interior points
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Average of the next bucket (the last point for the final bucket)
+        next_lo, next_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = y[next_lo:next_hi].mean()
+        areas = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(areas))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax(y, n_out):
+    """
+    Indices of the min and max of each bucket, fully vectorized (n_out // 2 buckets, one less
+    when the latest bar is left over and kept on top of them). Below three points same as lttb().
+    """
+    n = len(y)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1] if n_out == 2 else [n - 1], dtype=np.int64)
+    buckets = n_out // 2
+    if n % buckets:
+        buckets = (n_out - 1) // 2
+
+    size = n // buckets
+    trimmed = y[:size * buckets].reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    picks = np.concatenate([offsets + trimmed.argmin(axis=1), offsets + trimmed.argmax(axis=1)])
+    if size * buckets < n:
+        picks = np.append(picks, n - 1)  # keep the latest bar
+    return np.unique(picks)
+
+
+DOWNSAMPLERS = {
+    'lttb': lambda history, n_out: lttb(history['dates'], history['close'], n_out),
+    'minmax': lambda history, n_out: minmax(history['close'], n_out),
+}
+
+
+def downsample(history, max_points, method='lttb'):
+    indices = DOWNSAMPLERS[method](history, max_points)
+    return {column: values[indices] for column, values in history.items()}
+
+
+def to_columns(history):
+    """JSON-friendly parallel arrays."""
+    return {
+        'dates': [from_days(day).isoformat() for day in history['dates'].tolist()],
+        'open': history['open'].tolist(),
+        'close': history['close'].tolist(),
+        'volume': history['volume'].tolist(),
+    }
+
+
+def to_binary(history):
+    """Compact encoding: header, then int32 days, float64 opens, float64 closes, int64 volumes (little endian)."""
+    count = len(history['dates'])
+    return b''.join([
+        BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, count),
+        history['dates'].astype('<i4').tobytes(),
+        history['open'].astype('<f8').tobytes(),
+        history['close'].astype('<f8').tobytes(),
+        history['volume'].astype('<i8').tobytes(),
+    ])
+
+
+def from_binary(payload):
+    magic, version, count = BINARY_HEADER.unpack_from(payload)
+    if magic != BINARY_MAGIC or version != BINARY_VERSION:
+        raise ValueError("Not a MarketSentry price history payload")
+    offset = BINARY_HEADER.size
+    columns = {}
+    for name, dtype, width in (('dates', '<i4', 4), ('open', '<f8', 8), ('close', '<f8', 8), ('volume', '<i8', 8)):
+        columns[name] = np.frombuffer(payload, dtype=dtype, count=count, offset=offset)
+        offset += count * width
+    return columns
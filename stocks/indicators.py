@@ -0,0 +1,377 @@
+"""
+Technical indicators, kept up to date one bar at a time.
+
+Indicators holds the streaming state of one ticker and update() folds a new
+bar into every indicator in constant time:
+
+* SMA 50 / 200     - running sums over the last 200 closes, in integer paise
+                     like the health score rules, so they are exact
+* RSI 14           - Wilder's smoothing of the gains and losses, seeded with
+                     the mean of the first 14
+* MACD 12 / 26 / 9 - EMAs of the close (seeded with the first close), and the
+                     EMA of their difference as the signal line
+* Bollinger 20 / 2 - mean and variance of the last 20 closes with Welford's
+                     update, the close leaving the window taken back out
+* ATR 14           - we store no high / low, so a bar's range is the largest
+                     of |close - open|, |open - previous close| and
+                     |close - previous close|, Wilder-smoothed like the RSI
+
+The state of every ingested ticker is stored in IndicatorState together with
+the state before its last bar: upsert_prices applies new bars to it, and a
+re-read last bar (the pipeline re-reads it every run) is replaced by going
+back one step. Older corrections rebuild the ticker from its history.
+
+compute() evaluates the same indicators over a whole history with vectorized
+pandas operations. It shares no code with the streaming path and is the
+oracle it is checked against (manage.py build_indicators --check).
+"""
+import math
+from collections import deque
+
+import numpy as np
+from django.db.models import Count, Window
+from django.utils import timezone
+
+from .export import price_rows
+from .models import IndicatorState
+
+SMA_FAST = 50
+SMA_SLOW = 200
+RSI_PERIOD = 14
+MACD_FAST = 12
+MACD_SLOW = 26
+MACD_SIGNAL = 9
+BOLLINGER_PERIOD = 20
+BOLLINGER_WIDTH = 2
+ATR_PERIOD = 14
+VOLUME_WINDOW = 10  # the health score's volume rule
+
+FIELDS = ('sma_50', 'sma_200', 'rsi', 'macd', 'macd_signal', 'macd_histogram',
+          'bollinger_middle', 'bollinger_upper', 'bollinger_lower', 'atr')
+
+
+def _rsi(avg_gain, avg_loss):
+    if avg_loss == 0:
+        return 100.0 if avg_gain > 0 else 50.0
+    return 100 - 100 / (1 + avg_gain / avg_loss)
+
+
+class Indicators:
+    """Streaming indicator state of one ticker. Prices are integer paise."""
+    def __init__(self, state=None):
+        state = state or {}
+        self.bars = state.get('bars', 0)
+        self.closes = deque(state.get('closes', ()), maxlen=SMA_SLOW)
+        self.volumes = deque(state.get('volumes', ()), maxlen=VOLUME_WINDOW)
+        self.sum_fast = state.get('sum_fast', 0)
+        self.sum_slow = state.get('sum_slow', 0)
+        self.mean = state.get('mean', 0.0)  # Bollinger window
+        self.m2 = state.get('m2', 0.0)
+        self.ema_fast = state.get('ema_fast', 0.0)
+        self.ema_slow = state.get('ema_slow', 0.0)
+        self.signal = state.get('signal', 0.0)
+        # Sums while seeding (the first RSI_PERIOD changes / ATR_PERIOD ranges), averages after
+        self.avg_gain = state.get('avg_gain', 0.0)
+        self.avg_loss = state.get('avg_loss', 0.0)
+        self.atr = state.get('atr', 0.0)
+
+    def state(self):
+        return {
+            'bars': self.bars, 'closes': list(self.closes), 'volumes': list(self.volumes),
+            'sum_fast': self.sum_fast, 'sum_slow': self.sum_slow, 'mean': self.mean, 'm2': self.m2,
+            'ema_fast': self.ema_fast, 'ema_slow': self.ema_slow, 'signal': self.signal,
+            'avg_gain': self.avg_gain, 'avg_loss': self.avg_loss, 'atr': self.atr,
+        }
+
+    def update(self, open_paise, close_paise, volume):
+        closes = self.closes
+        previous = closes[-1] if closes else None
+        x = float(close_paise)
+
+        # Values leaving the windows, read before the deque drops them
+        if len(closes) >= SMA_FAST:
+            self.sum_fast -= closes[-SMA_FAST]
+        if len(closes) == SMA_SLOW:
+            self.sum_slow -= closes[0]
+        if len(closes) >= BOLLINGER_PERIOD:
+            old = float(closes[-BOLLINGER_PERIOD])
+            mean = self.mean
+            self.mean += (x - old) / BOLLINGER_PERIOD
+            self.m2 += (x - old) * (x - self.mean + old - mean)
+        else:
+            delta = x - self.mean
+            self.mean += delta / (len(closes) + 1)
+            self.m2 += delta * (x - self.mean)
+        closes.append(close_paise)
+        self.volumes.append(volume)
+        self.sum_fast += close_paise
+        self.sum_slow += close_paise
+        self.bars += 1
+
+        if previous is None:
+            self.ema_fast = self.ema_slow = x
+            self.signal = 0.0  # the MACD of the first bar
+            true_range = abs(close_paise - open_paise)
+        else:
+            self.ema_fast += (x - self.ema_fast) * 2 / (MACD_FAST + 1)
+            self.ema_slow += (x - self.ema_slow) * 2 / (MACD_SLOW + 1)
+            self.signal += (self.ema_fast - self.ema_slow - self.signal) * 2 / (MACD_SIGNAL + 1)
+            true_range = max(abs(close_paise - open_paise), abs(open_paise - previous), abs(close_paise - previous))
+
+            change = close_paise - previous
+            gain, loss = max(change, 0), max(-change, 0)
+            changes = self.bars - 1
+            if changes <= RSI_PERIOD:
+                self.avg_gain += gain
+                self.avg_loss += loss
+                if changes == RSI_PERIOD:
+                    self.avg_gain /= RSI_PERIOD
+                    self.avg_loss /= RSI_PERIOD
+            else:
+                self.avg_gain = (self.avg_gain * (RSI_PERIOD - 1) + gain) / RSI_PERIOD
+                self.avg_loss = (self.avg_loss * (RSI_PERIOD - 1) + loss) / RSI_PERIOD
+
+        if self.bars <= ATR_PERIOD:
+            self.atr += true_range
+            if self.bars == ATR_PERIOD:
+                self.atr /= ATR_PERIOD
+        else:
+            self.atr = (self.atr * (ATR_PERIOD - 1) + true_range) / ATR_PERIOD
+
+    def values(self):
+        """The current value of every indicator (prices in rupees), None until it has enough bars."""
+        n = self.bars
+        values = dict.fromkeys(FIELDS)
+        if n >= SMA_FAST:
+            values['sma_50'] = self.sum_fast / (SMA_FAST * 100)
+        if n >= SMA_SLOW:
+            values['sma_200'] = self.sum_slow / (SMA_SLOW * 100)
+        if n > RSI_PERIOD:
+            values['rsi'] = _rsi(self.avg_gain, self.avg_loss)
+        if n >= MACD_SLOW:
+            values['macd'] = (self.ema_fast - self.ema_slow) / 100
+        if n >= MACD_SLOW + MACD_SIGNAL - 1:
+            values['macd_signal'] = self.signal / 100
+            values['macd_histogram'] = values['macd'] - values['macd_signal']
+        if n >= BOLLINGER_PERIOD:
+            width = BOLLINGER_WIDTH * math.sqrt(max(self.m2, 0.0) / BOLLINGER_PERIOD)
+            values['bollinger_middle'] = self.mean / 100
+            values['bollinger_upper'] = (self.mean + width) / 100
+            values['bollinger_lower'] = (self.mean - width) / 100
+        if n >= ATR_PERIOD:
+            values['atr'] = self.atr / 100
+        return values
+
+
+def _wilder(values, period):
+    """Wilder's smoothing seeded with the mean of the first `period` values, NaN before that."""
+    import pandas as pd
+
+    result = np.full(len(values), np.nan)
+    if len(values) >= period:
+        seeded = np.array(values[period - 1:], dtype=np.float64)
+        seeded[0] = np.mean(values[:period])
+        result[period - 1:] = pd.Series(seeded).ewm(alpha=1 / period, adjust=False).mean().to_numpy()
+    return result
+
+
+def compute(opens, closes):
+    """
+    Every indicator as of every bar of a history (opens / closes in paise, oldest first),
+    as {field: float64 array} with NaN where update() / values() would give None.
+    """
+    import pandas as pd
+
+    opens = np.asarray(opens, dtype=np.float64)
+    close = pd.Series(np.asarray(closes, dtype=np.float64))
+    n = len(close)
+    i = np.arange(n)
+    result = {
+        'sma_50': close.rolling(SMA_FAST).mean().to_numpy() / 100,
+        'sma_200': close.rolling(SMA_SLOW).mean().to_numpy() / 100,
+    }
+
+    fast = close.ewm(span=MACD_FAST, adjust=False).mean()
+    slow = close.ewm(span=MACD_SLOW, adjust=False).mean()
+    macd = fast - slow
+    signal = macd.ewm(span=MACD_SIGNAL, adjust=False).mean().to_numpy()
+    result['macd'] = np.where(i >= MACD_SLOW - 1, macd.to_numpy() / 100, np.nan)
+    result['macd_signal'] = np.where(i >= MACD_SLOW + MACD_SIGNAL - 2, signal / 100, np.nan)
+    result['macd_histogram'] = result['macd'] - result['macd_signal']
+
+    changes = close.diff().to_numpy()[1:]
+    avg_gain = np.concatenate([[np.nan], _wilder(np.maximum(changes, 0), RSI_PERIOD)])
+    avg_loss = np.concatenate([[np.nan], _wilder(np.maximum(-changes, 0), RSI_PERIOD)])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = 100 - 100 / (1 + avg_gain / avg_loss)
+    rsi = np.where(avg_loss == 0, np.where(avg_gain > 0, 100.0, 50.0), rsi)
+    result['rsi'] = np.where(np.isnan(avg_gain), np.nan, rsi)
+
+    # Two-pass mean / deviation of every window (pandas' rolling variance drifts as well)
+    mean = np.full(n, np.nan)
+    width = np.full(n, np.nan)
+    if n >= BOLLINGER_PERIOD:
+        windows = np.lib.stride_tricks.sliding_window_view(close.to_numpy(), BOLLINGER_PERIOD)
+        mean[BOLLINGER_PERIOD - 1:] = windows.mean(axis=1)
+        width[BOLLINGER_PERIOD - 1:] = BOLLINGER_WIDTH * windows.std(axis=1)
+    result['bollinger_middle'] = mean / 100
+    result['bollinger_upper'] = (mean + width) / 100
+    result['bollinger_lower'] = (mean - width) / 100
+
+    values = close.to_numpy()
+    previous = np.concatenate([[np.nan], values[:-1]])
+    ranges = np.fmax(np.abs(values - opens), np.fmax(np.abs(opens - previous), np.abs(values - previous)))
+    result['atr'] = _wilder(ranges, ATR_PERIOD) / 100
+    return result
+
+
+def _fill(row, day, indicators, previous):
+    row.as_of, row.bars, row.state, row.previous = day, indicators.bars, indicators.state(), previous
+    row.updated_at = timezone.now()
+    for field, value in indicators.values().items():
+        setattr(row, field, value)
+    return row
+
+
+def rebuild(tickers, chunk_size=20000):
+    """Replays the whole stored history of the tickers. Returns {ticker: bars}."""
+    tickers = list(tickers)
+    rows = []
+
+    def flush(ticker, bars):
+        indicators = Indicators()
+        for _, open_paise, close_paise, volume in bars[:-1]:
+            indicators.update(open_paise, close_paise, volume)
+        previous = indicators.state() if len(bars) > 1 else None
+        indicators.update(*bars[-1][1:])
+        rows.append(_fill(IndicatorState(stock_id=ticker), bars[-1][0], indicators, previous))
+
+    current, bars = None, []
+    for ticker, day, open_paise, close_paise, volume in price_rows(tickers).iterator(chunk_size=chunk_size):
+        if ticker != current:
+            if bars:
+                flush(current, bars)
+            current, bars = ticker, []
+        bars.append((day, open_paise, close_paise, volume))
+    if bars:
+        flush(current, bars)
+
+    IndicatorState.objects.bulk_create(
+        rows,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['stock'],
+        update_fields=['as_of', 'bars', 'state', 'previous', 'updated_at', *FIELDS],
+    )
+    replayed = {row.stock_id: row.bars for row in rows}
+    gone = [ticker for ticker in tickers if ticker not in replayed]
+    if gone:
+        IndicatorState.objects.filter(stock__in=gone).delete()
+    return replayed
+
+
+def advance(ticker, days, opens, closes, volumes, since):
+    """
+    Folds freshly upserted bars into the ticker's stored state: days / opens / closes (paise) /
+    volumes are the bars of the upsert, oldest first, and `since` the first day whose bar changed.
+    New days cost one update() each; a change to the last bar the state has seen steps back to
+    the state before it, anything older (or a ticker without state) replays its history.
+    """
+    row = IndicatorState.objects.filter(stock_id=ticker).first()
+    if row is None or since < row.as_of or (since == row.as_of and row.previous is None):
+        rebuild([ticker])
+        return
+    bars = list(zip(days, opens, closes, volumes))
+    if since == row.as_of:
+        indicators = Indicators(row.previous)
+        bars = [bar for bar in bars if bar[0] >= row.as_of]
+    else:
+        indicators = Indicators(row.state)
+        bars = [bar for bar in bars if bar[0] > row.as_of]
+    for _, open_paise, close_paise, volume in bars[:-1]:
+        indicators.update(open_paise, close_paise, volume)
+    previous = indicators.state()
+    indicators.update(*bars[-1][1:])
+    _fill(row, bars[-1][0], indicators, previous).save()
+
+
+def verify(tickers, tolerance=1e-6):
+    """
+    Compares the stored indicators with compute() over the full history.
+    Returns {ticker: [fields that differ by more than the relative tolerance]} for the tickers that drifted
+    (or have no state, or a state that isn't at their last bar).
+    """
+    histories = {}
+    for ticker, day, open_paise, close_paise, _ in price_rows(list(tickers)).iterator(chunk_size=20000):
+        histories.setdefault(ticker, ([], [], []))
+        days, opens, closes = histories[ticker]
+        days.append(day)
+        opens.append(open_paise)
+        closes.append(close_paise)
+
+    stored = {row.stock_id: row for row in IndicatorState.objects.filter(stock__in=list(histories))}
+    problems = {}
+    for ticker, (days, opens, closes) in histories.items():
+        row = stored.get(ticker)
+        if row is None or row.as_of != days[-1] or row.bars != len(days):
+            problems[ticker] = ['state']
+            continue
+        expected = {field: values[-1] for field, values in compute(opens, closes).items()}
+        differ = [
+            field for field in FIELDS
+            if (getattr(row, field) is None) != bool(np.isnan(expected[field]))
+            or (getattr(row, field) is not None
+                and not math.isclose(getattr(row, field), expected[field], rel_tol=tolerance, abs_tol=tolerance))
+        ]
+        if differ:
+            problems[ticker] = differ
+    return problems
+
+
+def latest_bar(stock):
+    """
+    The latest StockPrice of a stock with its number of bars as `.bars`, or None. One query,
+    the count is a window over the same rows.
+    """
+    return stock.prices.annotate(bars=Window(Count('id'))).order_by('-date').first()
+
+
+def _current(stock, latest):
+    """The stock's IndicatorState if it is in step with its bars (see latest_bar()), else None."""
+    try:
+        row = stock.indicators
+    except IndicatorState.DoesNotExist:
+        return None
+    closes = row.state['closes']
+    # Bars inserted or deleted without going through advance() (an import, a cleanup) change
+    # the count even when the last bar is the same
+    if (row.as_of != latest.date or row.bars != latest.bars
+            or not closes or closes[-1] != int(latest.close_price * 100)):
+        return None
+    return row
+
+
+def stored_windows(stock, latest):
+    """
+    (closes in paise, volumes), newest first, of the last 200 bars from the stock's stored state,
+    or None when the state isn't in step with its bars. `latest` comes from latest_bar().
+    """
+    row = _current(stock, latest)
+    if row is None:
+        return None
+    return row.state['closes'][::-1], row.state['volumes'][::-1]
+
+
+def indicator_values(stock):
+    """
+    {'as_of', 'bars', indicator values} of a stock, None when it has no bars. A missing or stale
+    state is rebuilt and stored, so the history is replayed once and not on every request.
+    """
+    latest = latest_bar(stock)
+    if latest is None:
+        return None
+    row = _current(stock, latest)
+    if row is None:
+        rebuild([stock.ticker])
+        row = IndicatorState.objects.get(stock=stock.ticker)
+    return {'as_of': row.as_of, 'bars': row.bars, **{field: getattr(row, field) for field in FIELDS}}
@@ -0,0 +1,246 @@
+"""
+Market data ingestion pipeline.
+
+Fetching runs on a pool of worker threads (bounded by the provider's own
+concurrency limit) and hands results to the writer through a bounded queue.
+All database writes happen on the calling thread, so Django connections are
+never shared between threads and a slow database applies back-pressure to
+the fetchers instead of letting downloaded frames pile up in memory.
+"""
+import logging
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Max
+
+from .alerts import evaluate_alerts
+from .cache import bump_data_version
+from .indicators import advance as advance_indicators
+from .models import Stock, StockPrice
+from .providers import DEFAULT_START_DATE
+from .store import EPOCH_ORDINAL, get_store, rebuild as rebuild_store
+
+logger = logging.getLogger(__name__)
+
+_BATCH_DONE = object()
+
+
+class IngestionPipeline:
+    def __init__(self, provider, workers=1, batch_size=1, queue_size=None, log=None):
+        self.provider = provider
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.queue_size = queue_size or self.workers * 2
+        self.log = log or (lambda message, style=None: None)
+
+    def run(self, tickers):
+        """
+        Ingests the given tickers.
+        Returns {'changed': set of tickers whose prices changed, 'failed': {ticker: error},
+                 'stats': {ticker: upsert stats}, 'alerts': evaluate_alerts() report}.
+        """
+        tickers = list(tickers)
+        start_dates = self._start_dates(tickers)
+        batches = [tickers[i:i + self.batch_size] for i in range(0, len(tickers), self.batch_size)]
+        results = queue.Queue(maxsize=self.queue_size)
+        report = {'changed': set(), 'failed': {}, 'stats': {}, 'alerts': None}
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for batch in batches:
+                pool.submit(self._fetch_batch, batch, start_dates, results)
+
+            remaining = len(batches)
+            while remaining:
+                item = results.get()
+                if item is _BATCH_DONE:
+                    remaining -= 1
+                    continue
+
+                ticker, info, history, error = item
+                if error is not None:
+                    report['failed'][ticker] = error
+                    self.log(f"Failed to process {ticker}: {error}", 'ERROR')
+                    continue
+                try:
+                    stats = report['stats'][ticker] = self.store(ticker, info, history)
+                    if stats['inserted'] or stats['updated']:
+                        report['changed'].add(ticker)
+                except Exception as e:
+                    report['failed'][ticker] = e
+                    self.log(f"Failed to process {ticker}: {e}", 'ERROR')
+
+        # Company info is rewritten for every stored ticker, prices for the changed ones. The
+        # prices are committed already, so this comes before anything else that could fail
+        if report['stats']:
+            bump_data_version(report['stats'])
+
+        # Watchlist thresholds crossed by the new closes. A failure here is logged, the bars stay
+        # and the alerts are caught up by the next run (evaluate_alerts skips what already fired)
+        if report['changed']:
+            try:
+                report['alerts'] = evaluate_alerts(
+                    {ticker: date.fromisoformat(start_dates[ticker]) for ticker in report['changed']}
+                )
+            except Exception as e:
+                logger.exception("Watchlist alert evaluation failed")
+                self.log(f"Failed to evaluate watchlist alerts: {e}", 'ERROR')
+            else:
+                if report['alerts']['fired']:
+                    self.log(f"Fired {report['alerts']['fired']} watchlist alerts", 'SUCCESS')
+        return report
+
+    def _start_dates(self, tickers):
+        # Resume each ticker from its last stored date (one grouped query for all of them).
+        # The last day is deliberately re-read: an intraday bar stored earlier gets corrected by the upsert.
+        last_dates = dict(
+            StockPrice.objects.filter(ticker__in=tickers)
+            .values_list('ticker')
+            .annotate(last=Max('date'))
+            .values_list('ticker', 'last')
+        )
+        return {
+            ticker: last_dates[ticker].strftime('%Y-%m-%d') if ticker in last_dates else DEFAULT_START_DATE
+            for ticker in tickers
+        }
+
+    def _fetch_batch(self, batch, start_dates, results):
+        """Runs on a worker thread: fetch info + history for a batch and queue the results."""
+        try:
+            infos = {}
+            for ticker in batch:
+                try:
+                    with self.provider.slots:
+                        infos[ticker] = self.provider.fetch_info(ticker)
+                except Exception as e:
+                    results.put((ticker, None, None, e))
+
+            tickers = [ticker for ticker in batch if ticker in infos]
+            if not tickers:
+                return
+
+            try:
+                if self.provider.supports_batch and len(tickers) > 1:
+                    # One multi-ticker download from the earliest start date of the batch
+                    with self.provider.slots:
+                        histories = self.provider.fetch_histories(tickers, min(start_dates[t] for t in tickers))
+                else:
+                    histories = {}
+                    for ticker in tickers:
+                        with self.provider.slots:
+                            histories[ticker] = self.provider.fetch_history(ticker, start_dates[ticker])
+            except Exception as e:
+                for ticker in tickers:
+                    results.put((ticker, None, None, e))
+                return
+
+            for ticker in tickers:
+                results.put((ticker, infos[ticker], histories.get(ticker), None))
+        finally:
+            results.put(_BATCH_DONE)
+
+    def store(self, ticker_symbol, info, history):
+        """
+        Writes one ticker's company info and upserts its price history.
+        Returns {'inserted', 'updated', 'skipped', 'elapsed'} for the ticker.
+        """
+        started = time.perf_counter()
+
+        # Handle cases where info might be missing keys
+        stock, created = Stock.objects.update_or_create(
+            ticker=ticker_symbol,
+            defaults={
+                'company_name': info.get('longName', ticker_symbol),
+                'sector': info.get('sector', 'Unknown'),
+                'logo_url': info.get('logo_url', '') # yfinance often doesn't give logo_url directly, might need a clearbit API or similar later
+            }
+        )
+
+        if created:
+            self.log(f"Created stock: {stock.company_name}", 'SUCCESS')
+        else:
+            self.log(f"Updated stock: {stock.company_name}")
+
+        stats = upsert_prices(stock, history)
+        stats['elapsed'] = time.perf_counter() - started
+        self.log(
+            f"{ticker_symbol}: {stats['inserted']} inserted, {stats['updated']} updated, "
+            f"{stats['skipped']} skipped in {stats['elapsed']:.3f}s",
+            'SUCCESS' if stats['inserted'] or stats['updated'] else None,
+        )
+        return stats
+
+
+def upsert_prices(stock, history, batch_size=1000):
+    """
+    Set-based upsert of a provider history frame (Open / Close / Volume, indexed by date).
+    Existing bars for the covered date range are loaded in one query; new dates are
+    bulk-inserted, bars whose values changed (e.g. the partial last day we re-read on
+    every run) are bulk-updated, identical ones are skipped.
+    Returns {'inserted', 'updated', 'skipped'}.
+    """
+    stats = {'inserted': 0, 'updated': 0, 'skipped': 0}
+    if history is None or history.empty:
+        return stats
+
+    import pandas as pd  # history is a DataFrame already, this only looks it up
+
+    # Work on column arrays, never on pandas rows
+    frame = history[['Open', 'Close', 'Volume']]
+    valid = frame.notna().all(axis=1).to_numpy()
+    stats['skipped'] += int((~valid).sum())
+    frame = frame[valid]
+    dates = pd.Index(frame.index.date)
+    keep_last = ~dates.duplicated(keep='last')
+    stats['skipped'] += int((~keep_last).sum())
+    dates = dates[keep_last]
+    opens = np.rint(frame['Open'].to_numpy(dtype=float)[keep_last] * 100).astype(np.int64)
+    closes = np.rint(frame['Close'].to_numpy(dtype=float)[keep_last] * 100).astype(np.int64)
+    volumes = frame['Volume'].to_numpy()[keep_last].astype(np.int64)
+    if not len(dates):
+        return stats
+
+    existing = {
+        price.date: price
+        for price in StockPrice.objects.filter(ticker=stock, date__gte=dates.min(), date__lte=dates.max())
+    }
+
+    to_create, to_update = [], []
+    for day, open_paise, close_paise, volume in zip(dates, opens.tolist(), closes.tolist(), volumes.tolist()):
+        open_price = Decimal(open_paise).scaleb(-2)
+        close_price = Decimal(close_paise).scaleb(-2)
+        price = existing.get(day)
+        if price is None:
+            to_create.append(StockPrice(ticker=stock, date=day, open_price=open_price, close_price=close_price, volume=volume))
+        elif (price.open_price, price.close_price, price.volume) != (open_price, close_price, volume):
+            price.open_price, price.close_price, price.volume = open_price, close_price, volume
+            to_update.append(price)
+        else:
+            stats['skipped'] += 1
+
+    with transaction.atomic():
+        if to_create:
+            StockPrice.objects.bulk_create(to_create, batch_size=batch_size)
+        if to_update:
+            StockPrice.objects.bulk_update(to_update, ['open_price', 'close_price', 'volume'], batch_size=batch_size)
+        if to_create or to_update:
+            # The indicators move with the bars they were computed from
+            advance_indicators(stock.ticker, list(dates), opens.tolist(), closes.tolist(), volumes.tolist(),
+                               since=min(price.date for price in to_create + to_update))
+    stats['inserted'] = len(to_create)
+    stats['updated'] = len(to_update)
+
+    store = get_store()
+    if store is not None and (to_create or to_update):
+        if store.read(stock.ticker) is None:
+            # First write since the store was enabled, copy the whole history over
+            rebuild_store(store, [stock.ticker])
+        else:
+            # Mirror the same bars into the read-side store (already in paise)
+            days = np.array([day.toordinal() for day in dates], dtype=np.int64) - EPOCH_ORDINAL
+            store.merge(stock.ticker, days, opens, closes, volumes)
+    return stats
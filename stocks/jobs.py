@@ -0,0 +1,167 @@
+"""
+DB-backed queue of ingestion jobs.
+
+Jobs are claimed with a conditional UPDATE (works the same on SQLite and
+PostgreSQL), processed in small chunks of tickers and checkpointed after
+every chunk. A running job whose heartbeat goes stale (worker killed,
+dyno restarted) is reclaimed by the next worker and resumes from its
+checkpoint.
+"""
+import os
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .ingestion import IngestionPipeline
+from .models import IngestJob
+from .providers import get_provider
+from .utils import refresh_health_scores
+
+# A running job that hasn't checkpointed for this long is considered abandoned
+STALE_AFTER = timedelta(minutes=10)
+
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def enqueue_ingest(tickers, provider='yahoo', workers=1, batch_size=1):
+    return IngestJob.objects.create(
+        tickers=list(tickers),
+        options={'provider': provider, 'workers': workers, 'batch_size': batch_size},
+    )
+
+
+def claim_next_job(worker=None, stale_after=STALE_AFTER):
+    """Atomically takes the oldest queued (or abandoned running) job. Returns None if the queue is empty."""
+    worker = worker or worker_id()
+    stale_before = timezone.now() - stale_after
+    candidates = (
+        IngestJob.objects.filter(status=IngestJob.QUEUED)
+        | IngestJob.objects.filter(status=IngestJob.RUNNING, heartbeat_at__lt=stale_before)
+    ).order_by('created_at', 'id').values_list('id', 'status', 'heartbeat_at')[:10]
+
+    for job_id, status, heartbeat_at in candidates:
+        now = timezone.now()
+        # Only one worker can win this UPDATE: the row has to still look the way we saw it
+        claimed = IngestJob.objects.filter(id=job_id, status=status, heartbeat_at=heartbeat_at).update(
+            status=IngestJob.RUNNING, worker=worker, heartbeat_at=now,
+        )
+        if claimed:
+            job = IngestJob.objects.get(id=job_id)
+            if job.started_at is None:
+                job.started_at = now
+            job.attempts += 1
+            job.save(update_fields=['started_at', 'attempts'])
+            return job
+    return None
+
+
+def run_job(job, log=None):
+    """Processes the job from its checkpoint, saving progress after every chunk of tickers."""
+    log = log or (lambda message, style=None: None)
+    options = job.options or {}
+    workers = options.get('workers') or 1
+    batch_size = options.get('batch_size') or 1
+    pipeline = IngestionPipeline(
+        get_provider(options.get('provider') or 'yahoo'),
+        workers=workers,
+        batch_size=batch_size,
+        log=log,
+    )
+    # One chunk is what the pipeline can work on in parallel; it is also the checkpoint granularity
+    chunk_size = max(1, workers * batch_size)
+
+    try:
+        while job.position < len(job.tickers):
+            chunk = job.tickers[job.position:job.position + chunk_size]
+            report = pipeline.run(chunk)
+            if report['changed']:
+                refresh_health_scores(report['changed'])
+
+            for ticker in chunk:
+                if ticker in report['failed']:
+                    job.results[ticker] = {'error': str(report['failed'][ticker])}
+                else:
+                    stats = report['stats'].get(ticker, {})
+                    job.results[ticker] = {key: stats.get(key, 0) for key in ('inserted', 'updated', 'skipped')}
+            job.position += len(chunk)
+            job.heartbeat_at = timezone.now()
+            job.save(update_fields=['results', 'position', 'heartbeat_at'])
+    except Exception as e:
+        job.status = IngestJob.FAILED
+        job.error = ''.join(traceback.format_exception_only(type(e), e)).strip()
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at'])
+        log(f"Job {job.pk} failed: {job.error}", 'ERROR')
+        return job
+
+    job.status = IngestJob.DONE
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'finished_at'])
+    return job
+
+
+def drain_queue(log=None, stale_after=STALE_AFTER):
+    """Runs jobs until the queue is empty. Returns the number of jobs processed."""
+    processed = 0
+    while True:
+        job = claim_next_job(stale_after=stale_after)
+        if job is None:
+            return processed
+        run_job(job, log=log)
+        processed += 1
+
+
+_embedded_lock = threading.Lock()
+_embedded_thread = None
+
+
+def start_embedded_worker():
+    """
+    Drains the queue on a daemon thread inside the web process, for hosts where we can't
+    run a separate worker (settings.INGEST_EMBEDDED_WORKER). At most one thread per process.
+    """
+    global _embedded_thread
+    if not getattr(settings, 'INGEST_EMBEDDED_WORKER', False):
+        return False
+
+    def target():
+        try:
+            drain_queue()
+        finally:
+            # The thread had its own connection, don't leak it
+            connection.close()
+
+    with _embedded_lock:
+        if _embedded_thread is not None and _embedded_thread.is_alive():
+            return False
+        _embedded_thread = threading.Thread(target=target, name='ingest-worker', daemon=True)
+        _embedded_thread.start()
+    return True
+
+
+def job_status(job):
+    total = len(job.tickers)
+    return {
+        'id': job.pk,
+        'status': job.status,
+        'total': total,
+        'completed': job.position,
+        'progress': round(100 * job.position / total, 1) if total else 100.0,
+        'next_ticker': job.tickers[job.position] if job.position < total else None,
+        'failed': sorted(ticker for ticker, result in job.results.items() if 'error' in result),
+        'results': job.results,
+        'options': job.options,
+        'attempts': job.attempts,
+        'error': job.error,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'heartbeat_at': job.heartbeat_at,
+        'finished_at': job.finished_at,
+    }
@@ -0,0 +1,74 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from stocks.bench import BASELINE_PATH, BENCH_CACHES, DEFAULT_CONFIG, Suite, compare, load_baseline, save_baseline, seed_market
+
+class Command(BaseCommand):
+    help = 'Runs the API / scoring benchmarks on a seeded synthetic market in a throwaway test database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tickers', type=int, help=f"Tickers to seed (default: baseline config or {DEFAULT_CONFIG['tickers']})")
+        parser.add_argument('--years', type=int, help=f"Years of daily bars (default: baseline config or {DEFAULT_CONFIG['years']})")
+        parser.add_argument('--news', type=int, help=f"Headlines per ticker (default: baseline config or {DEFAULT_CONFIG['news']})")
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per case (the median is reported)')
+        parser.add_argument('--only', nargs='*', help='Run only these cases')
+        parser.add_argument('--baseline', default=str(BASELINE_PATH), help='Baseline JSON file')
+        parser.add_argument('--tolerance', type=float, default=0.5, help='Allowed relative slowdown before a case is reported as slower')
+        parser.add_argument('--fail-on-timings', action='store_true',
+                            help="Fail on slowdowns too, only meaningful on the machine that recorded the baseline")
+        parser.add_argument('--update-baseline', action='store_true', help='Write the results as the new baseline')
+
+    def handle(self, *args, **kwargs):
+        baseline = load_baseline(kwargs['baseline'])
+        config = dict((baseline or {}).get('config') or DEFAULT_CONFIG)
+        for key in ('tickers', 'years', 'news'):
+            if kwargs.get(key) is not None:
+                config[key] = kwargs[key]
+
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            # Inside a transaction like the test suite, so savepoints are counted the same way in both
+            with override_settings(CACHES=BENCH_CACHES), transaction.atomic():
+                started = time.perf_counter()
+                tickers = seed_market(**config)
+                self.stdout.write(
+                    f"Seeded {config['tickers']} tickers x {config['years']} years, {config['news']} headlines each "
+                    f"in {time.perf_counter() - started:.1f}s"
+                )
+                results = Suite(tickers, years=config['years']).run(repeat=kwargs['repeat'], only=kwargs.get('only'))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        base_cases = (baseline or {}).get('cases', {})
+        for name, result in results.items():
+            base = base_cases.get(name)
+            against = f"   (baseline {base['ms']:.2f} ms, {base['queries']} queries)" if base else ""
+            self.stdout.write(f"{name:<20} {result['ms']:>9.2f} ms {result['queries']:>4} queries{against}")
+
+        if kwargs['update_baseline']:
+            save_baseline(results, config, kwargs['baseline'])
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {kwargs['baseline']}"))
+            return
+        if baseline is None:
+            self.stdout.write(self.style.WARNING("No baseline yet, run with --update-baseline to record one."))
+            return
+        if baseline.get('config') != config:
+            self.stdout.write(self.style.WARNING("Market size differs from the baseline's, not comparing."))
+            return
+
+        regressions, slowdowns = compare(results, baseline, kwargs['tolerance'])
+        if kwargs['fail_on_timings']:
+            regressions, slowdowns = regressions + slowdowns, []
+        if slowdowns:
+            # Milliseconds recorded on another machine aren't a pass / fail gate, query counts are
+            self.stdout.write(self.style.WARNING(
+                f"Slower than the baseline (tolerance {kwargs['tolerance']:.0%}, timings are machine dependent):\n  "
+                + "\n  ".join(slowdowns)))
+        if regressions:
+            raise CommandError("Performance regressions:\n  " + "\n  ".join(regressions))
+        self.stdout.write(self.style.SUCCESS("No query count regressions." if slowdowns else
+                                             f"No regressions (tolerance {kwargs['tolerance']:.0%})."))
@@ -0,0 +1,92 @@
+import time
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, Max
+from django.test.utils import CaptureQueriesContext
+from stocks.alerts import evaluate_alerts
+from stocks.models import FiredAlert, StockPrice, Watchlist
+from stocks.utils import latest_prices_by_ticker
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the watchlist alert engine on synthetic watchlists (everything is rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=300000, help='Watchlist rows to generate')
+        parser.add_argument('--tickers', type=int, default=50, help='Tickers the rows are spread over')
+        parser.add_argument('--users', type=int, default=5000, help='Users owning the rows')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **kwargs):
+        tickers = list(
+            StockPrice.objects.values('ticker').annotate(bars=Count('id')).filter(bars__gte=2)
+            .order_by('ticker').values_list('ticker', flat=True)[:kwargs['tickers']]
+        )
+        if not tickers:
+            raise CommandError("Need stocks with price history, run ingest_data first.")
+        try:
+            with transaction.atomic():
+                self.run(tickers, kwargs['rows'], kwargs['users'], kwargs['seed'])
+                raise Rollback
+        except Rollback:
+            self.stdout.write("Rolled back the synthetic watchlists.")
+
+    def run(self, tickers, n_rows, n_users, seed):
+        rng = np.random.default_rng(seed)
+        closes = {ticker: rows[0][0] for ticker, rows in latest_prices_by_ticker(tickers, 1, fields=('close_paise',)).items()}
+
+        started = time.perf_counter()
+        users = User.objects.bulk_create(
+            [User(username=f"bench-alerts-{i}", password='!') for i in range(n_users)], batch_size=2000)
+        if not users[0].pk:
+            users = list(User.objects.filter(username__startswith='bench-alerts-').order_by('id'))
+        owners = rng.integers(0, len(users), n_rows)
+        picks = rng.integers(0, len(tickers), n_rows)
+        # Thresholds within +-10% of the latest close, where the last bar is likely to cross some
+        factors = rng.uniform(0.9, 1.1, n_rows)
+        Watchlist.objects.bulk_create([
+            Watchlist(
+                user_id=users[owner].pk,
+                ticker_id=tickers[pick],
+                alert_price=round(closes[tickers[pick]] * factor) / 100,
+            )
+            for owner, pick, factor in zip(owners.tolist(), picks.tolist(), factors.tolist())
+        ], batch_size=5000)
+        self.stdout.write(
+            f"Created {n_rows} watchlist rows over {len(tickers)} tickers in {time.perf_counter() - started:.1f}s"
+        )
+
+        # Evaluate the last bar of every ticker, as if it had just been ingested
+        start_dates = dict(
+            StockPrice.objects.filter(ticker__in=tickers).values_list('ticker')
+            .annotate(last=Max('date')).values_list('ticker', 'last')
+        )
+        for label in ("First run", "Re-run (dedupe)"):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                report = evaluate_alerts(start_dates)
+                elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"{label}: {report['fired']} fired, {report['duplicates']} duplicates, "
+                f"{report['checked']} of {n_rows} rows in range, {len(queries)} queries, {elapsed * 1000:.0f} ms"
+            )
+
+        # Baseline: scan every watchlist row of these tickers and test it in Python
+        last_two = latest_prices_by_ticker(tickers, 2, fields=('close_paise',))
+        started = time.perf_counter()
+        fired = 0
+        for ticker_id, alert_price in Watchlist.objects.filter(ticker__in=tickers).values_list('ticker_id', 'alert_price').iterator(chunk_size=10000):
+            (close,), (previous,) = last_two[ticker_id]
+            threshold = int(alert_price * 100)
+            fired += (previous < threshold <= close) or (previous > threshold >= close)
+        self.stdout.write(
+            f"Full scan baseline: {fired} crossings in {(time.perf_counter() - started) * 1000:.0f} ms"
+        )
+        self.stdout.write(self.style.SUCCESS(f"{FiredAlert.objects.count()} alerts recorded"))
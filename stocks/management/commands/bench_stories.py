@@ -0,0 +1,122 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from stocks.providers import NIFTY_100
+from stocks.stories import STORY_WINDOW, cluster, signatures
+
+EVENTS = [
+    "{name} shares {up} {pct}% after Q{q} profit beats estimates",
+    "{name} {down} {pct}% as margins come under pressure in Q{q}",
+    "{name} announces Rs {amount} crore buyback, analysts {upbeat}",
+    "Regulator opens probe into {name} accounting, shares {down} {pct}%",
+    "{name} wins Rs {amount} crore order, stock hits 52-week high",
+    "{name} misses Q{q} estimates on weak demand, stock {down} {pct}%",
+    "{name} to raise Rs {amount} crore via QIP, board approves plan",
+    "Brokerages cut {name} target by {pct}% citing slowdown",
+    "{name} expands capacity with Rs {amount} crore plant in {state}",
+    "{name} CEO resigns unexpectedly, shares {down} {pct}%",
+]
+WORDS = {
+    'up': ["surge", "jump", "soar", "rally", "climb"],
+    'down': ["slumps", "falls", "drops", "tumbles", "slides"],
+    'upbeat': ["upbeat", "bullish", "positive"],
+    'state': ["Gujarat", "Odisha", "Tamil Nadu", "Maharashtra", "Karnataka"],
+}
+OUTLETS = ["Reuters", "Moneycontrol", "Economic Times", "Business Standard", "Mint", "NDTV Profit", "CNBC-TV18"]
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks headline clustering (MinHash / LSH) on a synthetic corpus with known stories'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--headlines', type=int, default=100000, help='Headlines to generate')
+        parser.add_argument('--tickers', type=int, default=100, help='Tickers the stories are spread over')
+        parser.add_argument('--days', type=int, default=365, help='Days the stories are spread over')
+        parser.add_argument('--brute-force', type=int, default=5000, help='Headlines of the all-pairs comparison')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def corpus(self, n, n_tickers, n_days, rng):
+        """
+        (ticker, published_at, headline, true story) sorted by time; each story gets 1-6 reworded copies.
+        A ticker doesn't get the same kind of event twice within two story windows, a second
+        "X falls 3% on weak demand" that close to the first really is the same story.
+        """
+        tickers = (NIFTY_100 * (n_tickers // len(NIFTY_100) + 1))[:n_tickers]
+        start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        rows = []
+        last = {}
+        story = 0
+        while len(rows) < n:
+            ticker = tickers[rng.integers(len(tickers))]
+            template = EVENTS[rng.integers(len(EVENTS))]
+            at = start + timedelta(minutes=int(rng.integers(n_days * 24 * 60)))
+            if any(abs(at - other) < 2 * STORY_WINDOW for other in last.get((ticker, template), ())):
+                continue
+            last.setdefault((ticker, template), []).append(at)
+            details = {'name': ticker.split('.')[0].title(), 'pct': int(rng.integers(1, 15)), 'q': int(rng.integers(1, 5)),
+                       'amount': f"{int(rng.integers(1, 99)) * 100:,}", 'state': WORDS['state'][rng.integers(5)]}
+            for _ in range(int(rng.integers(1, 7))):
+                words = {key: values[rng.integers(len(values))] for key, values in WORDS.items() if key != 'state'}
+                headline = template.format(**details, **words)
+                if rng.random() < 0.3:
+                    headline = headline.upper() if rng.random() < 0.2 else headline.replace(" shares", "")
+                if rng.random() < 0.7:
+                    headline += f" - {OUTLETS[rng.integers(len(OUTLETS))]}"
+                rows.append((ticker, at + timedelta(minutes=int(rng.integers(0, 12 * 60))), headline, story))
+            story += 1
+        rows = rows[:n]
+        rows.sort(key=lambda row: row[1])
+        return rows
+
+    def handle(self, *args, **kwargs):
+        rng = np.random.default_rng(kwargs['seed'])
+        rows = self.corpus(kwargs['headlines'], kwargs['tickers'], kwargs['days'], rng)
+        self.stdout.write(f"{len(rows)} headlines, {len({row[3] for row in rows})} true stories, "
+                          f"{kwargs['tickers']} tickers over {kwargs['days']} days")
+
+        started = time.perf_counter()
+        signatures([headline for _, _, headline, _ in rows])
+        signing = time.perf_counter() - started
+        self.stdout.write(f"MinHash signatures    {signing:7.2f}s  {len(rows) / signing:10,.0f} headlines/s")
+
+        by_ticker = {}
+        for i, (ticker, at, headline, _) in enumerate(rows):
+            by_ticker.setdefault(ticker, []).append((i, at, headline))
+        predicted = [None] * len(rows)
+        candidates = indexed = 0
+        started = time.perf_counter()
+        for ticker, items in by_ticker.items():
+            stories, _, index = cluster([h for _, _, h in items], [i for i, _, _ in items], [at for _, at, _ in items])
+            for (i, _, _), story in zip(items, stories):
+                predicted[i] = (ticker, story)
+            candidates += index.candidates
+            indexed += len(index)
+        clustering = time.perf_counter() - started
+        self.stdout.write(f"Sign + index + match  {clustering:7.2f}s  {len(rows) / clustering:10,.0f} headlines/s")
+        window = STORY_WINDOW.total_seconds() / 86400
+        self.stdout.write(f"Candidates compared   {candidates / len(rows):7.2f} per headline "
+                          f"(vs {len(rows) / kwargs['tickers'] * window / kwargs['days']:.1f} headlines per ticker window)")
+
+        # Pairwise precision / recall against the true stories
+        pairs = lambda counts: sum(c * (c - 1) // 2 for c in counts.values())
+        true, pred, both = {}, {}, {}
+        for row, group in zip(rows, predicted):
+            true[row[3]] = true.get(row[3], 0) + 1
+            pred[group] = pred.get(group, 0) + 1
+            both[(group, row[3])] = both.get((group, row[3]), 0) + 1
+        same = pairs(both)
+        self.stdout.write(f"Stories found         {len(pred)} (true {len(true)}), pairwise precision "
+                          f"{same / max(pairs(pred), 1):.3f}, recall {same / max(pairs(true), 1):.3f}")
+
+        # What the index saves: every pair of a sample compared directly
+        sample = [headline for _, _, headline, _ in rows[:kwargs['brute_force']]]
+        if len(sample) > 1:
+            started = time.perf_counter()
+            sample_signatures = signatures(sample)
+            for i in range(1, len(sample)):
+                np.count_nonzero(sample_signatures[:i] == sample_signatures[i], axis=1)
+            brute = time.perf_counter() - started
+            self.stdout.write(f"All pairs of {len(sample)}     {brute:7.2f}s  {len(sample) / brute:10,.0f} headlines/s "
+                              f"(grows with the square of the corpus)")
@@ -0,0 +1,104 @@
+import json
+import os
+import subprocess
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from stocks.warmup import HEAVY_MODULES, READ_ONLY_STEPS, STEPS
+
+# Runs in a fresh interpreter so every import is cold
+PROBE = """
+import importlib, json, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter()
+importlib.import_module({urlconf!r})
+urls = time.perf_counter()
+report = {{
+    'setup_ms': (setup - started) * 1000,
+    'urlconf_ms': (urls - setup) * 1000,
+    'heavy_on_request_path': [name for name in {heavy!r} if name in sys.modules],
+    'modules': len(sys.modules),
+}}
+if {steps!r}:
+    from stocks.warmup import warm_up
+    report['warmup'] = warm_up({steps!r})
+print(json.dumps(report))
+"""
+
+
+def parse_importtime(stderr, top):
+    """
+    Packages by cumulative import time (microseconds) from `python -X importtime`, counting each
+    package's outermost imports only (its submodules are part of their cumulative time).
+    """
+    lines = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        lines.append((depth, int(cumulative), name.strip().split('.')[0]))
+
+    packages = {}
+    stack = []  # ancestors of the current line: importtime prints children before their parent
+    for depth, cumulative, package in reversed(lines):
+        while stack and stack[-1][0] >= depth:
+            stack.pop()
+        if package not in {ancestor for _, ancestor in stack}:
+            packages[package] = packages.get(package, 0) + cumulative
+        stack.append((depth, package))
+    return sorted(packages.items(), key=lambda item: -item[1])[:top]
+
+
+class Command(BaseCommand):
+    help = 'Reports cold import / boot / warm-up times of a fresh process, failing on heavy imports in the request path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--steps', default=','.join(READ_ONLY_STEPS),
+                            help="Warm-up steps to time (empty for none). The default ones write nothing; "
+                                 "scores and rows write to the database / the shared cache and have to be asked for")
+        parser.add_argument('--top', type=int, default=12, help='Slowest imported packages to list')
+        parser.add_argument('--budget-ms', type=float, help='Fail when django.setup() + URLconf import take longer')
+        parser.add_argument('--json', action='store_true', help='Print the raw report as JSON')
+
+    def handle(self, *args, **kwargs):
+        steps = [step for step in kwargs['steps'].split(',') if step]
+        unknown = set(steps) - set(STEPS)
+        if unknown:
+            raise CommandError(f"Unknown warm-up steps: {', '.join(sorted(unknown))}")
+
+        probe = PROBE.format(urlconf=settings.ROOT_URLCONF, heavy=HEAVY_MODULES, steps=steps)
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'marketsentry.settings')}
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', probe], capture_output=True, text=True, env=env,
+            cwd=settings.BASE_DIR,
+        )
+        if result.returncode:
+            raise CommandError(f"Boot probe failed:\n{result.stderr[-2000:]}")
+        report = json.loads(result.stdout.strip().splitlines()[-1])
+        report['top_imports_ms'] = [(name, round(us / 1000, 1)) for name, us in parse_importtime(result.stderr, kwargs['top'])]
+
+        if kwargs['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.stdout.write(f"django.setup()        {report['setup_ms']:8.1f} ms")
+            self.stdout.write(f"URLconf import        {report['urlconf_ms']:8.1f} ms  ({report['modules']} modules loaded)")
+            for name, step in report.get('warmup', {}).items():
+                outcome = step.get('error') or step['result']
+                self.stdout.write(f"warm-up {name:<13} {step['seconds'] * 1000:8.1f} ms  ({outcome})")
+            self.stdout.write("Slowest imports:")
+            for name, ms in report['top_imports_ms']:
+                self.stdout.write(f"  {name:<24} {ms:8.1f} ms")
+
+        problems = []
+        if report['heavy_on_request_path']:
+            problems.append(f"the URLconf imports {', '.join(report['heavy_on_request_path'])}, keep them lazy")
+        boot_ms = report['setup_ms'] + report['urlconf_ms']
+        if kwargs['budget_ms'] is not None and boot_ms > kwargs['budget_ms']:
+            problems.append(f"boot took {boot_ms:.0f} ms, budget {kwargs['budget_ms']:.0f} ms")
+        if problems:
+            raise CommandError("; ".join(problems))
+        if not kwargs['json']:
+            self.stdout.write(self.style.SUCCESS(f"Boot {boot_ms:.0f} ms, no heavy imports on the request path."))
@@ -0,0 +1,24 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from stocks.store import get_store, rebuild
+
+class Command(BaseCommand):
+    help = 'Regenerates the memory-mapped price store (settings.PRICE_STORE_DIR) from the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tickers', nargs='*', help='Tickers to rebuild (default: all, and drop stale files)')
+
+    def handle(self, *args, **kwargs):
+        store = get_store()
+        if store is None:
+            raise CommandError("The price store is disabled, set PRICE_STORE_DIR first.")
+
+        def log(message, style=None):
+            self.stdout.write(getattr(self.style, style)(message) if style else message)
+
+        started = time.perf_counter()
+        written = rebuild(store, kwargs.get('tickers') or None, log=log if kwargs['verbosity'] > 1 else None)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {sum(written.values())} bars for {len(written)} tickers to {store.root} in {elapsed:.2f}s"
+        ))
@@ -0,0 +1,27 @@
+import time
+from django.core.management.base import BaseCommand
+from stocks.cache import bump_data_version
+from stocks.models import Stock
+from stocks.score_history import update_score_history
+
+class Command(BaseCommand):
+    help = 'Computes the daily health score history (only the days not stored yet, unless --full)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tickers', nargs='*', help='Tickers to update (default: all stocks)')
+        parser.add_argument('--full', action='store_true', help='Recompute every day instead of appending')
+        parser.add_argument('--chunk-size', type=int, default=20, help='Tickers loaded and written per batch')
+
+    def handle(self, *args, **kwargs):
+        tickers = kwargs.get('tickers') or list(Stock.objects.order_by('ticker').values_list('ticker', flat=True))
+        started = time.perf_counter()
+        written = 0
+        for i in range(0, len(tickers), kwargs['chunk_size']):
+            chunk = tickers[i:i + kwargs['chunk_size']]
+            written += update_score_history(chunk, full=kwargs['full'])
+            if kwargs['verbosity'] > 1:
+                self.stdout.write(f"  {chunk[0]} .. {chunk[-1]}: {written} rows so far")
+        bump_data_version(tickers)
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {written} score history rows for {len(tickers)} tickers in {time.perf_counter() - started:.2f}s"
+        ))
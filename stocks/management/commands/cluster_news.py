@@ -0,0 +1,28 @@
+import time
+from django.core.management.base import BaseCommand
+from stocks.models import NewsArticle
+from stocks.score_history import update_score_history
+from stocks.stories import recluster
+from stocks.utils import refresh_health_scores
+
+class Command(BaseCommand):
+    help = 'Groups the stored headlines into stories (near-duplicate clustering) and rescores the stocks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tickers', nargs='*', help='Tickers to recluster (default: every stock with news)')
+        parser.add_argument('--no-refresh', action='store_true', help="Don't recompute the scores and score history")
+
+    def handle(self, *args, **kwargs):
+        tickers = kwargs.get('tickers') or list(
+            NewsArticle.objects.order_by('ticker').values_list('ticker', flat=True).distinct())
+        started = time.perf_counter()
+        report = recluster(tickers)
+        self.stdout.write(
+            f"Grouped {report['articles']} headlines of {len(tickers)} tickers into {report['stories']} stories "
+            f"in {time.perf_counter() - started:.2f}s."
+        )
+        if not kwargs['no_refresh'] and report['articles']:
+            # Every past day's sentiment may have changed
+            update_score_history(tickers, full=True)
+            refreshed = refresh_health_scores(tickers)
+            self.stdout.write(self.style.SUCCESS(f"Refreshed health scores and history for {refreshed} stocks."))
@@ -0,0 +1,53 @@
+import sys
+import time
+import tracemalloc
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from stocks.export import CHUNK_SIZE, COLUMNS, FORMATS, Export
+
+class Command(BaseCommand):
+    help = 'Streams price or news history to a CSV / Parquet / Arrow IPC file and reports the throughput'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(COLUMNS))
+        parser.add_argument('tickers', nargs='*', help='Tickers to export (default: all stocks)')
+        parser.add_argument('--start', type=date.fromisoformat, help='First date (YYYY-MM-DD)')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last date (YYYY-MM-DD)')
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+        parser.add_argument('--output', '-o', help='File to write (default: <dataset>.<extension>, - for stdout)')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Rows read and written per chunk')
+        parser.add_argument('--trace-memory', action='store_true',
+                            help='Also report the peak Python memory of the export (slows it down)')
+
+    def handle(self, *args, **kwargs):
+        try:
+            export = Export(kwargs['dataset'], kwargs['format'], kwargs['tickers'], kwargs['start'], kwargs['end'],
+                            chunk_size=kwargs['chunk_size'])
+        except ImportError as e:
+            raise CommandError(str(e))
+        output = kwargs['output'] or export.filename
+        # The report can't share stdout with the data
+        report = self.stderr if output == '-' else self.stdout
+
+        if kwargs['trace_memory']:
+            tracemalloc.start()
+        started = time.perf_counter()
+        written = 0
+        out = sys.stdout.buffer if output == '-' else open(output, 'wb')
+        try:
+            for chunk in export:
+                out.write(chunk)
+                written += len(chunk)
+        finally:
+            if out is not sys.stdout.buffer:
+                out.close()
+        elapsed = time.perf_counter() - started
+
+        memory = ""
+        if kwargs['trace_memory']:
+            memory = f", peak {tracemalloc.get_traced_memory()[1] / 2**20:.1f} MB traced"
+            tracemalloc.stop()
+        report.write(self.style.SUCCESS(
+            f"Exported {export.rows} {kwargs['dataset']} rows ({written / 2**20:.1f} MB {kwargs['format']}) to {output} "
+            f"in {elapsed:.2f}s, {export.rows / elapsed if elapsed else 0:,.0f} rows/s{memory}"
+        ))
@@ -1,12 +1,19 @@
-import random
-import feedparser
 from django.core.management.base import BaseCommand
-from stocks.models import Stock, NewsArticle
-from stocks.sentiment import analyze_text
-from django.utils import timezone
+from stocks.models import Stock
+from stocks.news import GOOGLE_NEWS_URL, NewsPipeline
+from stocks.sentiment import engine as sentiment_engine
+from stocks.utils import refresh_health_scores
 
 class Command(BaseCommand):
-    help = 'Fetches (mocks) news and analyzes sentiment'
+    help = 'Fetches news from Google News RSS and analyzes sentiment'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Number of feeds fetched concurrently')
+        parser.add_argument('--feed-url', default=GOOGLE_NEWS_URL, help='Feed URL template with {query} and/or {ticker} placeholders')
+        parser.add_argument('--force', action='store_true', help='Ignore stored ETag/Last-Modified and refetch every feed')
+
+    def log(self, message, style=None):
+        self.stdout.write(getattr(self.style, style)(message) if style else message)
 
     def handle(self, *args, **kwargs):
         self.stdout.write("Fetching real-time news from Google RSS...")
@@ -16,48 +23,28 @@ class Command(BaseCommand):
             self.stdout.write(self.style.WARNING("No stocks found. Run ingest_data first."))
             return
 
-        for stock in stocks:
-            try:
-                # RSS Feed for the specific ticker
-                # We append "stock news india" to get relevant context
-                query = f"{stock.company_name} stock news"
-                rss_url = f"https://news.google.com/rss/search?q={query.replace(' ', '+')}&hl=en-IN&gl=IN&ceid=IN:en"
-                
-                feed = feedparser.parse(rss_url)
-                
-                if not feed.entries:
-                    self.stdout.write(f"No news found for {stock.ticker}")
-                    continue
-
-                # Process top 5 articles
-                count = 0
-                for entry in feed.entries[:5]:
-                    headline = entry.title
-                    link = entry.link
-                    
-                    # Avoid duplicates (simple check by headline)
-                    if NewsArticle.objects.filter(ticker=stock, headline=headline).exists():
-                        continue
-                        
-                    try:
-                        # Analyze Sentiment
-                        score = analyze_text(headline)
-                        
-                        NewsArticle.objects.create(
-                            ticker=stock,
-                            headline=headline,
-                            url=link,
-                            sentiment_score=score
-                        )
-                        count += 1
-                    except Exception as sentiment_error:
-                         self.stdout.write(self.style.WARNING(f"Sentiment analysis failed for article: {sentiment_error}"))
-                         continue
-                
-                self.stdout.write(f"Added {count} articles for {stock.ticker}")
-
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f"Failed {stock.ticker}: {e}"))
-                continue
-        
+        pipeline = NewsPipeline(
+            workers=kwargs.get('workers') or 8,
+            url_template=kwargs.get('feed_url') or GOOGLE_NEWS_URL,
+            conditional=not kwargs.get('force'),
+            log=self.log,
+        )
+        report = pipeline.run(stocks)
+
+        for ticker, count in sorted(report['added'].items()):
+            self.stdout.write(f"Added {count} articles for {ticker}")
+        self.stdout.write(
+            f"{len(report['not_modified'])} feeds unchanged, {len(report['failed'])} failed, "
+            f"{report['joined']} new headlines grouped into existing stories."
+        )
+
+        # New headlines move the sentiment component of the score
+        if report['changed']:
+            refresh_health_scores(report['changed'])
+
+        stats = sentiment_engine.stats()
+        self.stdout.write(
+            f"Sentiment: {stats['misses']} analyzed, {stats['hits']} cache hits, "
+            f"{stats['analyze_seconds']:.3f}s scoring, {stats['lexicon_load_seconds']:.3f}s lexicon load."
+        )
         self.stdout.write(self.style.SUCCESS("Real-time news update complete."))
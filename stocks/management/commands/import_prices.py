@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from stocks.backfill import CHUNK_SIZE, PriceImporter
+
+class Command(BaseCommand):
+    help = 'Backfills prices from local CSV / Parquet files (multi-ticker or one ticker per file), resuming interrupted imports'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Files, or directories of .csv / .parquet files')
+        parser.add_argument('--ticker', help='Ticker of files without a ticker column (default: from the file name)')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Rows validated and committed per chunk')
+        parser.add_argument('--restart', action='store_true', help='Ignore checkpoints and load every file from the start')
+        parser.add_argument('--no-refresh', action='store_true', help="Don't recompute the health scores and score history afterwards")
+
+    def log(self, message, style=None):
+        if self.verbosity > 1 or style:
+            self.stdout.write(getattr(self.style, style)(message) if style else message)
+
+    def handle(self, *args, **kwargs):
+        self.verbosity = kwargs['verbosity']
+        importer = PriceImporter(
+            chunk_size=kwargs['chunk_size'], ticker=kwargs.get('ticker'), restart=kwargs['restart'],
+            refresh=not kwargs['no_refresh'], log=self.log,
+        )
+        try:
+            report = importer.run(kwargs['paths'])
+        except (OSError, ValueError, ImportError) as e:
+            raise CommandError(f"Import stopped: {e}. Run it again to resume from the last committed chunk.")
+
+        elapsed = report['elapsed']
+        self.stdout.write(
+            f"Read {report['read']} rows from {report['files']} files: {report['written']} bars written, "
+            f"{report['unchanged']} unchanged, {report['invalid']} invalid, {report['duplicates']} duplicates"
+            + (f" ({report['resumed']} rows loaded by an earlier run)" if report['resumed'] else "") + "."
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {len(report['tickers'])} tickers in {elapsed:.2f}s "
+            f"({report['read'] / elapsed if elapsed else 0:,.0f} rows/s)."
+        ))
+        if report['refreshed']:
+            self.stdout.write(f"Refreshed health scores for {report['refreshed']} stocks.")
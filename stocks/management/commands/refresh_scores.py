@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from stocks.utils import refresh_health_scores
+
+class Command(BaseCommand):
+    help = 'Recomputes the materialized health score snapshots'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tickers', nargs='*', help='Tickers to rescore (default: all stocks)')
+
+    def handle(self, *args, **kwargs):
+        tickers = kwargs.get('tickers') or None
+        refreshed = refresh_health_scores(tickers)
+        self.stdout.write(self.style.SUCCESS(f"Refreshed health scores for {refreshed} stocks."))
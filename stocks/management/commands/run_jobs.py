@@ -0,0 +1,29 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from stocks.jobs import claim_next_job, run_job
+
+class Command(BaseCommand):
+    help = 'Worker process: drains the queue of ingestion jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty instead of polling')
+        parser.add_argument('--poll', type=float, default=5.0, help='Seconds to wait between polls of an empty queue')
+        parser.add_argument('--stale-minutes', type=float, default=10.0, help='Reclaim running jobs without a checkpoint for this long')
+
+    def log(self, message, style=None):
+        self.stdout.write(getattr(self.style, style)(message) if style else message)
+
+    def handle(self, *args, **kwargs):
+        stale_after = timedelta(minutes=kwargs['stale_minutes'])
+        while True:
+            job = claim_next_job(stale_after=stale_after)
+            if job is None:
+                if kwargs['once']:
+                    break
+                time.sleep(kwargs['poll'])
+                continue
+
+            self.stdout.write(f"Running job {job.pk} from ticker {job.position}/{len(job.tickers)} (attempt {job.attempts})")
+            job = run_job(job, log=self.log)
+            self.log(f"Job {job.pk} {job.status}.", 'SUCCESS' if job.status == job.DONE else 'ERROR')
@@ -0,0 +1,157 @@
+import asyncio
+import os
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from asgiref.sync import async_to_sync
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from stocks.models import Stock
+from stocks.stream import get_broker
+
+
+def rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError):
+        return 0.0
+
+
+class InProcessClient:
+    """One SSE subscriber driven straight through Django's ASGI handler (no sockets)."""
+    def __init__(self, handler, tickers):
+        self.handler = handler
+        self.query = f"tickers={','.join(tickers)}".encode()
+        self.connected = asyncio.Event()
+        self.disconnect = asyncio.Event()
+        self.marks = {}  # marker -> arrival time
+        self.status = None
+        self.sent_request = False
+
+    async def receive(self):
+        if not self.sent_request:
+            self.sent_request = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await self.disconnect.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(self, message):
+        if message['type'] == 'http.response.start':
+            self.status = message['status']
+            if self.status != 200:
+                self.connected.set()
+            return
+        body = message.get('body', b'')
+        if b'retry:' in body:
+            self.connected.set()
+        if b'"close":-' in body:
+            marker = int(body.split(b'"close":-')[1].split(b'.')[0].split(b'}')[0])
+            self.marks.setdefault(marker, time.perf_counter())
+
+    def run(self):
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': '/api/stocks/stream/', 'raw_path': b'/api/stocks/stream/',
+            'query_string': self.query, 'root_path': '', 'headers': [(b'host', b'localhost')],
+            'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+        }
+        return self.handler(scope, self.receive, self.send)
+
+
+class Command(BaseCommand):
+    help = 'Measures how many idle SSE subscribers one process holds and how fast a delta fans out to them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscribers', type=int, default=2000, help='Concurrent subscribers to open')
+        parser.add_argument('--tickers', type=int, default=3, help='Tickers per subscriber')
+        parser.add_argument('--rounds', type=int, default=5, help='Fan-out rounds (one synthetic price delta per ticker each)')
+        parser.add_argument('--url', help='Hold connections against a running ASGI server instead, e.g. http://127.0.0.1:8000')
+        parser.add_argument('--hold', type=float, default=10.0, help='Seconds to hold the connections open (--url)')
+
+    def handle(self, *args, **kwargs):
+        universe = list(Stock.objects.order_by('ticker').values_list('ticker', flat=True))
+        if not universe:
+            raise CommandError("No stocks in the database, run ingest_data or seed some first.")
+        per_client = min(kwargs['tickers'], len(universe))
+        # Spread the subscriptions over the universe like real dashboards would
+        subscriptions = [
+            [universe[(i + j) % len(universe)] for j in range(per_client)]
+            for i in range(kwargs['subscribers'])
+        ]
+        if kwargs.get('url'):
+            async_to_sync(self.hold_remote)(kwargs['url'], subscriptions, kwargs['hold'])
+        else:
+            async_to_sync(self.in_process)(subscriptions, kwargs['rounds'])
+
+    async def in_process(self, subscriptions, rounds):
+        handler = ASGIHandler()
+        before = rss_mb()
+        started = time.perf_counter()
+        clients = [InProcessClient(handler, tickers) for tickers in subscriptions]
+        tasks = [asyncio.ensure_future(client.run()) for client in clients]
+        await asyncio.gather(*(client.connected.wait() for client in clients))
+        elapsed = time.perf_counter() - started
+        failed = sum(client.status != 200 for client in clients)
+        broker = get_broker()
+        held = broker.subscriber_count
+        per_sub_kb = (rss_mb() - before) * 1024 / max(held, 1)
+        self.stdout.write(
+            f"Connected {held}/{len(clients)} subscribers ({failed} refused) in {elapsed:.2f}s, "
+            f"RSS {rss_mb():.0f} MB (~{per_sub_kb:.1f} KB per subscriber)"
+        )
+
+        tickers = sorted(broker.subscribers)
+        for marker in range(1, rounds + 1):
+            published = time.perf_counter()
+            for ticker in tickers:
+                broker.publish(ticker, 'price', {'ticker': ticker, 'date': None, 'close': -marker})
+            while not all(marker in client.marks for client in clients if client.status == 200):
+                await asyncio.sleep(0.001)
+            latencies = sorted(
+                (client.marks[marker] - published) * 1000 for client in clients if client.status == 200
+            )
+            self.stdout.write(
+                f"Round {marker}: {len(tickers)} deltas to {len(latencies)} subscribers, "
+                f"p50 {statistics.median(latencies):.1f} ms, "
+                f"p99 {latencies[int(len(latencies) * 0.99) - 1]:.1f} ms, max {latencies[-1]:.1f} ms"
+            )
+
+        for client in clients:
+            client.disconnect.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.stdout.write(self.style.SUCCESS(f"Closed, {broker.subscriber_count} subscribers left"))
+
+    async def hold_remote(self, url, subscriptions, hold):
+        parts = urlsplit(url)
+        host, port = parts.hostname, parts.port or 80
+        opened, first_bytes, writers = 0, [], []
+
+        async def connect(tickers):
+            nonlocal opened
+            started = time.perf_counter()
+            reader, writer = await asyncio.open_connection(host, port)
+            writer.write(
+                f"GET /api/stocks/stream/?tickers={','.join(tickers)} HTTP/1.1\r\n"
+                f"Host: {parts.netloc}\r\nAccept: text/event-stream\r\n\r\n".encode()
+            )
+            await writer.drain()
+            status = await reader.readline()
+            if b' 200 ' in status:
+                opened += 1
+                first_bytes.append((time.perf_counter() - started) * 1000)
+            writers.append(writer)
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(connect(tickers) for tickers in subscriptions), return_exceptions=True)
+        errors = sum(isinstance(result, Exception) for result in results)
+        self.stdout.write(
+            f"Opened {opened}/{len(subscriptions)} streams ({errors} errors) in {time.perf_counter() - started:.2f}s"
+            + (f", median time to headers {statistics.median(first_bytes):.1f} ms" if first_bytes else "")
+        )
+        await asyncio.sleep(hold)
+        alive = sum(not writer.is_closing() for writer in writers)
+        for writer in writers:
+            writer.close()
+        self.stdout.write(self.style.SUCCESS(f"{alive} streams still open after {hold:.0f}s"))
@@ -0,0 +1,48 @@
+# Generated by Django 6.0 on 2026-10-18 15:26
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stocks", "0002_newsarticle"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HealthScore",
+            fields=[
+                (
+                    "stock",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="health",
+                        serialize=False,
+                        to="stocks.stock",
+                    ),
+                ),
+                ("score", models.IntegerField(default=0)),
+                ("badge", models.CharField(max_length=20)),
+                ("sma_50", models.FloatField(blank=True, null=True)),
+                ("sma_200", models.FloatField(blank=True, null=True)),
+                ("volume_ratio", models.FloatField(blank=True, null=True)),
+                ("sentiment_avg", models.FloatField(blank=True, null=True)),
+                (
+                    "computed_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["score", "stock"], name="healthscore_score_idx"
+                    ),
+                    models.Index(fields=["badge"], name="healthscore_badge_idx"),
+                ],
+            },
+        ),
+    ]
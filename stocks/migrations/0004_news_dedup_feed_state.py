@@ -0,0 +1,69 @@
+# Generated by Django 6.0 on 2026-10-18 15:32
+
+import hashlib
+import re
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def backfill_headline_hashes(apps, schema_editor):
+    """Hash existing headlines and drop exact duplicates so the unique constraint can be added."""
+    NewsArticle = apps.get_model("stocks", "NewsArticle")
+    seen = set()
+    duplicates = []
+    to_update = []
+    for article in NewsArticle.objects.order_by("id").only("id", "ticker_id", "headline"):
+        normalized = re.sub(r"\s+", " ", article.headline or "").strip()
+        article.headline_hash = hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+        key = (article.ticker_id, article.headline_hash)
+        if key in seen:
+            duplicates.append(article.id)
+            continue
+        seen.add(key)
+        to_update.append(article)
+    NewsArticle.objects.filter(id__in=duplicates).delete()
+    NewsArticle.objects.bulk_update(to_update, ["headline_hash"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stocks", "0003_healthscore"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="NewsFeedState",
+            fields=[
+                (
+                    "stock",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="feed_state",
+                        serialize=False,
+                        to="stocks.stock",
+                    ),
+                ),
+                ("url", models.URLField(max_length=500)),
+                ("etag", models.CharField(blank=True, default="", max_length=255)),
+                ("modified", models.CharField(blank=True, default="", max_length=64)),
+                ("last_status", models.IntegerField(blank=True, null=True)),
+                ("checked_at", models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="newsarticle",
+            name="headline_hash",
+            field=models.CharField(default="", max_length=40),
+        ),
+        migrations.RunPython(backfill_headline_hashes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="newsarticle",
+            constraint=models.UniqueConstraint(
+                fields=("ticker", "headline_hash"), name="unique_news_headline"
+            ),
+        ),
+    ]
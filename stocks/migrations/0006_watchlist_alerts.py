@@ -0,0 +1,79 @@
+# Generated by Django 6.0 on 2026-10-18 15:57
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stocks", "0005_ingestjob"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FiredAlert",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                (
+                    "direction",
+                    models.CharField(
+                        choices=[("up", "Crossed above"), ("down", "Crossed below")],
+                        max_length=4,
+                    ),
+                ),
+                ("threshold", models.DecimalField(decimal_places=2, max_digits=12)),
+                (
+                    "previous_close",
+                    models.DecimalField(decimal_places=2, max_digits=12),
+                ),
+                ("close", models.DecimalField(decimal_places=2, max_digits=12)),
+                ("fired_at", models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                "ordering": ["-date", "-fired_at"],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="watchlist",
+            index=models.Index(
+                fields=["ticker", "alert_price"], name="watchlist_alert_idx"
+            ),
+        ),
+        migrations.AddField(
+            model_name="firedalert",
+            name="ticker",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="alerts",
+                to="stocks.stock",
+            ),
+        ),
+        migrations.AddField(
+            model_name="firedalert",
+            name="watchlist",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="alerts",
+                to="stocks.watchlist",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="firedalert",
+            constraint=models.UniqueConstraint(
+                fields=("watchlist", "date", "direction"), name="unique_fired_alert"
+            ),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 6.0 on 2026-10-18 16:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stocks", "0006_watchlist_alerts"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HealthScoreHistory",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("score", models.IntegerField()),
+                ("badge", models.CharField(max_length=20)),
+                ("sma_50", models.FloatField(blank=True, null=True)),
+                ("sma_200", models.FloatField(blank=True, null=True)),
+                ("volume_ratio", models.FloatField(blank=True, null=True)),
+                ("sentiment_avg", models.FloatField(blank=True, null=True)),
+                (
+                    "stock",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="score_history",
+                        to="stocks.stock",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("stock", "date"), name="unique_score_day"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 6.0 on 2026-10-18 16:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stocks", "0007_healthscorehistory"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SectorSummary",
+            fields=[
+                (
+                    "sector",
+                    models.CharField(max_length=100, primary_key=True, serialize=False),
+                ),
+                ("stocks", models.IntegerField(default=0)),
+                ("avg_score", models.FloatField(blank=True, null=True)),
+                ("median_score", models.FloatField(blank=True, null=True)),
+                ("advancers", models.IntegerField(default=0)),
+                ("decliners", models.IntegerField(default=0)),
+                ("unchanged", models.IntegerField(default=0)),
+                ("total_volume", models.BigIntegerField(default=0)),
+                ("avg_change_pct", models.FloatField(blank=True, null=True)),
+                ("avg_sentiment", models.FloatField(blank=True, null=True)),
+                ("leaders", models.JSONField(blank=True, default=list)),
+                ("laggards", models.JSONField(blank=True, default=list)),
+                ("as_of", models.DateField(blank=True, null=True)),
+                (
+                    "computed_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+            ],
+        ),
+    ]
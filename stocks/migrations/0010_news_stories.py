@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-18 16:27
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def own_stories(apps, schema_editor):
+    """Existing headlines start as stories of their own, `manage.py cluster_news` groups them."""
+    NewsArticle = apps.get_model("stocks", "NewsArticle")
+    NewsArticle.objects.filter(story_hash="").update(story_hash=F("headline_hash"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stocks", "0009_importcheckpoint"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="newsarticle",
+            name="minhash",
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="newsarticle",
+            name="story_hash",
+            field=models.CharField(default="", max_length=40),
+        ),
+        migrations.RunPython(own_stories, migrations.RunPython.noop),
+    ]
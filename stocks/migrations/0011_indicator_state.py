@@ -0,0 +1,45 @@
+# Generated by Django 6.0 on 2026-10-18 16:36
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stocks", "0010_news_stories"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IndicatorState",
+            fields=[
+                (
+                    "stock",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="indicators",
+                        serialize=False,
+                        to="stocks.stock",
+                    ),
+                ),
+                ("as_of", models.DateField()),
+                ("bars", models.IntegerField(default=0)),
+                ("state", models.JSONField(default=dict)),
+                ("previous", models.JSONField(blank=True, null=True)),
+                ("sma_50", models.FloatField(blank=True, null=True)),
+                ("sma_200", models.FloatField(blank=True, null=True)),
+                ("rsi", models.FloatField(blank=True, null=True)),
+                ("macd", models.FloatField(blank=True, null=True)),
+                ("macd_signal", models.FloatField(blank=True, null=True)),
+                ("macd_histogram", models.FloatField(blank=True, null=True)),
+                ("bollinger_middle", models.FloatField(blank=True, null=True)),
+                ("bollinger_upper", models.FloatField(blank=True, null=True)),
+                ("bollinger_lower", models.FloatField(blank=True, null=True)),
+                ("atr", models.FloatField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
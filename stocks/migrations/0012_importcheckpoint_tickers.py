@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 16:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stocks", "0011_indicator_state"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="importcheckpoint",
+            name="refreshed_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="importcheckpoint",
+            name="tickers",
+            field=models.JSONField(default=list),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 
 class Stock(models.Model):
@@ -39,19 +40,223 @@ class Watchlist(models.Model):
     ticker = models.ForeignKey(Stock, on_delete=models.CASCADE)
     alert_price = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True)
 
+    class Meta:
+        # The alert engine asks "which thresholds of this ticker lie in [low, high]"
+        indexes = [models.Index(fields=['ticker', 'alert_price'], name='watchlist_alert_idx')]
+
     def __str__(self):
         return f"{self.user.username} - {self.ticker}"
 
+class FiredAlert(models.Model):
+    """A watchlist alert_price crossed by a close, recorded once per (watchlist row, bar, direction)."""
+    UP = 'up'
+    DOWN = 'down'
+    DIRECTION_CHOICES = [(UP, 'Crossed above'), (DOWN, 'Crossed below')]
+
+    watchlist = models.ForeignKey(Watchlist, on_delete=models.CASCADE, related_name='alerts')
+    ticker = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='alerts')
+    date = models.DateField()  # bar whose close crossed the threshold
+    direction = models.CharField(max_length=4, choices=DIRECTION_CHOICES)
+    threshold = models.DecimalField(max_digits=12, decimal_places=2)
+    previous_close = models.DecimalField(max_digits=12, decimal_places=2)
+    close = models.DecimalField(max_digits=12, decimal_places=2)
+    fired_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-date', '-fired_at']
+        constraints = [
+            models.UniqueConstraint(fields=['watchlist', 'date', 'direction'], name='unique_fired_alert'),
+        ]
+
+    def __str__(self):
+        return f"{self.ticker_id} {self.direction} {self.threshold} on {self.date}"
+
 class NewsArticle(models.Model):
     ticker = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='news')
     headline = models.CharField(max_length=500)
+    headline_hash = models.CharField(max_length=40, default='')  # sha1 of the normalized headline, see sentiment.headline_hash
+    story_hash = models.CharField(max_length=40, default='')  # headline_hash of the story's first headline, see stocks/stories.py
+    minhash = models.BinaryField(blank=True, null=True)  # MinHash signature (stories.NUM_PERM uint32s)
     url = models.URLField(blank=True, null=True)
     sentiment_score = models.FloatField(default=0.0) # -1.0 to 1.0
     published_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['-published_at']
+        constraints = [
+            models.UniqueConstraint(fields=['ticker', 'headline_hash'], name='unique_news_headline'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self.headline_hash:
+            from .sentiment import headline_hash
+            self.headline_hash = headline_hash(self.headline)
+        if not self.story_hash:
+            self.story_hash = self.headline_hash  # a story of its own unless the news pipeline clustered it
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.ticker} - {self.headline[:50]}..."
 
+class NewsFeedState(models.Model):
+    """Conditional-request validators of the last fetch of a stock's news feed."""
+    stock = models.OneToOneField(Stock, on_delete=models.CASCADE, primary_key=True, related_name='feed_state')
+    url = models.URLField(max_length=500)
+    etag = models.CharField(max_length=255, blank=True, default='')
+    modified = models.CharField(max_length=64, blank=True, default='')  # Last-Modified header, as sent by the server
+    last_status = models.IntegerField(blank=True, null=True)
+    checked_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.stock_id} - {self.last_status}"
+
+class HealthScore(models.Model):
+    """
+    Materialized health score snapshot for a stock.
+    Refreshed by ingest_data / fetch_news for the tickers they touched, so the
+    list view can order and filter by score in SQL instead of rescoring every stock.
+    """
+    stock = models.OneToOneField(Stock, on_delete=models.CASCADE, primary_key=True, related_name='health')
+    score = models.IntegerField(default=0)
+    badge = models.CharField(max_length=20)
+    sma_50 = models.FloatField(blank=True, null=True)
+    sma_200 = models.FloatField(blank=True, null=True)
+    volume_ratio = models.FloatField(blank=True, null=True)  # 5-day avg volume / previous 5-day avg
+    sentiment_avg = models.FloatField(blank=True, null=True)
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['score', 'stock'], name='healthscore_score_idx'),
+            models.Index(fields=['badge'], name='healthscore_badge_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.stock_id} - {self.score} ({self.badge})"
+
+class SectorSummary(models.Model):
+    """
+    Rollup of the stocks in one sector (see stocks/sectors.py), refreshed together with the
+    health score snapshots of its members so the sector heatmap is a single read.
+    """
+    sector = models.CharField(max_length=100, primary_key=True)
+    stocks = models.IntegerField(default=0)
+    avg_score = models.FloatField(blank=True, null=True)
+    median_score = models.FloatField(blank=True, null=True)
+    advancers = models.IntegerField(default=0)  # latest close above the previous one
+    decliners = models.IntegerField(default=0)
+    unchanged = models.IntegerField(default=0)
+    total_volume = models.BigIntegerField(default=0)  # latest bar of every member
+    avg_change_pct = models.FloatField(blank=True, null=True)
+    avg_sentiment = models.FloatField(blank=True, null=True)
+    leaders = models.JSONField(default=list, blank=True)  # best scores first: [{ticker, score}, ...]
+    laggards = models.JSONField(default=list, blank=True)  # worst scores first
+    as_of = models.DateField(blank=True, null=True)  # latest bar date in the sector
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.sector} - {self.stocks} stocks, avg {self.avg_score}"
+
+class HealthScoreHistory(models.Model):
+    """
+    The health score rules evaluated as of every trading day (see stocks/score_history.py).
+    Appended to whenever the snapshot is refreshed, so charts and badge backtests
+    never rescore the whole history.
+    """
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='score_history')
+    date = models.DateField()
+    score = models.IntegerField()
+    badge = models.CharField(max_length=20)
+    sma_50 = models.FloatField(blank=True, null=True)
+    sma_200 = models.FloatField(blank=True, null=True)
+    volume_ratio = models.FloatField(blank=True, null=True)
+    sentiment_avg = models.FloatField(blank=True, null=True)
+
+    class Meta:
+        constraints = [
+            # Also the index behind per-ticker date range reads
+            models.UniqueConstraint(fields=['stock', 'date'], name='unique_score_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.stock_id} {self.date} - {self.score} ({self.badge})"
+
+class IndicatorState(models.Model):
+    """
+    Technical indicators of a stock as of its last bar, with the streaming state they are
+    updated from one bar at a time (see stocks/indicators.py). `previous` is the state
+    before the last bar, so a corrected last bar replaces it instead of being added again.
+    """
+    stock = models.OneToOneField(Stock, on_delete=models.CASCADE, primary_key=True, related_name='indicators')
+    as_of = models.DateField()  # date of the last bar folded in
+    bars = models.IntegerField(default=0)
+    state = models.JSONField(default=dict)
+    previous = models.JSONField(blank=True, null=True)
+    sma_50 = models.FloatField(blank=True, null=True)
+    sma_200 = models.FloatField(blank=True, null=True)
+    rsi = models.FloatField(blank=True, null=True)  # 14 bars
+    macd = models.FloatField(blank=True, null=True)  # EMA 12 - EMA 26
+    macd_signal = models.FloatField(blank=True, null=True)  # EMA 9 of the MACD
+    macd_histogram = models.FloatField(blank=True, null=True)
+    bollinger_middle = models.FloatField(blank=True, null=True)  # 20 bars, 2 standard deviations
+    bollinger_upper = models.FloatField(blank=True, null=True)
+    bollinger_lower = models.FloatField(blank=True, null=True)
+    atr = models.FloatField(blank=True, null=True)  # 14 bars, open / close ranges
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.stock_id} as of {self.as_of} ({self.bars} bars)"
+
+class IngestJob(models.Model):
+    """
+    A queued run of the ingestion pipeline over a list of tickers.
+    `position` is the checkpoint: tickers[:position] are done, so an interrupted
+    job picks up from there instead of starting over.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    tickers = models.JSONField(default=list)
+    options = models.JSONField(default=dict, blank=True)  # provider / workers / batch_size
+    position = models.IntegerField(default=0)
+    results = models.JSONField(default=dict, blank=True)  # ticker -> upsert stats or error
+    error = models.TextField(blank=True, default='')
+    worker = models.CharField(max_length=100, blank=True, default='')
+    attempts = models.IntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(blank=True, null=True)
+    heartbeat_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['status', 'created_at'], name='ingestjob_queue_idx')]
+
+    def __str__(self):
+        return f"Job {self.pk} ({self.status}) {self.position}/{len(self.tickers)}"
+
+class ImportCheckpoint(models.Model):
+    """
+    Progress of `import_prices` through one file: its first `chunks_done` chunks of
+    `chunk_size` rows are loaded, so an interrupted import resumes after them.
+    The file's size and mtime tell whether it is still the same file. `tickers` lets a
+    resumed run rebuild and rescore what the interrupted one loaded.
+    """
+    path = models.CharField(max_length=500, unique=True)
+    size = models.BigIntegerField()
+    modified = models.FloatField()
+    chunk_size = models.IntegerField()
+    chunks_done = models.IntegerField(default=0)
+    rows_done = models.BigIntegerField(default=0)  # source rows, valid or not
+    started_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    tickers = models.JSONField(default=list)  # tickers the committed chunks loaded
+    refreshed_at = models.DateTimeField(blank=True, null=True)  # their store / indicators / scores rebuilt, None while pending
+
+    def __str__(self):
+        return f"{self.path} - {self.rows_done} rows{' (done)' if self.finished_at else ''}"
@@ -0,0 +1,150 @@
+"""
+News pipeline: fetch RSS feeds concurrently, skip unchanged feeds with conditional
+requests and store new headlines with one set-based insert per run.
+"""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import quote_plus
+
+import feedparser
+from django.utils import timezone
+
+from .models import NewsArticle, NewsFeedState
+from .sentiment import analyze_many, headline_hash
+from .stories import assign_stories
+
+HEADLINE_LENGTH = NewsArticle._meta.get_field('headline').max_length
+
+# RSS Feed for the specific ticker
+# {query} is the url-encoded "<company name> stock news" search, {ticker} the raw ticker
+GOOGLE_NEWS_URL = "https://news.google.com/rss/search?q={query}&hl=en-IN&gl=IN&ceid=IN:en"
+
+
+def feed_url(stock, template=GOOGLE_NEWS_URL):
+    query = f"{stock.company_name} stock news"
+    return template.format(query=quote_plus(query), ticker=stock.ticker)
+
+
+def fetch_feed(url, etag=None, modified=None):
+    """
+    Runs on a worker thread (no database access).
+    Returns the parsed feed; `status` is 304 when the server says nothing changed.
+    """
+    return feedparser.parse(url, etag=etag or None, modified=modified or None)
+
+
+class NewsPipeline:
+    def __init__(self, workers=8, per_feed=5, url_template=GOOGLE_NEWS_URL, conditional=True, log=None):
+        self.workers = max(1, workers)
+        self.per_feed = per_feed
+        self.url_template = url_template
+        self.conditional = conditional
+        self.log = log or (lambda message, style=None: None)
+
+    def run(self, stocks):
+        """
+        Fetches the feeds of the given stocks.
+        Returns {'changed': tickers with new articles, 'added': {ticker: count},
+                 'not_modified': tickers skipped by a 304, 'failed': {ticker: error},
+                 'joined': new articles that are another version of a stored or new story}.
+        """
+        stocks = list(stocks)
+        states = {state.stock_id: state for state in NewsFeedState.objects.filter(stock__in=stocks)}
+        report = {'changed': set(), 'added': {}, 'not_modified': set(), 'failed': {}, 'joined': 0}
+        now = timezone.now()
+
+        entries = []  # (stock, title, link)
+        new_states = []
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {}
+            for stock in stocks:
+                url = feed_url(stock, self.url_template)
+                state = states.get(stock.ticker)
+                # Validators only apply to the same URL (company names can change)
+                etag = modified = None
+                if self.conditional and state and state.url == url:
+                    etag, modified = state.etag, state.modified
+                futures[pool.submit(fetch_feed, url, etag, modified)] = (stock, url, etag, modified)
+
+            for future in as_completed(futures):
+                stock, url, etag, modified = futures[future]
+                try:
+                    feed = future.result()
+                except Exception as e:
+                    report['failed'][stock.ticker] = e
+                    self.log(f"Failed {stock.ticker}: {e}", 'ERROR')
+                    continue
+
+                status = feed.get('status')
+                if status is None and feed.get('bozo'):
+                    report['failed'][stock.ticker] = feed.get('bozo_exception')
+                    self.log(f"Failed {stock.ticker}: {feed.get('bozo_exception')}", 'ERROR')
+                    continue
+
+                new_states.append(NewsFeedState(
+                    stock=stock,
+                    url=url,
+                    # A 304 doesn't always repeat the validators, keep the ones we sent
+                    etag=feed.get('etag') or (etag if status == 304 else '') or '',
+                    modified=feed.get('modified') or (modified if status == 304 else '') or '',
+                    last_status=status,
+                    checked_at=now,
+                ))
+                if status == 304:
+                    report['not_modified'].add(stock.ticker)
+                    continue
+                if not feed.entries:
+                    self.log(f"No news found for {stock.ticker}")
+                    continue
+
+                # Process top 5 articles
+                for entry in feed.entries[:self.per_feed]:
+                    if entry.get('title'):
+                        entries.append((stock, entry.title, entry.get('link')))
+
+        self._store(entries, report, now)
+
+        if new_states:
+            NewsFeedState.objects.bulk_create(
+                new_states,
+                update_conflicts=True,
+                unique_fields=['stock'],
+                update_fields=['url', 'etag', 'modified', 'last_status', 'checked_at'],
+            )
+        return report
+
+    def _store(self, entries, report, now):
+        """
+        Dedupe by (ticker, headline hash), score only unseen headlines, group near-duplicates
+        into stories and insert them in one go.
+        """
+        candidates = {}
+        for stock, title, link in entries:
+            # Hash what gets stored, like NewsArticle.save() does, or long titles would never dedupe
+            title = title[:HEADLINE_LENGTH]
+            key = (stock.ticker, headline_hash(title))
+            candidates.setdefault(key, (stock, title, link))
+        if not candidates:
+            return
+
+        existing = set(
+            NewsArticle.objects.filter(
+                ticker__in={ticker for ticker, _ in candidates},
+                headline_hash__in={digest for _, digest in candidates},
+            ).values_list('ticker_id', 'headline_hash')
+        )
+        fresh = [(key, value) for key, value in candidates.items() if key not in existing]
+        if not fresh:
+            return
+
+        scores = analyze_many([title for _, (_, title, _) in fresh])
+        articles = [
+            NewsArticle(ticker=stock, headline=title, headline_hash=digest, url=link, sentiment_score=score)
+            for ((_, digest), (stock, title, link)), score in zip(fresh, scores)
+        ]
+        report['joined'] = assign_stories(articles, now)
+        # The unique (ticker, headline_hash) constraint is the source of truth if two runs race
+        NewsArticle.objects.bulk_create(articles, batch_size=500, ignore_conflicts=True)
+
+        for (ticker, _), _ in fresh:
+            report['added'][ticker] = report['added'].get(ticker, 0) + 1
+            report['changed'].add(ticker)
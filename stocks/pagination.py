@@ -0,0 +1,137 @@
+"""
+Keyset (cursor) pagination.
+
+A page is fetched with a WHERE on the sort key of the last row seen instead of
+an OFFSET, and without a COUNT(*), so every page costs the same however deep
+it is. Sort keys are composite and end in a unique column, e.g. (score, ticker),
+so the position is exact even with ties. NULLs sort as the smallest value
+(first ascending, last descending), matching the list view's health orderings.
+
+Cursors are opaque: urlsafe base64 of the sort key values, the ordering they
+belong to and the direction.
+"""
+import base64
+import json
+from collections import OrderedDict
+
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+INVALID_CURSOR = "Invalid cursor"
+
+
+def encode_cursor(ordering, values, reverse=False):
+    payload = json.dumps({'o': ordering, 'k': values, 'r': int(reverse)}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, ordering):
+    """Returns (values, reverse). Raises NotFound for garbage or a cursor of another ordering."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        values, reverse = payload['k'], bool(payload.get('r'))
+        if payload.get('o') != ordering or not isinstance(values, list):
+            raise ValueError
+    except (ValueError, TypeError, KeyError):
+        raise NotFound(INVALID_CURSOR)
+    return values, reverse
+
+
+def order_by(keys, reverse=False):
+    """keys: [(field, descending, nullable)] -> order_by() arguments."""
+    expressions = []
+    for field, descending, nullable in keys:
+        descending = descending != reverse
+        if not nullable:
+            expressions.append(f"-{field}" if descending else field)
+        elif descending:
+            expressions.append(F(field).desc(nulls_last=True))
+        else:
+            expressions.append(F(field).asc(nulls_first=True))
+    return expressions
+
+
+def after(keys, values, reverse=False):
+    """The rows that come after the position `values` in the keys' order (before it if reverse)."""
+    condition = None
+    equal = Q()
+    for (field, descending, nullable), value in zip(keys, values):
+        descending = descending != reverse
+        if descending:
+            beyond = None if value is None else Q(**{f"{field}__lt": value})
+            if beyond is not None and nullable:
+                beyond |= Q(**{f"{field}__isnull": True})
+        else:
+            beyond = Q(**{f"{field}__isnull": False}) if value is None else Q(**{f"{field}__gt": value})
+        if beyond is not None:
+            term = equal & beyond
+            condition = term if condition is None else condition | term
+        equal &= Q(**{f"{field}__isnull": True}) if value is None else Q(**{field: value})
+    # Nothing comes after the very last possible position
+    return condition if condition is not None else Q(pk__in=[])
+
+
+class KeysetPagination(BasePagination):
+    """
+    The view provides `keyset` = (ordering name, keys) for the current request.
+    Query params: cursor (empty for the first page), page_size, count=true to also get the total.
+    """
+    cursor_query_param = 'cursor'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param) or self.page_size)
+        except ValueError:
+            size = self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering, self.keys = view.keyset
+        size = self.get_page_size(request)
+        self.count = queryset.count() if request.query_params.get('count') == 'true' else None
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        values, reverse = decode_cursor(cursor, self.ordering) if cursor else (None, False)
+        if values is not None and len(values) != len(self.keys):
+            raise NotFound(INVALID_CURSOR)
+
+        # Read the key values back from the rows to build the next / previous cursors
+        aliases = {f"_key{i}": F(field) for i, (field, _, _) in enumerate(self.keys)}
+        queryset = queryset.annotate(**aliases).order_by(*order_by(self.keys, reverse))
+        if values is not None:
+            queryset = queryset.filter(after(self.keys, values, reverse))
+        rows = list(queryset[:size + 1])
+        more = len(rows) > size
+        rows = rows[:size]
+        if reverse:
+            rows.reverse()
+
+        def position(row):
+            return [getattr(row, alias) for alias in aliases]
+
+        # Going forward there is a previous page iff we came from a cursor, going back there is a next one
+        self.next = position(rows[-1]) if rows and (reverse or more) else None
+        self.previous = position(rows[0]) if rows and (more if reverse else values is not None) else None
+        return rows
+
+    def link(self, values, reverse):
+        if values is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encode_cursor(self.ordering, values, reverse))
+
+    def get_paginated_response(self, data):
+        body = OrderedDict()
+        if self.count is not None:
+            body['count'] = self.count
+        body['next'] = self.link(self.next, False)
+        body['previous'] = self.link(self.previous, True)
+        body['results'] = data
+        return Response(body)
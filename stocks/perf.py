@@ -0,0 +1,265 @@
+"""
+Per-request performance instrumentation.
+
+PerfMiddleware opens a RequestStats for every request and makes it current
+(a contextvar, so ORM calls that sync_to_async runs on another thread still
+report into it). While a request is being handled:
+
+* every SQL statement is timed by a connection execute_wrapper,
+* `span(name)` / `@timed(name)` blocks (health scoring, serializer method
+  fields) add their wall time under their name.
+
+The totals go out as a `Server-Timing` header, requests slower than
+PERF_SLOW_REQUEST_MS are logged with their most repeated queries, and every
+request lands in per-route latency histograms served by /api/stocks/metrics/.
+The histograms live in the worker process, each gunicorn worker reports its own.
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the latency histogram buckets, the last one catches everything else
+BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float('inf'))
+TOP_QUERIES = 5
+
+_current = ContextVar('perf_request', default=None)
+
+# "IN (%s, %s, %s)" and friends differ only in the number of parameters
+_PLACEHOLDERS = re.compile(r"\((?:\s*%s\s*,)+\s*%s\s*\)")
+
+
+def normalize_sql(sql):
+    return _PLACEHOLDERS.sub("(...)", sql)
+
+
+class RequestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_ms = 0.0
+        self.statements = Counter()
+        self.spans = {}
+
+    def add_span(self, name, ms):
+        total = self.spans.get(name)
+        self.spans[name] = ms if total is None else total + ms
+
+    def execute(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.sql_ms += (time.perf_counter() - started) * 1000
+            self.statements[sql] += 1
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def repeated_queries(self, limit=TOP_QUERIES):
+        counts = Counter()
+        for sql, count in self.statements.items():
+            counts[normalize_sql(sql)] += count
+        return [(sql, count) for sql, count in counts.most_common(limit) if count > 1]
+
+    def server_timing(self, total_ms):
+        entries = [f'db;dur={self.sql_ms:.1f};desc="{self.queries} queries"']
+        entries += [f'{name};dur={ms:.1f}' for name, ms in self.spans.items()]
+        entries.append(f'total;dur={total_ms:.1f}')
+        return ", ".join(entries)
+
+
+def current():
+    return _current.get()
+
+
+@contextmanager
+def span(name):
+    """Adds the block's wall time to the current request's `name` timing (no-op outside a request)."""
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.add_span(name, (time.perf_counter() - started) * 1000)
+
+
+def timed(name):
+    """Decorator form of span()."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            stats = _current.get()
+            if stats is None:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stats.add_span(name, (time.perf_counter() - started) * 1000)
+        return wrapper
+    return decorator
+
+
+def _execute_wrapper(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    return stats.execute(execute, sql, params, many, context)
+
+
+def install(connection, **kwargs):
+    # Installed once per connection, it only records while a request is current
+    if _execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute_wrapper)
+
+
+connection_created.connect(install, dispatch_uid='stocks.perf.install')
+
+
+class RouteMetrics:
+    """Latency histogram plus query / SQL time totals for one route."""
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.buckets = [0] * len(BUCKETS)
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.queries = 0
+        self.sql_ms = 0.0
+
+    def observe(self, ms, stats, status):
+        self.count += 1
+        self.errors += status >= 500
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.queries += stats.queries
+        self.sql_ms += stats.sql_ms
+        for i, bound in enumerate(BUCKETS):
+            if ms <= bound:
+                self.buckets[i] += 1
+                break
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th request
+        rank, seen = q * self.count, 0
+        for bound, count in zip(BUCKETS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return self.max_ms if bound == float('inf') else bound
+        return self.max_ms
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'mean_ms': round(self.total_ms / self.count, 2) if self.count else None,
+            'max_ms': round(self.max_ms, 2),
+            'p50_ms': self.quantile(0.5),
+            'p95_ms': self.quantile(0.95),
+            'p99_ms': self.quantile(0.99),
+            'queries_per_request': round(self.queries / self.count, 2) if self.count else None,
+            'sql_ms_per_request': round(self.sql_ms / self.count, 2) if self.count else None,
+            'histogram': {('+Inf' if bound == float('inf') else str(bound)): count
+                          for bound, count in zip(BUCKETS, self.buckets)},
+        }
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = {}
+        self.since = time.time()
+
+    def observe(self, route, ms, stats, status):
+        with self.lock:
+            metrics = self.routes.get(route)
+            if metrics is None:
+                metrics = self.routes[route] = RouteMetrics()
+            metrics.observe(ms, stats, status)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'since': self.since,
+                'buckets_ms': [('+Inf' if bound == float('inf') else bound) for bound in BUCKETS],
+                'routes': {route: metrics.as_dict() for route, metrics in sorted(self.routes.items())},
+            }
+
+    def reset(self):
+        with self.lock:
+            self.routes = {}
+            self.since = time.time()
+
+
+metrics = Metrics()
+
+
+def route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    return f"{request.method} /{match.route}"
+
+
+class PerfMiddleware:
+    """Put it first in MIDDLEWARE so the total covers the other middleware too."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        for connection in connections.all(initialized_only=True):
+            install(connection)
+        stats = RequestStats()
+        token = _current.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, stats)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, stats)
+
+    def finish(self, request, response, stats):
+        total_ms = stats.elapsed_ms()
+        response['Server-Timing'] = stats.server_timing(total_ms)
+        if response.streaming:
+            return response  # long-lived (SSE), its duration says nothing about latency
+        metrics.observe(route_name(request), total_ms, stats, response.status_code)
+        if total_ms >= settings.PERF_SLOW_REQUEST_MS:
+            repeated = "".join(f"\n  {count}x {sql}" for sql, count in stats.repeated_queries())
+            logger.warning(
+                "Slow request %s %s: %.0f ms, %d queries (%.0f ms SQL), spans %s%s",
+                request.method, request.get_full_path(), total_ms, stats.queries, stats.sql_ms,
+                {name: round(ms, 1) for name, ms in stats.spans.items()}, repeated,
+            )
+        return response
@@ -0,0 +1,156 @@
+"""
+Market data providers used by the ingestion pipeline.
+
+A provider knows how to fetch company info and daily OHLCV history for tickers.
+`YahooProvider` talks to Yahoo Finance, `FakeProvider` generates deterministic
+synthetic frames so ingestion can be tested and benchmarked offline.
+"""
+import threading
+import time
+import zlib
+from datetime import date
+
+import numpy as np
+
+# Expanded NIFTY 100 List (Top 100 by Market Cap)
+NIFTY_100 = [
+    "RELIANCE.NS", "TCS.NS", "HDFCBANK.NS", "ICICIBANK.NS", "INFY.NS", "BHARTIARTL.NS", "ITC.NS", "SBIN.NS", "LICI.NS", "HINDUNILVR.NS",
+    "KOTAKBANK.NS", "LT.NS", "AXISBANK.NS", "HCLTECH.NS", "BAJFINANCE.NS", "ADANIENT.NS", "SUNPHARMA.NS", "MARUTE.NS", "TITAN.NS", "TATAMOTORS.NS",
+    "ULTRACEMCO.NS", "ASIANPAINT.NS", "NTPC.NS", "BAJAJFINSV.NS", "POWERGRID.NS", "ONGC.NS", "M&M.NS", "TATASTEEL.NS", "ADANIGREEN.NS", "JSWSTEEL.NS",
+    "COALINDIA.NS", "LTIM.NS", "SIEMENS.NS", "ADANIPORTS.NS", "PIDILITIND.NS", "SBILIFE.NS", "GRASIM.NS", "DMART.NS", "BEL.NS", "BAJAJ-AUTO.NS",
+    "IOC.NS", "VBL.NS", "TECHM.NS", "DLF.NS", "HDFCLIFE.NS", "HINDALCO.NS", "BRITANNIA.NS", "INDIGO.NS", "HAL.NS", "GODREJCP.NS",
+    "EICHERMOT.NS", "DIVISLAB.NS", "AMBUJACEM.NS", "CIPLA.NS", "TRENT.NS", "BPCL.NS", "DRREDDY.NS", "GAIL.NS", "TATAPOWER.NS", "ABB.NS",
+    "VEDL.NS", "BANKBARODA.NS", "HAVELLS.NS", "TVSMOTOR.NS", "ADANIENSOL.NS", "HEROMOTOCO.NS", "INDUSINDBK.NS", "SHREECEM.NS", "MANKIND.NS", "JIOFIN.NS",
+    "CHOLAFIN.NS", "ZYDUSLIFE.NS", "PNB.NS", "CANBK.NS", "UNITDSPR.NS", "MOTHERSON.NS", "NAUKRI.NS", "POLYCAB.NS", "LUPIN.NS", "TORNTPHARM.NS",
+    "JSWENERGY.NS", "IRFC.NS", "ICICIPRULI.NS", "SBICARD.NS", "CUMMINSIND.NS", "MARICO.NS", "JINDALSTEL.NS", "BOSCHLTD.NS", "SRF.NS", "BERGEPAINT.NS",
+    "COLPAL.NS", "ICICIGI.NS", "TIINDIA.NS", "ALEMBICLTD.NS", "MUTHOOTFIN.NS", "OBEROIRLTY.NS", "ALKEM.NS", "PIIND.NS", "PATANJALI.NS", "UNIONBANK.NS"
+]
+
+DEFAULT_START_DATE = "2024-01-01"
+
+
+class PriceProvider:
+    """
+    Base class for providers.
+    `max_concurrency` caps how many calls the pipeline makes to the provider at once,
+    `supports_batch` tells it whether fetch_histories downloads several tickers in one call.
+    """
+    name = None
+    max_concurrency = 4
+    supports_batch = False
+
+    def __init__(self):
+        self.slots = threading.BoundedSemaphore(self.max_concurrency)
+
+    def fetch_info(self, ticker):
+        """Returns a dict with (at least) longName / sector / logo_url when known."""
+        raise NotImplementedError
+
+    def fetch_history(self, ticker, start):
+        """Returns a DataFrame indexed by date with Open / Close / Volume columns."""
+        raise NotImplementedError
+
+    def fetch_histories(self, tickers, start):
+        """Returns {ticker: DataFrame}. Providers with a multi-ticker endpoint override this."""
+        return {ticker: self.fetch_history(ticker, start) for ticker in tickers}
+
+
+class YahooProvider(PriceProvider):
+    name = 'yahoo'
+    # Yahoo starts throttling quickly, keep the number of parallel calls low
+    max_concurrency = 4
+    supports_batch = True
+
+    def fetch_info(self, ticker):
+        import yfinance as yf
+        return yf.Ticker(ticker).info
+
+    def fetch_history(self, ticker, start):
+        import yfinance as yf
+        return yf.Ticker(ticker).history(start=start)
+
+    def fetch_histories(self, tickers, start):
+        import pandas as pd
+        import yfinance as yf
+        data = yf.download(
+            list(tickers), start=start, group_by='ticker', auto_adjust=True,
+            progress=False, threads=False,
+        )
+        histories = {}
+        for ticker in tickers:
+            if isinstance(data.columns, pd.MultiIndex):
+                if ticker not in data.columns.get_level_values(0):
+                    continue
+                frame = data[ticker]
+            else:
+                frame = data
+            histories[ticker] = frame.dropna(how='all')
+        return histories
+
+
+class FakeProvider(PriceProvider):
+    """
+    Deterministic synthetic market: every ticker gets its own seeded random walk starting
+    at `since` (DEFAULT_START_DATE unless given, move it for multi-year synthetic data).
+    Providers with the same `since` always yield the same bar for a (ticker, date); the
+    walk restarts at `since`, so bars of a different `since` don't line up.
+    `latency` (seconds) is slept on every call to simulate network round-trips.
+    """
+    name = 'fake'
+    max_concurrency = 16
+    supports_batch = True
+
+    SECTORS = ["Technology", "Financial Services", "Energy", "Consumer Defensive", "Healthcare", "Industrials"]
+
+    def __init__(self, latency=0.0, end=None, since=DEFAULT_START_DATE):
+        super().__init__()
+        self.latency = latency
+        self.end = end
+        self.since = since
+
+    def _seed(self, ticker):
+        return zlib.crc32(ticker.encode())
+
+    def fetch_info(self, ticker):
+        time.sleep(self.latency)
+        return {
+            'longName': f"{ticker.split('.')[0].title()} Ltd",
+            'sector': self.SECTORS[self._seed(ticker) % len(self.SECTORS)],
+            'logo_url': '',
+        }
+
+    def fetch_history(self, ticker, start):
+        time.sleep(self.latency)
+        return self._frame(ticker, start)
+
+    def fetch_histories(self, tickers, start):
+        time.sleep(self.latency)
+        return {ticker: self._frame(ticker, start) for ticker in tickers}
+
+    def _frame(self, ticker, start):
+        import pandas as pd
+        end = self.end or date.today()
+        index = pd.bdate_range(self.since, end)
+        seed = self._seed(ticker)
+        # One generator per column keeps earlier bars stable as the end date moves forward
+        closes, opens, volumes = (np.random.default_rng([seed, column]) for column in range(3))
+        base = 100 + seed % 2000
+        close = np.round(base * np.exp(np.cumsum(closes.normal(0.0003, 0.015, len(index)))), 2)
+        open_ = np.round(close * (1 + opens.normal(0, 0.004, len(index))), 2)
+        volume = volumes.integers(100_000, 5_000_000, len(index))
+        frame = pd.DataFrame({'Open': open_, 'Close': close, 'Volume': volume}, index=index)
+        return frame[frame.index >= pd.Timestamp(start)]
+
+
+PROVIDERS = {
+    'yahoo': YahooProvider,
+    'fake': FakeProvider,
+}
+
+
+def get_provider(name, **options):
+    try:
+        provider_class = PROVIDERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown provider '{name}', choose from {', '.join(PROVIDERS)}")
+    return provider_class(**options)
@@ -0,0 +1,205 @@
+"""
+Health score time series.
+
+Evaluates the calculate_health_score rules as of every trading day instead of
+only the latest one. Each rule is a rolling window over the chronological
+closes / volumes, done with cumulative sums on integer paise, so day i gets
+exactly the answer score_windows gives with bar i as the latest bar:
+
+    Price > SMA 50   <=>  close[i] * 50 > sum of closes i-49..i
+    Golden Cross     <=>  4 * (sum of closes i-49..i) > sum of closes i-199..i
+    Volume pressure  <=>  sum of volumes i-4..i > sum of volumes i-9..i-5
+    Sentiment        =    mean of the 5 newest stories among the 50 newest headlines
+                          published on or before day i (see stories.story_sentiments)
+
+Rows are stored in HealthScoreHistory. An update only recomputes from the last
+stored day on (that day again, to pick up headlines that arrived after it),
+loading just enough bars before it to fill the 200-day window and the
+STORY_SCAN headlines published before it.
+"""
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.db.models import Max
+
+from .history import from_days, load_histories, to_days
+from .models import HealthScoreHistory, NewsArticle
+from .stories import NEWS_WINDOW, STORY_SCAN, story_sentiments
+
+WINDOW = 200
+# Calendar days that comfortably hold WINDOW trading days
+LOOKBACK = timedelta(days=400)
+
+
+def _window_sum(cumulative, end, size):
+    # Sums of the `size` values ending at each index in `end` (fewer near the start, 0 before it)
+    return cumulative[end + 1] - cumulative[np.maximum(end + 1 - size, 0)]
+
+
+def score_series(days, closes, volumes, news_days=(), news_stories=()):
+    """
+    days / closes (paise) / volumes of a ticker's bars, oldest first, starting at its first bar
+    (or at least WINDOW - 1 bars before the first day that is used).
+    news_days: the days of the ticker's headlines, oldest first; news_stories: for each of them,
+    the story sentiments known once it was published (newest first).
+    Returns {'score', 'sma_50', 'sma_200', 'volume_ratio', 'sentiment_avg'} arrays, NaN standing for None.
+    """
+    closes = np.asarray(closes, dtype=np.int64)
+    volumes = np.asarray(volumes, dtype=np.int64)
+    n = len(closes)
+    i = np.arange(n)
+    has_50, has_200, has_10 = i >= 49, i >= WINDOW - 1, i >= 9
+
+    close_sums = np.concatenate([[0], np.cumsum(closes)])
+    sum_50 = _window_sum(close_sums, i, 50)
+    sum_200 = _window_sum(close_sums, i, WINDOW)
+
+    score = np.full(n, 40, dtype=np.int64)
+    score += 20 * (has_50 & (closes * 50 > sum_50))
+    score += 20 * (has_200 & (sum_50 * 4 > sum_200))
+
+    volume_sums = np.concatenate([[0], np.cumsum(volumes)])
+    recent_vol = _window_sum(volume_sums, i, 5) / 5
+    past_vol = _window_sum(volume_sums, np.maximum(i - 5, -1), 5) / 5
+    score += 10 * (has_10 & (recent_vol > past_vol))
+
+    # The state after the last headline published on or before each day
+    known = np.searchsorted(np.asarray(news_days, dtype=np.int64), days, side='right')
+    latest = np.maximum(known - 1, 0)
+    stories = np.zeros((max(len(news_stories), 1), NEWS_WINDOW))
+    story_counts = np.zeros(len(stories), dtype=np.int64)
+    for j, sentiments in enumerate(news_stories):
+        stories[j, :len(sentiments)] = sentiments
+        story_counts[j] = len(sentiments)
+    # Newest first, column by column, so the float sum matches score_windows
+    sentiment_sum = np.zeros(n)
+    for col in range(NEWS_WINDOW):
+        sentiment_sum = sentiment_sum + np.where(known > 0, stories[latest, col], 0.0)
+    news_counts = np.where(known > 0, story_counts[latest], 0)
+    has_news = news_counts > 0
+    avg_sentiment = np.divide(sentiment_sum, news_counts, out=np.zeros(n), where=has_news)
+    score += 10 * (has_news & (avg_sentiment > 0.2))
+    score -= 10 * (has_news & (avg_sentiment < -0.2))
+
+    has_ratio = has_10 & (past_vol > 0)
+    return {
+        'score': np.clip(score, 0, 100),
+        'sma_50': np.where(has_50, sum_50 / 5000, np.nan),
+        'sma_200': np.where(has_200, sum_200 / 20000, np.nan),
+        'volume_ratio': np.divide(recent_vol, past_vol, out=np.full(n, np.nan), where=has_ratio),
+        'sentiment_avg': np.where(has_news, avg_sentiment, np.nan),
+    }
+
+
+def _news_by_ticker(tickers, since=None):
+    """
+    {ticker: (headline days, story sentiments as of each headline)}, oldest first.
+    With `since` (a date) only what the days from then on need: the STORY_SCAN newest headlines
+    before it and everything published since. Story sentiments are left empty for the older
+    headlines no such day can see.
+    """
+    from .utils import recent_news_by_ticker  # utils imports this module
+
+    fields = ('published_at', 'story_hash', 'sentiment_score')
+    articles = {ticker: [] for ticker in tickers}
+    rows = NewsArticle.objects.filter(ticker__in=tickers)
+    if since is not None:
+        cutoff = datetime.combine(since, time.min, tzinfo=dt_timezone.utc)
+        for ticker, earlier in recent_news_by_ticker(tickers, STORY_SCAN, fields=fields, before=cutoff).items():
+            articles[ticker] = [(to_days(published_at.date()), story, sentiment)
+                                for published_at, story, sentiment in reversed(earlier)]
+        rows = rows.filter(published_at__gte=cutoff)
+    seen = {ticker: max(len(articles[ticker]) - 1, 0) for ticker in tickers}
+    for ticker, published_at, story, sentiment in (
+            rows.order_by('ticker', 'published_at', 'id').values_list('ticker_id', *fields)):
+        articles[ticker].append((to_days(published_at.date()), story, sentiment))
+
+    news = {}
+    for ticker, rows in articles.items():
+        days = [day for day, _, _ in rows]
+        # The STORY_SCAN newest headlines up to and including each one, newest first
+        stories = [
+            story_sentiments([(story, sentiment) for _, story, sentiment in rows[max(0, j + 1 - STORY_SCAN):j + 1][::-1]])
+            if j >= seen[ticker] else []
+            for j in range(len(rows))
+        ]
+        news[ticker] = (days, stories)
+    return news
+
+
+def update_score_history(tickers, full=False):
+    """
+    Appends the days since the last stored one for each ticker (its whole history the first
+    time, or with full=True). Returns the number of rows written.
+    """
+    from .utils import get_health_badge  # utils imports this module
+
+    tickers = list(tickers)
+    last = {} if full else dict(
+        HealthScoreHistory.objects.filter(stock__in=tickers).values_list('stock')
+        .annotate(last=Max('date')).values_list('stock', 'last')
+    )
+    histories = load_histories([ticker for ticker in tickers if ticker not in last])
+    if last:
+        histories.update(load_histories(list(last), min(last.values()) - LOOKBACK))
+        # A window that doesn't reach WINDOW - 1 bars back (gaps in the data) gets the whole history
+        thin = [
+            ticker for ticker, day in last.items()
+            if np.searchsorted(histories[ticker]['dates'], to_days(day)) < WINDOW - 1
+        ]
+        if thin:
+            histories.update(load_histories(thin))
+    # Headlines are bounded like the bars: only what the recomputed days can see
+    news = _news_by_ticker([ticker for ticker in tickers if ticker not in last])
+    if last:
+        news.update(_news_by_ticker(list(last), min(last.values())))
+
+    rows = []
+    for ticker in tickers:
+        history = histories[ticker]
+        days = history['dates']
+        if not len(days):
+            continue
+        first = int(np.searchsorted(days, to_days(last[ticker]))) if ticker in last else 0
+        series = score_series(days, np.rint(history['close'] * 100), history['volume'], *news[ticker])
+        columns = {name: values[first:].tolist() for name, values in series.items()}
+        for offset, day in enumerate(days[first:].tolist()):
+            score = columns['score'][offset]
+            rows.append(HealthScoreHistory(
+                stock_id=ticker, date=from_days(day), score=score, badge=get_health_badge(score),
+                **{name: (None if values[offset] != values[offset] else values[offset])  # NaN -> None
+                   for name, values in columns.items() if name != 'score'},
+            ))
+
+    HealthScoreHistory.objects.bulk_create(
+        rows,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['stock', 'date'],
+        update_fields=['score', 'badge', 'sma_50', 'sma_200', 'volume_ratio', 'sentiment_avg'],
+    )
+    return len(rows)
+
+
+def load_score_history(ticker, start=None, end=None):
+    qs = HealthScoreHistory.objects.filter(stock=ticker).order_by('date')
+    if start:
+        qs = qs.filter(date__gte=start)
+    if end:
+        qs = qs.filter(date__lte=end)
+    rows = list(qs.values_list('date', 'score', 'badge', 'sma_50', 'sma_200', 'volume_ratio', 'sentiment_avg'))
+    names = ('dates', 'score', 'badge', 'sma_50', 'sma_200', 'volume_ratio', 'sentiment_avg')
+    columns = {name: [row[k] for row in rows] for k, name in enumerate(names)}
+    columns['dates'] = [day.isoformat() for day in columns['dates']]
+    return columns
+
+
+def badge_changes(columns):
+    """The days on which the badge differed from the previous day's, for backtesting the badges."""
+    changes = []
+    previous = None
+    for day, badge, score in zip(columns['dates'], columns['badge'], columns['score']):
+        if badge != previous:
+            changes.append({'date': day, 'badge': badge, 'score': score})
+            previous = badge
+    return changes
@@ -0,0 +1,161 @@
+"""
+In-memory typeahead index for the SmartSearch box.
+
+Built once per process from the Stock table (a hundred-ish rows) and rebuilt
+when the global data version moves, so lookups never hit the database:
+
+* a sorted term list answers prefix queries with two bisects,
+* a trigram -> entries map gives fuzzy matches for typos ("relaince").
+"""
+import re
+import threading
+from bisect import bisect_left
+
+from .cache import get_versions
+from .models import Stock
+
+# Names people actually type that can't be derived from the ticker / company name
+ALIASES = {
+    "RELIANCE.NS": ["RIL"],
+    "HDFCBANK.NS": ["HDFC"],
+    "HDFCLIFE.NS": ["HDFC Life"],
+    "SBIN.NS": ["SBI", "State Bank"],
+    "SBILIFE.NS": ["SBI Life"],
+    "SBICARD.NS": ["SBI Card"],
+    "LT.NS": ["L&T", "Larsen"],
+    "LTIM.NS": ["LTIMindtree", "Mindtree"],
+    "M&M.NS": ["Mahindra", "M and M"],
+    "INFY.NS": ["Infosys"],
+    "TCS.NS": ["Tata Consultancy"],
+    "HINDUNILVR.NS": ["HUL", "Hindustan Unilever"],
+    "BHARTIARTL.NS": ["Airtel", "Bharti"],
+    "MARUTI.NS": ["Maruti", "Suzuki"],
+    "MARUTE.NS": ["Maruti", "Suzuki"],
+    "DMART.NS": ["Avenue Supermarts"],
+    "NAUKRI.NS": ["Info Edge"],
+    "BAJAJ-AUTO.NS": ["Bajaj Auto"],
+    "ICICIGI.NS": ["ICICI Lombard"],
+    "ICICIPRULI.NS": ["ICICI Prudential"],
+    "UNITDSPR.NS": ["United Spirits"],
+    "VBL.NS": ["Varun Beverages"],
+    "JIOFIN.NS": ["Jio Financial", "Jio"],
+    "LICI.NS": ["LIC"],
+    "BEL.NS": ["Bharat Electronics"],
+    "HAL.NS": ["Hindustan Aeronautics"],
+}
+
+# Rank of each kind of match, higher is better
+EXACT_TICKER, TICKER_PREFIX, EXACT_ALIAS, NAME_PREFIX, WORD_PREFIX, FUZZY = 100, 90, 85, 80, 70, 50
+
+_NON_ALNUM = re.compile(r'[^a-z0-9&]+')
+
+
+def normalize(text):
+    return _NON_ALNUM.sub(' ', (text or '').lower()).strip()
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SuggestIndex:
+    def __init__(self, entries):
+        """entries: iterable of dicts with ticker / company_name / sector / health_badge."""
+        self.entries = list(entries)
+        terms = []  # (term, entry id, kind)
+        self.trigram_map = {}
+        self.fuzzy_terms = {}  # entry id -> normalized terms used for fuzzy scoring
+
+        for idx, entry in enumerate(self.entries):
+            root = normalize(entry['ticker'].split('.')[0])
+            name = normalize(entry['company_name'])
+            aliases = [normalize(alias) for alias in ALIASES.get(entry['ticker'], [])]
+            words = name.split()
+            acronym = ''.join(word[0] for word in words if word not in ('ltd', 'limited', 'and', 'of'))
+
+            terms.append((root, idx, 'ticker'))
+            terms.append((name, idx, 'name'))
+            terms.extend((word, idx, 'word') for word in words[1:])
+            if len(acronym) > 1:
+                aliases.append(acronym)
+            terms.extend((alias, idx, 'alias') for alias in aliases)
+
+            fuzzy = {root, name, *aliases}
+            self.fuzzy_terms[idx] = [(term, trigrams(term)) for term in fuzzy]
+            for term in fuzzy:
+                for gram in trigrams(term):
+                    self.trigram_map.setdefault(gram, set()).add(idx)
+
+        terms.sort()
+        self.terms = [term for term, _, _ in terms]
+        self.term_refs = [(idx, kind) for _, idx, kind in terms]
+
+    def _rank(self, term, query, kind):
+        if kind == 'ticker':
+            return EXACT_TICKER if term == query else TICKER_PREFIX
+        if kind == 'alias':
+            return EXACT_ALIAS if term == query else WORD_PREFIX
+        if kind == 'name':
+            return NAME_PREFIX
+        return WORD_PREFIX
+
+    def suggest(self, query, limit=8):
+        query = normalize(query)
+        if not query or limit < 1:
+            return []
+
+        best = {}  # entry id -> rank
+        # Prefix matches: every term in [query, query + max char)
+        start = bisect_left(self.terms, query)
+        end = bisect_left(self.terms, query + '\uffff')
+        for pos in range(start, end):
+            idx, kind = self.term_refs[pos]
+            rank = self._rank(self.terms[pos], query, kind)
+            if rank > best.get(idx, 0):
+                best[idx] = rank
+
+        # Fuzzy matches only when prefixes didn't fill the list
+        if len(best) < limit and len(query) >= 3:
+            query_grams = trigrams(query)
+            counts = {}
+            for gram in query_grams:
+                for idx in self.trigram_map.get(gram, ()):
+                    counts[idx] = counts.get(idx, 0) + 1
+            for idx, shared in counts.items():
+                if idx in best or shared < 2:
+                    continue
+                similarity = max(
+                    len(query_grams & grams) / len(query_grams | grams) for _, grams in self.fuzzy_terms[idx]
+                )
+                if similarity >= 0.3:
+                    best[idx] = FUZZY * similarity
+
+        ranked = sorted(best.items(), key=lambda item: (-item[1], self.entries[item[0]]['ticker']))
+        return [self.entries[idx] for idx, _ in ranked[:limit]]
+
+
+_lock = threading.Lock()
+_index = None
+_index_version = None
+
+
+def build_index():
+    entries = [
+        {'ticker': ticker, 'company_name': name, 'sector': sector, 'health_badge': badge}
+        for ticker, name, sector, badge in Stock.objects.order_by('ticker').values_list(
+            'ticker', 'company_name', 'sector', 'health__badge')
+    ]
+    return SuggestIndex(entries)
+
+
+def get_index():
+    """The process-wide index, rebuilt whenever ingestion has bumped the data version."""
+    global _index, _index_version
+    version = get_versions()[0]
+    if _index is None or version != _index_version:
+        with _lock:
+            if _index is None or version != _index_version:
+                _index = build_index()
+                _index_version = version
+    return _index
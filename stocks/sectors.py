@@ -0,0 +1,113 @@
+"""
+Sector rollups.
+
+A SectorSummary row aggregates the members of one sector: health score
+average / median, advancers vs decliners and total volume on the sector's
+latest day (members without a bar that day aren't counted), average sentiment
+and the best / worst scored members.
+
+Rows are rebuilt by refresh_health_scores for the sectors of the tickers it
+rescored (ingest, news and score refreshes all go through it), so the
+sectors endpoint reads precomputed rows instead of scoring the universe.
+Refreshing reads the member counts, then the members' snapshots and last
+two bars of the affected sectors in two queries.
+"""
+import numpy as np
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import SectorSummary, Stock
+from .utils import latest_prices_by_ticker
+
+UNKNOWN_SECTOR = 'Unknown'  # what ingestion stores when the provider has no sector
+MEMBERS_LISTED = 3
+
+
+def sector_of(stock_sector):
+    return stock_sector or UNKNOWN_SECTOR
+
+
+def summarize(sector, members, bars):
+    """
+    members: [(ticker, score or None, sentiment_avg or None)], bars: {ticker: [(close_paise, volume, date), ...]}
+    newest first. Returns the SectorSummary for them.
+    """
+    scored = sorted(((score, ticker) for ticker, score, _ in members if score is not None), key=lambda m: (-m[0], m[1]))
+    scores = np.array([score for score, _ in scored], dtype=np.float64)
+    sentiments = np.array([s for _, _, s in members if s is not None], dtype=np.float64)
+
+    # The day's figures only count members that traded on the sector's latest day; a member
+    # whose last bar is older (suspended, not ingested yet) would mix in another day's move
+    as_of = max((bars[ticker][0][2] for ticker, _, _ in members if bars.get(ticker)), default=None)
+    advancers = decliners = unchanged = 0
+    total_volume = 0
+    changes = []
+    for ticker, _, _ in members:
+        rows = bars.get(ticker, ())
+        if not rows or rows[0][2] != as_of:
+            continue
+        total_volume += rows[0][1]
+        if len(rows) < 2:
+            continue
+        close, previous = rows[0][0], rows[1][0]
+        advancers += close > previous
+        decliners += close < previous
+        unchanged += close == previous
+        if previous:
+            changes.append((close - previous) / previous * 100)
+
+    return SectorSummary(
+        sector=sector,
+        stocks=len(members),
+        avg_score=round(float(scores.mean()), 2) if len(scores) else None,
+        median_score=float(np.median(scores)) if len(scores) else None,
+        advancers=advancers,
+        decliners=decliners,
+        unchanged=unchanged,
+        total_volume=total_volume,
+        avg_change_pct=round(float(np.mean(changes)), 3) if changes else None,
+        avg_sentiment=round(float(sentiments.mean()), 4) if len(sentiments) else None,
+        leaders=[{'ticker': ticker, 'score': score} for score, ticker in scored[:MEMBERS_LISTED]],
+        laggards=[{'ticker': ticker, 'score': score} for score, ticker in scored[::-1][:MEMBERS_LISTED]],
+        as_of=as_of,
+        computed_at=timezone.now(),
+    )
+
+
+def refresh_sector_summaries(tickers=None):
+    """
+    Rebuilds the summaries of the sectors the given tickers belong to (every sector if None),
+    plus any sector whose member count changed (a ticker moved), and drops empty sectors.
+    Returns the number of sectors written.
+    """
+    counts = {}
+    for sector, count in Stock.objects.values_list('sector').annotate(count=Count('ticker')).order_by():
+        counts[sector_of(sector)] = counts.get(sector_of(sector), 0) + count
+    SectorSummary.objects.exclude(sector__in=list(counts)).delete()
+
+    stocks = Stock.objects.all()
+    if tickers is not None:
+        sectors = {sector_of(s) for s in Stock.objects.filter(ticker__in=list(tickers)).values_list('sector', flat=True)}
+        sectors |= {sector for sector, count in SectorSummary.objects.values_list('sector', 'stocks') if counts.get(sector) != count}
+        if not sectors:
+            return 0
+        lookup = Q(sector__in=sectors)
+        if UNKNOWN_SECTOR in sectors:
+            lookup |= Q(sector__isnull=True) | Q(sector='')
+        stocks = stocks.filter(lookup)
+
+    members = {}
+    for ticker, sector, score, sentiment in stocks.values_list('ticker', 'sector', 'health__score', 'health__sentiment_avg'):
+        members.setdefault(sector_of(sector), []).append((ticker, score, sentiment))
+    bars = latest_prices_by_ticker(
+        [ticker for rows in members.values() for ticker, _, _ in rows], 2, fields=('close_paise', 'volume', 'date'))
+
+    summaries = [summarize(sector, rows, bars) for sector, rows in members.items()]
+    SectorSummary.objects.bulk_create(
+        summaries,
+        update_conflicts=True,
+        unique_fields=['sector'],
+        update_fields=['stocks', 'avg_score', 'median_score', 'advancers', 'decliners', 'unchanged', 'total_volume',
+                       'avg_change_pct', 'avg_sentiment', 'leaders', 'laggards', 'as_of', 'computed_at'],
+    )
+    return len(summaries)
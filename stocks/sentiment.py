@@ -1,19 +1,125 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+
 import nltk
 from nltk.sentiment.vader import SentimentIntensityAnalyzer
 
+_WHITESPACE = re.compile(r'\s+')
+
+def normalize_headline(text):
+    """
+    Canonical form of a headline used for cache keys / dedup hashes.
+    Only whitespace is normalized: VADER tokenizes on whitespace but is case sensitive
+    ("GREAT" scores higher than "great"), so folding case would change the score.
+    """
+    return _WHITESPACE.sub(' ', text or '').strip()
+
+def headline_hash(text):
+    return hashlib.sha1(normalize_headline(text).encode('utf-8')).hexdigest()
+
+
+class SentimentEngine:
+    """
+    Process-wide VADER scorer.
+    The lexicon is loaded once (lazily, on first use) and compound scores are kept in a
+    bounded LRU cache keyed by the normalized headline hash, since the same wire headline
+    shows up in the feeds of many tickers.
+    """
+    def __init__(self, cache_size=10000):
+        self.cache_size = cache_size
+        self._analyzer = None
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.load_seconds = 0.0
+        self.analyze_seconds = 0.0
+
+    @property
+    def analyzer(self):
+        if self._analyzer is None:
+            with self._lock:
+                if self._analyzer is None:
+                    # Ensure lexicon is downloaded (safe check)
+                    # nltk.download('vader_lexicon', quiet=True)
+                    # In prod, we download once during build, but for dev this is fine or rely on the manual step we just did.
+                    started = time.perf_counter()
+                    self._analyzer = SentimentIntensityAnalyzer()
+                    self.load_seconds = time.perf_counter() - started
+        return self._analyzer
+
+    def analyze(self, text):
+        return self.analyze_many([text])[0]
+
+    def analyze_many(self, texts):
+        """Scores a batch of texts, returning compound scores in the same order."""
+        texts = [normalize_headline(text) for text in texts]
+        keys = [hashlib.sha1(text.encode('utf-8')).digest() for text in texts]
+        scores = {}
+
+        with self._lock:
+            for key in keys:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    scores[key] = self._cache[key]
+                    self.hits += 1
+
+        pending = {key: text for key, text in zip(keys, texts) if key not in scores}
+        if pending:
+            analyzer = self.analyzer
+            started = time.perf_counter()
+            fresh = {key: analyzer.polarity_scores(text)['compound'] for key, text in pending.items()}
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.analyze_seconds += elapsed
+                self.misses += len(fresh)
+                for key, score in fresh.items():
+                    self._cache[key] = score
+                    self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            scores.update(fresh)
+
+        return [scores[key] for key in keys]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'cached': len(self._cache),
+                'cache_size': self.cache_size,
+                'lexicon_load_seconds': self.load_seconds,
+                'analyze_seconds': self.analyze_seconds,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self.hits = self.misses = 0
+            self.analyze_seconds = 0.0
+
+
+engine = SentimentEngine()
+
 def analyze_text(text):
     """
     Analyzes the sentiment of a text string.
     Returns a compound score between -1.0 (Most Negative) and 1.0 (Most Positive).
     """
     try:
-        # Ensure lexicon is downloaded (safe check)
-        # nltk.download('vader_lexicon', quiet=True) 
-        # In prod, we download once during build, but for dev this is fine or rely on the manual step we just did.
-        
-        sid = SentimentIntensityAnalyzer()
-        scores = sid.polarity_scores(text)
-        return scores['compound']
+        return engine.analyze(text)
     except Exception as e:
         print(f"Error analyzing sentiment: {e}")
         return 0.0
+
+def analyze_many(texts):
+    """Batch version of analyze_text, scores come back in the same order as texts."""
+    try:
+        return engine.analyze_many(texts)
+    except Exception as e:
+        print(f"Error analyzing sentiment: {e}")
+        return [0.0] * len(texts)
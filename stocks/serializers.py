@@ -1,12 +1,39 @@
+from django.db.models import prefetch_related_objects
 from rest_framework import serializers
-from .models import Stock, StockPrice, Financial, Watchlist, NewsArticle
-from .utils import calculate_health_score  # We will create this next
+from .cache import get_fragments, set_fragments
+from .indicators import indicator_values
+from .models import Stock, StockPrice, Financial, Watchlist, NewsArticle, HealthScore
+from .perf import timed
+from .utils import calculate_health_score, calculate_health_scores, get_health_badge, latest_prices_by_ticker
+
+SPARKLINE_DAYS = 7
 
 class StockPriceSerializer(serializers.ModelSerializer):
     class Meta:
         model = StockPrice
         fields = ['date', 'open_price', 'close_price', 'volume']
 
+class StockListSerializer(serializers.ListSerializer):
+    """
+    Loads everything the rows of a page need in a fixed number of queries
+    instead of a handful of queries per stock.
+    """
+    def to_representation(self, data):
+        stocks = list(data.all() if hasattr(data, 'all') else data)
+        if type(self.child) is not StockSerializer:
+            self.child.prefetch(stocks)
+            return super().to_representation(stocks)
+
+        # Rows only change when their ticker's data version is bumped, reuse cached ones
+        cached, versions = get_fragments('stock', [stock.ticker for stock in stocks])
+        misses = [stock for stock in stocks if stock.ticker not in cached]
+        if misses:
+            self.child.prefetch(misses)
+            fresh = {stock.ticker: self.child.to_representation(stock) for stock in misses}
+            set_fragments('stock', fresh, versions)
+            cached.update(fresh)
+        return [cached[stock.ticker] for stock in stocks]
+
 class StockSerializer(serializers.ModelSerializer):
     current_price = serializers.SerializerMethodField()
     health_score = serializers.SerializerMethodField()
@@ -16,29 +43,73 @@ class StockSerializer(serializers.ModelSerializer):
     class Meta:
         model = Stock
         fields = ['ticker', 'company_name', 'sector', 'logo_url', 'current_price', 'health_score', 'health_badge', 'sparkline']
+        list_serializer_class = StockListSerializer
+
+    def prefetch(self, stocks):
+        """
+        Batch-load the latest prices (one windowed query for the whole page) and the
+        health scores, so the method fields below never hit the database per row.
+        """
+        tickers = [stock.ticker for stock in stocks]
+        self.context['_recent_prices'] = latest_prices_by_ticker(
+            tickers, SPARKLINE_DAYS, fields=('date', 'open_price', 'close_price', 'volume'))
 
+        prefetch_related_objects(stocks, 'health')  # no query when select_related('health') was used
+        scores = self._score_memo()
+        missing = []
+        for stock in stocks:
+            try:
+                scores[stock.ticker] = stock.health.score
+            except HealthScore.DoesNotExist:
+                missing.append(stock.ticker)
+        if missing:
+            # Snapshot not computed yet, score the stragglers in bulk
+            for ticker, snapshot in calculate_health_scores(missing).items():
+                scores[ticker] = snapshot['score']
+
+    def _score_memo(self):
+        # Shared by health_score and health_badge (and by every row of a list) for this request
+        return self.context.setdefault('_health_scores', {})
+
+    def _recent_prices(self, obj):
+        # Newest first, from prefetch() when serializing a page
+        prefetched = self.context.get('_recent_prices')
+        if prefetched is not None:
+            return [
+                StockPrice(date=row[0], open_price=row[1], close_price=row[2], volume=row[3])
+                for row in prefetched.get(obj.ticker, ())
+            ]
+        return list(obj.prices.order_by('-date')[:SPARKLINE_DAYS])
+
+    @timed('serialize')
     def get_current_price(self, obj):
+        prefetched = self.context.get('_recent_prices')
+        if prefetched is not None:
+            rows = prefetched.get(obj.ticker)
+            return rows[0][2] if rows else None
         latest_price = obj.prices.order_by('-date').first()
         return latest_price.close_price if latest_price else None
 
+    @timed('serialize')
     def get_sparkline(self, obj):
         # Last 7 days for the dashboard sparkline
-        qs = obj.prices.order_by('-date')[:7]
-        # We need them in chronological order for the chart, so reverse the sliced list
-        data = StockPriceSerializer(qs, many=True).data
+        # We need them in chronological order for the chart, so reverse the newest-first list
+        data = StockPriceSerializer(self._recent_prices(obj), many=True).data
         return data[::-1]
 
+    @timed('serialize')
     def get_health_score(self, obj):
-        return calculate_health_score(obj)
+        scores = self._score_memo()
+        if obj.ticker not in scores:
+            # Prefer the materialized snapshot, fall back to live scoring if it hasn't been computed yet
+            try:
+                scores[obj.ticker] = obj.health.score
+            except HealthScore.DoesNotExist:
+                scores[obj.ticker] = calculate_health_score(obj)
+        return scores[obj.ticker]
 
     def get_health_badge(self, obj):
-        score = self.get_health_score(obj)
-        if score >= 70:
-            return "Strong Buy"
-        elif score >= 50:
-            return "Hold"
-        else:
-            return "Risky Sell"
+        return get_health_badge(self.get_health_score(obj))
 
 class NewsArticleSerializer(serializers.ModelSerializer):
     class Meta:
@@ -48,20 +119,28 @@ class NewsArticleSerializer(serializers.ModelSerializer):
 class StockDetailSerializer(StockSerializer):
     prices = serializers.SerializerMethodField() # Limit history for detail view initially
     news = serializers.SerializerMethodField()
+    indicators = serializers.SerializerMethodField()
 
     class Meta:
         model = Stock
-        fields = StockSerializer.Meta.fields + ['prices', 'news']
+        fields = StockSerializer.Meta.fields + ['prices', 'news', 'indicators']
             
+    @timed('serialize')
     def get_prices(self, obj):
         # Return last 30 days for the sparkline/chart default
         qs = obj.prices.order_by('-date')[:30]
         return StockPriceSerializer(qs, many=True).data
 
+    @timed('serialize')
     def get_news(self, obj):
         qs = obj.news.order_by('-published_at')[:5]
         return NewsArticleSerializer(qs, many=True).data
 
+    @timed('serialize')
+    def get_indicators(self, obj):
+        # Kept up to date by the ingestion pipeline, see stocks/indicators.py
+        return indicator_values(obj)
+
 
 class FinancialSerializer(serializers.ModelSerializer):
     class Meta:
@@ -0,0 +1,159 @@
+"""
+Read-optimized, memory-mapped mirror of StockPrice.
+
+Every ticker is one .npy file holding a (4, n) int64 block, oldest bar first:
+
+    row 0  date as days since 1970-01-01
+    row 1  open price in paise
+    row 2  close price in paise
+    row 3  volume
+
+Each row is contiguous, so a column (or a date range of it) is a zero-copy
+view into the page cache, and every gunicorn worker mapping the same file
+shares the same physical memory. Prices are kept as integer paise, exactly
+what the DECIMAL(10, 2) columns hold.
+
+Writers never modify a file in place: they write a new one and os.replace()
+it, so readers that still have the old file mapped keep a consistent view.
+The store is optional (settings.PRICE_STORE_DIR); when it is off, or a ticker
+has no file yet, readers fall back to the database.
+"""
+import os
+import tempfile
+import threading
+from urllib.parse import quote, unquote
+
+import numpy as np
+from django.conf import settings
+from django.db.models import BigIntegerField, F
+from django.db.models.functions import Cast, Round
+
+from .models import StockPrice
+
+DAYS, OPEN, CLOSE, VOLUME = range(4)
+EPOCH_ORDINAL = 719163  # date(1970, 1, 1).toordinal()
+
+
+class PriceStore:
+    def __init__(self, root):
+        self.root = str(root)
+        os.makedirs(self.root, exist_ok=True)
+        self._maps = {}  # ticker -> ((inode, mtime), memmap)
+        self._lock = threading.Lock()
+
+    def path(self, ticker):
+        # Tickers like M&M.NS are quoted to stay safe as file names
+        return os.path.join(self.root, quote(ticker, safe='') + '.npy')
+
+    def tickers(self):
+        return sorted(unquote(name[:-4]) for name in os.listdir(self.root) if name.endswith('.npy'))
+
+    def read(self, ticker):
+        """The (4, n) block of a ticker as a read-only memmap, or None if it isn't in the store."""
+        path = self.path(ticker)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        key = (stat.st_ino, stat.st_mtime_ns)
+        cached = self._maps.get(ticker)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        block = np.load(path, mmap_mode='r')
+        with self._lock:
+            self._maps[ticker] = (key, block)
+        return block
+
+    def columns(self, ticker, start=None, end=None):
+        """Zero-copy views of one ticker's columns between two dates (inclusive). None if not stored."""
+        block = self.read(ticker)
+        if block is None:
+            return None
+        days = block[DAYS]
+        lo = np.searchsorted(days, start, side='left') if start is not None else 0
+        hi = np.searchsorted(days, end, side='right') if end is not None else len(days)
+        return {
+            'dates': days[lo:hi],
+            'open': block[OPEN, lo:hi],
+            'close': block[CLOSE, lo:hi],
+            'volume': block[VOLUME, lo:hi],
+        }
+
+    def write(self, ticker, block):
+        block = np.ascontiguousarray(block, dtype=np.int64)
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, block)
+            os.replace(tmp, self.path(ticker))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def merge(self, ticker, days, opens, closes, volumes):
+        """Adds bars to a ticker's file; bars for days already stored are replaced."""
+        new = np.vstack([days, opens, closes, volumes]).astype(np.int64)
+        old = self.read(ticker)
+        if old is not None:
+            new = np.hstack([old[:, ~np.isin(old[DAYS], new[DAYS])], new])
+        self.write(ticker, new[:, np.argsort(new[DAYS], kind='stable')])
+
+    def remove(self, ticker):
+        try:
+            os.unlink(self.path(ticker))
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self._maps.pop(ticker, None)
+
+
+def rebuild(store, tickers=None, chunk_size=20000, log=None):
+    """
+    Regenerates the store from StockPrice, streaming rows ordered by (ticker, date).
+    A full rebuild (tickers=None) also drops files of tickers that no longer have prices.
+    Returns {ticker: number of bars written}.
+    """
+    log = log or (lambda message, style=None: None)
+    qs = StockPrice.objects.all()
+    if tickers is not None:
+        qs = qs.filter(ticker__in=list(tickers))
+    rows = qs.annotate(
+        open_paise=Cast(Round(F('open_price') * 100), BigIntegerField()),
+        close_paise=Cast(Round(F('close_price') * 100), BigIntegerField()),
+    ).order_by('ticker', 'date').values_list('ticker_id', 'date', 'open_paise', 'close_paise', 'volume')
+
+    written = {}
+
+    def flush(ticker, bars):
+        block = np.array(bars, dtype=np.int64).T
+        store.write(ticker, block)
+        written[ticker] = len(bars)
+        log(f"{ticker}: {len(bars)} bars")
+
+    current, bars = None, []
+    for ticker, day, open_paise, close_paise, volume in rows.iterator(chunk_size=chunk_size):
+        if ticker != current:
+            if bars:
+                flush(current, bars)
+            current, bars = ticker, []
+        bars.append((day.toordinal() - EPOCH_ORDINAL, open_paise, close_paise, volume))
+    if bars:
+        flush(current, bars)
+
+    for ticker in (tickers if tickers is not None else store.tickers()):
+        if ticker not in written:
+            store.remove(ticker)
+    return written
+
+
+_stores = {}
+
+
+def get_store():
+    """The configured store (settings.PRICE_STORE_DIR), or None when it is disabled."""
+    root = getattr(settings, 'PRICE_STORE_DIR', None)
+    if not root:
+        return None
+    if root not in _stores:
+        _stores[root] = PriceStore(root)
+    return _stores[root]
@@ -0,0 +1,249 @@
+"""
+Near-duplicate headline clustering.
+
+The same story reaches a ticker's feed from several outlets under slightly
+different titles. Exact dedup (headline_hash) keeps every variant, and then
+the variants count as separate votes in the health score's sentiment. Here
+headlines are grouped into stories:
+
+* a headline is lowercased, stripped of punctuation and of a trailing
+  " - Publisher" and cut into overlapping 4-byte shingles
+* its MinHash signature is the minimum of NUM_PERM multiply-shift hashes over
+  the shingles, computed for a whole batch of headlines at once
+* the signature is split into BANDS bands of ROWS values. Headlines sharing
+  any band are candidates (for Jaccard similarity 0.5 that happens with
+  probability 0.87, for 0.3 with 0.23), and a candidate matches when the
+  estimated similarity is at least THRESHOLD
+
+A new headline joins the story of its best match among the ticker's
+headlines of the last STORY_WINDOW, or starts a story of its own. The story
+is identified by the headline_hash of its first headline (story_hash) and
+the signature is stored with the article (minhash). Each process keeps one
+StoryIndex per ticker in memory and only loads the rows added since its last
+look, so matching a headline costs a few dict lookups whatever the number of
+stored headlines.
+
+The health score takes one vote per story: story_sentiments() averages each
+story's headlines and keeps the NEWS_WINDOW newest stories.
+"""
+import re
+import threading
+from datetime import timedelta
+
+import numpy as np
+
+NUM_PERM = 128
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+THRESHOLD = 0.5
+SHINGLE = 4
+STORY_WINDOW = timedelta(days=3)
+BATCH = 512  # headlines hashed together, bounds the (shingles x NUM_PERM) matrix
+
+NEWS_WINDOW = 5  # stories averaged by the health score
+STORY_SCAN = 50  # newest headlines they are picked from
+
+_rng = np.random.default_rng(20240101)  # fixed: stored signatures must stay comparable
+_A = _rng.integers(1, 2 ** 63, NUM_PERM, dtype=np.uint64) | np.uint64(1)  # odd multipliers
+_B = _rng.integers(0, 2 ** 63, NUM_PERM, dtype=np.uint64)
+_BAND_MIX = _rng.integers(1, 2 ** 63, ROWS, dtype=np.uint64) | np.uint64(1)
+
+_PUBLISHER = re.compile(r'\s+[-|–—]\s+[^-|–—]{1,40}$')
+_NON_WORD = re.compile(r'[\W_]+')
+
+
+def shingle_text(text):
+    text = _PUBLISHER.sub('', text or '')
+    return _NON_WORD.sub(' ', text.lower()).strip().ljust(SHINGLE)
+
+
+def signatures(texts):
+    """MinHash signatures of the headlines, (len(texts), NUM_PERM) uint32."""
+    result = np.empty((len(texts), NUM_PERM), dtype=np.uint32)
+    for start in range(0, len(texts), BATCH):
+        encoded = [shingle_text(text).encode('utf-8') for text in texts[start:start + BATCH]]
+        lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+        data = np.frombuffer(b''.join(encoded), dtype=np.uint8).astype(np.uint64)
+        # Every 4-byte window as one integer, then only the windows inside a headline
+        windows = data[:-3] | data[1:-2] << 8 | data[2:-1] << 16 | data[3:] << 24
+        counts = lengths - (SHINGLE - 1)
+        firsts = np.cumsum(counts) - counts
+        positions = np.arange(counts.sum()) + np.repeat(np.cumsum(lengths) - lengths - firsts, counts)
+        hashed = (windows[positions][:, None] * _A + _B) >> np.uint64(32)
+        result[start:start + len(encoded)] = np.minimum.reduceat(hashed, firsts, axis=0)
+    return result
+
+
+def band_keys(signatures):
+    """One uint64 key per band, (n, BANDS)."""
+    bands = signatures.astype(np.uint64).reshape(len(signatures), BANDS, ROWS)
+    return (bands * _BAND_MIX).sum(axis=2)
+
+
+def similarity(a, b):
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+    return float(np.count_nonzero(a == b)) / NUM_PERM
+
+
+def story_sentiments(rows, stories=NEWS_WINDOW):
+    """
+    rows: (story_hash, sentiment_score) of a ticker's headlines, newest first.
+    Returns the average sentiment of each of the `stories` newest stories, newest first.
+    """
+    groups = {}
+    for story, sentiment in rows:
+        if story in groups:
+            groups[story].append(sentiment)
+        elif len(groups) < stories:
+            groups[story] = [sentiment]
+    return [sum(values) / len(values) for values in groups.values()]
+
+
+class StoryIndex:
+    """Banded LSH over the signatures of one ticker's recent headlines."""
+    def __init__(self):
+        self.buckets = [{} for _ in range(BANDS)]
+        self.entries = {}  # headline_hash -> (signature, band keys, story_hash, published_at)
+        self.last_id = 0  # highest article id loaded from the database
+        self.candidates = 0  # signatures compared, for the benchmark
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, key, signature, keys, story, published_at):
+        if key in self.entries:
+            return
+        self.entries[key] = (signature, keys, story, published_at)
+        for band, bucket_key in enumerate(keys):
+            self.buckets[band].setdefault(bucket_key, []).append(key)
+
+    def match(self, signature, keys, since=None):
+        """story_hash of the most similar headline published after `since`, or None."""
+        seen = set()
+        best, best_similarity = None, THRESHOLD
+        for band, bucket_key in enumerate(keys):
+            for key in self.buckets[band].get(bucket_key, ()):
+                if key in seen:
+                    continue
+                seen.add(key)
+                other, _, story, published_at = self.entries[key]
+                if since is not None and published_at < since:
+                    continue
+                score = similarity(signature, other)
+                if score >= best_similarity:
+                    best, best_similarity = story, score
+        self.candidates += len(seen)
+        return best
+
+    def prune(self, before):
+        """Forgets the headlines published before `before`."""
+        old = [key for key, entry in self.entries.items() if entry[3] < before]
+        for key in old:
+            _, keys, _, _ = self.entries.pop(key)
+            for band, bucket_key in enumerate(keys):
+                bucket = self.buckets[band][bucket_key]
+                bucket.remove(key)
+                if not bucket:
+                    del self.buckets[band][bucket_key]
+
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def _load_indexes(tickers, now):
+    from .models import NewsArticle  # keeps this module importable without the app registry
+
+    since = now - STORY_WINDOW
+    indexes = {}
+    for ticker in tickers:
+        index = indexes[ticker] = _indexes.setdefault(ticker, StoryIndex())
+        index.prune(since)
+    rows = list(
+        NewsArticle.objects.filter(ticker__in=tickers, published_at__gte=since, id__gt=min(i.last_id for i in indexes.values()))
+        .order_by('id').values_list('id', 'ticker_id', 'headline', 'headline_hash', 'story_hash', 'minhash', 'published_at')
+    )
+    # Rows stored before signatures existed are hashed here
+    computed = iter(signatures([row[2] for row in rows if row[5] is None]))
+    rows_signatures = [
+        np.frombuffer(row[5], dtype=np.uint32) if row[5] is not None else next(computed) for row in rows
+    ]
+    if rows:
+        keys = band_keys(np.array(rows_signatures)).tolist()
+        for (article_id, ticker, _, digest, story, _, published_at), signature, row_keys in zip(rows, rows_signatures, keys):
+            index = indexes[ticker]
+            if article_id > index.last_id:
+                index.add(digest, signature, row_keys, story or digest, published_at)
+                index.last_id = article_id
+    return indexes
+
+
+def assign_stories(articles, now):
+    """
+    Sets minhash and story_hash on unsaved NewsArticles (ticker_id, headline and headline_hash set),
+    matching them against the stored headlines of the last STORY_WINDOW and against each other.
+    Returns the number of articles that joined an existing story.
+    """
+    if not articles:
+        return 0
+    article_signatures = signatures([article.headline for article in articles])
+    keys = band_keys(article_signatures).tolist()
+    joined = 0
+    with _lock:
+        indexes = _load_indexes(sorted({article.ticker_id for article in articles}), now)
+        for article, signature, article_keys in zip(articles, article_signatures, keys):
+            index = indexes[article.ticker_id]
+            story = index.match(signature, article_keys, now - STORY_WINDOW)
+            joined += story is not None
+            article.story_hash = story or article.headline_hash
+            article.minhash = signature.tobytes()
+            index.add(article.headline_hash, signature, article_keys, article.story_hash, now)
+    return joined
+
+
+def cluster(headlines, keys, published):
+    """
+    Stories of headlines arriving in the given order (oldest first): returns the story key
+    (the key of its first headline) of every headline, their signatures and the index.
+    """
+    headline_signatures = signatures(headlines)
+    index = StoryIndex()
+    stories = []
+    pruned = published[0] if published else None
+    for key, signature, bands, at in zip(keys, headline_signatures, band_keys(headline_signatures).tolist(), published):
+        since = at - STORY_WINDOW
+        if since > pruned:
+            index.prune(since)
+            pruned = at
+        story = index.match(signature, bands, since) or key
+        index.add(key, signature, bands, story, at)
+        stories.append(story)
+    return stories, headline_signatures, index
+
+
+def recluster(tickers, batch_size=1000):
+    """
+    Recomputes signatures and stories of every stored headline of the tickers, oldest first,
+    as if they had arrived in that order. Returns {'articles', 'stories'}.
+    """
+    from .models import NewsArticle
+
+    report = {'articles': 0, 'stories': 0}
+    for ticker in tickers:
+        articles = list(NewsArticle.objects.filter(ticker=ticker).order_by('published_at', 'id')
+                        .only('id', 'headline', 'headline_hash', 'published_at'))
+        if not articles:
+            continue
+        stories, article_signatures, _ = cluster(
+            [article.headline for article in articles], [article.headline_hash for article in articles],
+            [article.published_at for article in articles],
+        )
+        for article, story, signature in zip(articles, stories, article_signatures):
+            article.story_hash = story
+            article.minhash = signature.tobytes()
+        NewsArticle.objects.bulk_update(articles, ['story_hash', 'minhash'], batch_size=batch_size)
+        report['articles'] += len(articles)
+        report['stories'] += len(set(stories))
+        with _lock:
+            _indexes.pop(ticker, None)  # rebuilt from the new rows on next use
+    return report
@@ -0,0 +1,232 @@
+"""
+Live updates over Server-Sent Events.
+
+Clients subscribe to a set of tickers on /api/stocks/stream/?tickers=A,B and
+receive compact deltas:
+
+    event: price   data: {"ticker": ..., "date": ..., "close": ...}
+    event: score   data: {"ticker": ..., "score": ..., "badge": ...}
+    event: news    data: {"ticker": ..., "id": ..., "headline": ..., "sentiment": ..., "url": ...}
+
+Every writer already bumps the per-ticker data versions (stocks/cache.py).
+Each server process runs one Broker on its event loop. The broker wakes up
+when a bump happens in this process (data_changed signal) and also polls the
+shared version counters, so bumps made by a management command or by another
+worker are picked up too. For the tickers that changed, it loads the latest
+state once, in three queries on the single sync_to_async thread, diffs it
+against what it last sent and fans the deltas out to per-subscriber asyncio
+queues.
+
+An idle subscriber is a suspended coroutine plus a small queue. It has no
+thread and no database connection, so one process can hold thousands. The
+endpoint has to be served by an ASGI server (see render.yaml); under WSGI a
+streaming response would tie up a worker for the lifetime of every
+connection.
+"""
+import asyncio
+import json
+import threading
+
+from asgiref.sync import sync_to_async
+
+from .cache import data_changed, get_versions
+from .models import HealthScore
+from .utils import latest_prices_by_ticker, recent_news_by_ticker
+
+POLL_INTERVAL = 2.0  # seconds between checks of the shared version counters
+KEEPALIVE = 15.0  # comment line sent on idle connections so proxies don't drop them
+QUEUE_SIZE = 64  # undelivered events per subscriber before it gets a fresh snapshot instead
+MAX_TICKERS = 50
+
+
+def load_state(tickers):
+    """Latest close, score and headline of every ticker (three queries)."""
+    state = {ticker: {} for ticker in tickers}
+    for ticker, rows in latest_prices_by_ticker(tickers, 1, fields=('date', 'close_price')).items():
+        day, close = rows[0]
+        state[ticker]['price'] = {'ticker': ticker, 'date': day.isoformat(), 'close': float(close)}
+    for ticker, score, badge in HealthScore.objects.filter(stock__in=tickers).values_list('stock_id', 'score', 'badge'):
+        state[ticker]['score'] = {'ticker': ticker, 'score': score, 'badge': badge}
+    for ticker, rows in recent_news_by_ticker(tickers, 1, fields=('id', 'headline', 'sentiment_score', 'url')).items():
+        article_id, headline, sentiment, url = rows[0]
+        state[ticker]['news'] = {'ticker': ticker, 'id': article_id, 'headline': headline,
+                                 'sentiment': sentiment, 'url': url}
+    return state
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class Subscriber:
+    def __init__(self, tickers, queue_size=QUEUE_SIZE):
+        self.tickers = tickers
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def push(self, event, data):
+        if self.overflowed:
+            return
+        if event == 'keepalive':
+            if not self.queue.qsize():
+                self.queue.put_nowait((event, data))
+            return
+        try:
+            self.queue.put_nowait((event, data))
+        except asyncio.QueueFull:
+            # Too slow to keep up: drop the backlog, it gets the current snapshot instead
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(('resync', None))
+
+
+class Broker:
+    """Per event loop fan-out of ticker deltas to SSE subscribers."""
+    def __init__(self, poll_interval=POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self.loop = asyncio.get_running_loop()
+        self.subscribers = {}  # ticker -> set of Subscriber
+        self.state = {}  # ticker -> {'price': ..., 'score': ..., 'news': ...} as last sent
+        self.versions = {}  # ticker -> data version token the state was loaded at
+        self.loading = {}  # ticker -> task loading its initial state
+        self.wakeup = asyncio.Event()
+        self.task = None
+        self.published = 0
+
+    @property
+    def subscriber_count(self):
+        return len({sub for subs in self.subscribers.values() for sub in subs})
+
+    async def subscribe(self, tickers):
+        subscriber = Subscriber(tickers)
+        new = [ticker for ticker in tickers if ticker not in self.subscribers]
+        for ticker in tickers:
+            self.subscribers.setdefault(ticker, set()).add(subscriber)
+        if new:
+            # Concurrent subscribers to the same new tickers wait for one load
+            task = self.loop.create_task(self.refresh(new, publish=False))
+            for ticker in new:
+                self.loading[ticker] = task
+            task.add_done_callback(lambda _: [self.loading.pop(ticker, None) for ticker in new])
+        pending = {self.loading[ticker] for ticker in tickers if ticker in self.loading}
+        if pending:
+            await asyncio.gather(*pending)
+        if self.task is None or self.task.done():
+            self.task = self.loop.create_task(self.watch())
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        for ticker in subscriber.tickers:
+            subs = self.subscribers.get(ticker)
+            if subs is None:
+                continue
+            subs.discard(subscriber)
+            if not subs:
+                del self.subscribers[ticker]
+                self.state.pop(ticker, None)
+                self.versions.pop(ticker, None)
+        if not self.subscribers:
+            self.wakeup.set()  # let watch() finish
+
+    def snapshot(self, tickers):
+        return [(event, data) for ticker in tickers for event, data in self.state.get(ticker, {}).items()]
+
+    def wake(self):
+        """Thread-safe: check the versions now instead of at the next poll."""
+        if not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.wakeup.set)
+
+    async def refresh(self, tickers, publish=True):
+        # Versions first: a write landing while we load is seen again on the next check
+        versions = dict(zip(sorted(set(tickers)), await sync_to_async(get_versions)(tickers)))
+        state = await sync_to_async(load_state)(tickers)
+        for ticker, current in state.items():
+            if ticker not in self.subscribers:
+                continue
+            self.versions[ticker] = versions[ticker]
+            previous = self.state.get(ticker, {})
+            self.state[ticker] = current
+            if not publish:
+                continue
+            for event, data in current.items():
+                if previous.get(event) != data:
+                    self.publish(ticker, event, data)
+
+    def publish(self, ticker, event, data):
+        for subscriber in self.subscribers.get(ticker, ()):
+            subscriber.push(event, data)
+        self.published += 1
+
+    def keepalive(self):
+        for subscriber in {sub for subs in self.subscribers.values() for sub in subs}:
+            subscriber.push('keepalive', None)
+
+    async def watch(self):
+        last_keepalive = self.loop.time()
+        while self.subscribers:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+
+            tickers = sorted(self.subscribers)
+            if not tickers:
+                break
+            # One timer for every connection instead of a timeout per subscriber
+            if self.loop.time() - last_keepalive >= KEEPALIVE:
+                self.keepalive()
+                last_keepalive = self.loop.time()
+            current = dict(zip(tickers, await sync_to_async(get_versions)(tickers)))
+            changed = [ticker for ticker in tickers if self.versions.get(ticker) != current[ticker]]
+            if changed:
+                await self.refresh(changed)
+
+
+_brokers = {}
+_brokers_lock = threading.Lock()
+
+
+def get_broker():
+    """The broker of the running event loop."""
+    loop = asyncio.get_running_loop()
+    broker = _brokers.get(loop)
+    if broker is None:
+        with _brokers_lock:
+            # Forget brokers of loops that are gone (tests, load tests)
+            for old in [old for old in _brokers if old.is_closed()]:
+                del _brokers[old]
+            broker = _brokers[loop] = Broker()
+    return broker
+
+
+def _on_data_changed(sender, **kwargs):
+    for broker in list(_brokers.values()):
+        broker.wake()
+
+
+data_changed.connect(_on_data_changed, dispatch_uid='stocks.stream')
+
+
+async def event_stream(tickers):
+    broker = get_broker()
+    subscriber = await broker.subscribe(tickers)
+    try:
+        yield "retry: 5000\n\n"
+        for event, data in broker.snapshot(tickers):
+            yield format_event(event, data)
+        while True:
+            # A plain await: on disconnect the server cancels us right here
+            event, data = await subscriber.queue.get()
+            if event == 'keepalive':
+                yield ": keepalive\n\n"
+                continue
+            if event == 'resync':
+                subscriber.overflowed = False
+                for event, data in broker.snapshot(tickers):
+                    yield format_event(event, data)
+                continue
+            yield format_event(event, data)
+    finally:
+        broker.unsubscribe(subscriber)
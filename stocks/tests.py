@@ -1,3 +1,1282 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import random
+import tempfile
+from datetime import date, datetime, timedelta
+from importlib.util import find_spec
+from decimal import Decimal
+from io import StringIO
+from unittest import skipUnless
+from unittest.mock import patch
+import pandas as pd
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from asgiref.sync import sync_to_async
+from nltk.sentiment.vader import SentimentIntensityAnalyzer
+from rest_framework.test import APIClient
+from django.contrib.auth.models import User
+from .alerts import evaluate_alerts
+from .backfill import PriceImporter
+from .cache import bump_data_version, get_versions
+from .export import Export
+from .fixture_feeds import FixtureFeedServer, rss_feed
+from .indicators import FIELDS as INDICATORS, Indicators, compute as compute_indicators, indicator_values, latest_bar, rebuild as rebuild_indicators, stored_windows, verify as verify_indicators
+from . import stories
+from .bench import Suite, compare as bench_compare, load_baseline, seed_market
+from .models import Stock, StockPrice, NewsArticle, HealthScore, HealthScoreHistory, NewsFeedState, SectorSummary, IngestJob, ImportCheckpoint, IndicatorState, Watchlist, FiredAlert
+from .ingestion import IngestionPipeline, upsert_prices
+from .jobs import claim_next_job, enqueue_ingest
+from .history import from_binary, lttb, minmax
+from .news import NewsPipeline
+from .perf import metrics, normalize_sql
+from .providers import NIFTY_100, FakeProvider
+from .sentiment import SentimentEngine, analyze_text, headline_hash
+from .score_history import score_series, update_score_history
+from .serializers import StockSerializer
+from .store import get_store
+from .stream import event_stream, get_broker
+from .management.commands.boot_report import Command as BootReportCommand
+from .warmup import STEPS, warm_up
+from .utils import calculate_health_score, calculate_health_scores, health_snapshot, refresh_health_scores, score_windows
 
-# Create your tests here.
+
+class StocksTestCase(TestCase):
+    def setUp(self):
+        # Cached responses are keyed on data versions, not on the per-test database
+        cache.clear()
+        # Same for the per-process story indexes
+        stories._indexes.clear()
+
+
+def make_stock(ticker, closes, volumes=None, sentiments=(), start=date(2024, 1, 1)):
+    """Creates a stock with one price row per close (oldest first) and optional news."""
+    stock = Stock.objects.create(ticker=ticker, company_name=f"{ticker} Ltd", sector="Tech")
+    volumes = volumes or [1000] * len(closes)
+    StockPrice.objects.bulk_create([
+        StockPrice(ticker=stock, date=start + timedelta(days=i), open_price=close, close_price=close, volume=volume)
+        for i, (close, volume) in enumerate(zip(closes, volumes))
+    ])
+    for sentiment in sentiments:
+        NewsArticle.objects.create(ticker=stock, headline=f"{ticker} news {sentiment}", sentiment_score=sentiment)
+    return stock
+
+
+class HealthScoreSnapshotTests(StocksTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        # Rising prices with rising volume and good news -> high score
+        make_stock("UP.NS", [100 + i for i in range(200)], [1000 + i * 10 for i in range(200)], sentiments=[0.8])
+        # Falling prices with bad news -> low score
+        make_stock("DOWN.NS", [300 - i for i in range(200)], sentiments=[-0.8])
+        make_stock("FLAT.NS", [100] * 60)
+        # No prices at all
+        Stock.objects.create(ticker="EMPTY.NS", company_name="Empty Ltd")
+
+    def test_refresh_matches_live_score(self):
+        self.assertEqual(refresh_health_scores(), 4)
+        for snapshot in HealthScore.objects.select_related('stock'):
+            self.assertEqual(snapshot.score, calculate_health_score(snapshot.stock))
+        up = HealthScore.objects.get(stock_id="UP.NS")
+        self.assertEqual((up.score, up.badge), (100, "Strong Buy"))
+        self.assertAlmostEqual(up.sma_50, 274.5)
+
+    def test_refresh_only_touches_given_tickers(self):
+        refresh_health_scores(["UP.NS"])
+        self.assertEqual(list(HealthScore.objects.values_list('stock_id', flat=True)), ["UP.NS"])
+
+    def test_list_orders_by_snapshot_in_sql(self):
+        refresh_health_scores(["UP.NS", "DOWN.NS", "FLAT.NS"])
+        res = self.client.get('/api/stocks/?ordering=-health_score')
+        self.assertEqual([s['ticker'] for s in res.data['results']], ["UP.NS", "FLAT.NS", "DOWN.NS", "EMPTY.NS"])
+        res = self.client.get('/api/stocks/?ordering=health_score&page_size=2')
+        self.assertEqual([s['ticker'] for s in res.data['results']], ["EMPTY.NS", "DOWN.NS"])
+
+    def test_list_filters_by_badge_and_score(self):
+        refresh_health_scores()
+        res = self.client.get('/api/stocks/?badge=Strong Buy')
+        self.assertEqual([s['ticker'] for s in res.data['results']], ["UP.NS"])
+        res = self.client.get('/api/stocks/?min_score=1&max_score=60')
+        self.assertEqual([s['ticker'] for s in res.data['results']], ["DOWN.NS", "FLAT.NS"])
+        self.assertEqual(self.client.get('/api/stocks/?min_score=abc').status_code, 400)
+
+
+class BulkHealthScoreTests(StocksTestCase):
+    def setUp(self):
+        super().setUp()
+        rng = random.Random(42)
+        # Random walks of different lengths so every rule branch (and the short-history cases) is hit
+        for i, length in enumerate([0, 5, 9, 10, 49, 50, 120, 199, 200, 250, 250, 250, 300]):
+            close = rng.uniform(50, 500)
+            closes, volumes = [], []
+            for _ in range(length):
+                close = max(1, close + rng.uniform(-5, 5.2))
+                closes.append(round(close, 2))
+                volumes.append(rng.randint(1000, 100000))
+            sentiments = [round(rng.uniform(-1, 1), 4) for _ in range(rng.randint(0, 8))]
+            make_stock(f"T{i}.NS", closes, volumes, sentiments)
+
+    def test_parity_with_per_stock_score(self):
+        stocks = list(Stock.objects.all())
+        bulk = calculate_health_scores(stocks)
+        self.assertEqual(set(bulk), {s.ticker for s in stocks})
+        for stock in stocks:
+            self.assertEqual(bulk[stock.ticker], health_snapshot(stock), stock.ticker)
+            self.assertEqual(bulk[stock.ticker]['score'], calculate_health_score(stock))
+
+    def test_universe_scored_in_two_queries(self):
+        tickers = list(Stock.objects.values_list('ticker', flat=True))
+        with self.assertNumQueries(2):
+            calculate_health_scores(tickers)
+
+
+class ScoreHistoryTests(StocksTestCase):
+    def setUp(self):
+        super().setUp()
+        rng = random.Random(7)
+        closes, volumes = [Decimal("500.00")], []
+        for _ in range(259):
+            closes.append((closes[-1] * Decimal(str(1 + rng.uniform(-0.03, 0.031)))).quantize(Decimal("0.01")))
+        volumes = [rng.randint(1000, 5000) for _ in closes]
+        self.start = date(2024, 1, 1)
+        self.stock = make_stock("HIST.NS", closes, volumes)
+        self.closes, self.volumes = closes, volumes
+        self.news = []
+        for day, sentiment in [(5, 0.9), (40, -0.6), (41, -0.8), (120, 0.5), (121, 0.4), (122, 0.7), (123, 0.1), (124, 0.6), (200, -0.9)]:
+            article = NewsArticle.objects.create(ticker=self.stock, headline=f"news {day}", sentiment_score=sentiment)
+            NewsArticle.objects.filter(pk=article.pk).update(published_at=timezone.make_aware(
+                datetime.combine(self.start + timedelta(days=day), datetime.min.time())))
+            self.news.append((day, sentiment))
+
+    def expected(self, i):
+        # The point-in-time rules with bar i as the latest bar and only the headlines known by then
+        closes = [int(close * 100) for close in self.closes[:i + 1]][::-1][:200]
+        volumes = self.volumes[:i + 1][::-1][:10]
+        news = [(sentiment,) for day, sentiment in self.news if day <= i][::-1][:5]
+        return score_windows(["HIST.NS"], {"HIST.NS": (closes, volumes)}, {"HIST.NS": news})["HIST.NS"]
+
+    def test_every_day_matches_point_in_time_rules(self):
+        self.assertEqual(update_score_history(["HIST.NS"]), 260)
+        rows = {row.date: row for row in HealthScoreHistory.objects.filter(stock=self.stock)}
+        for i in range(260):
+            row, expected = rows[self.start + timedelta(days=i)], self.expected(i)
+            self.assertEqual(row.score, expected['score'], i)
+            for field in ('sma_50', 'sma_200', 'volume_ratio', 'sentiment_avg'):
+                self.assertEqual(getattr(row, field), expected[field], (i, field))
+
+    def test_incremental_update_matches_full_recompute(self):
+        update_score_history(["HIST.NS"])
+        last = self.closes[-1]
+        StockPrice.objects.bulk_create([
+            StockPrice(ticker=self.stock, date=self.start + timedelta(days=260 + k), open_price=last,
+                       close_price=last + k, volume=3000)
+            for k in range(3)
+        ])
+        # The last stored day is recomputed, then the 3 new ones
+        self.assertEqual(update_score_history(["HIST.NS"]), 4)
+        fields = ('date', 'score', 'badge', 'sma_50', 'sma_200', 'volume_ratio', 'sentiment_avg')
+        incremental = list(HealthScoreHistory.objects.filter(stock=self.stock).order_by('date').values_list(*fields))
+        self.assertEqual(update_score_history(["HIST.NS"], full=True), 263)
+        self.assertEqual(incremental, list(HealthScoreHistory.objects.filter(stock=self.stock).order_by('date').values_list(*fields)))
+
+    def test_incremental_update_only_reads_the_headlines_it_needs(self):
+        # 120 more headlines before the last day, some of them copies of one story
+        for k in range(120):
+            article = NewsArticle.objects.create(ticker=self.stock, headline=f"old news {k}", sentiment_score=(k % 7 - 3) / 4)
+            NewsArticle.objects.filter(pk=article.pk).update(
+                story_hash=f"story {k // 3}" if k % 2 else article.story_hash,
+                published_at=timezone.make_aware(datetime.combine(self.start + timedelta(days=130 + k), datetime.min.time())))
+        update_score_history(["HIST.NS"])
+        last = self.closes[-1]
+        StockPrice.objects.create(ticker=self.stock, date=self.start + timedelta(days=260), open_price=last,
+                                  close_price=last, volume=3000)
+        article = NewsArticle.objects.create(ticker=self.stock, headline="late news", sentiment_score=-0.7)
+        NewsArticle.objects.filter(pk=article.pk).update(published_at=timezone.make_aware(
+            datetime.combine(self.start + timedelta(days=259), datetime.min.time())))
+
+        with patch('stocks.score_history.score_series', wraps=score_series) as series:
+            self.assertEqual(update_score_history(["HIST.NS"]), 2)
+        news_days = series.call_args.args[3]
+        self.assertEqual(len(news_days), stories.STORY_SCAN + 1)  # the newest ones before day 259, and the late one
+
+        fields = ('date', 'score', 'badge', 'sma_50', 'sma_200', 'volume_ratio', 'sentiment_avg')
+        incremental = list(HealthScoreHistory.objects.filter(stock=self.stock).order_by('date').values_list(*fields))
+        update_score_history(["HIST.NS"], full=True)
+        self.assertEqual(incremental, list(HealthScoreHistory.objects.filter(stock=self.stock).order_by('date').values_list(*fields)))
+
+    def test_refresh_appends_history_and_endpoint(self):
+        refresh_health_scores(["HIST.NS"])
+        latest = HealthScoreHistory.objects.filter(stock=self.stock).latest('date')
+        self.assertEqual(latest.score, HealthScore.objects.get(stock=self.stock).score)
+
+        res = APIClient().get('/api/stocks/HIST.NS/health/history/', {'start': '2024-08-01'})
+        self.assertEqual(res.status_code, 200)
+        body = res.json()
+        self.assertEqual(body['dates'][0], '2024-08-01')
+        self.assertEqual(body['points'], len(body['score']))
+        self.assertEqual(body['badge_changes'][0]['date'], '2024-08-01')
+        self.assertEqual(APIClient().get('/api/stocks/NOPE.NS/health/history/').status_code, 404)
+
+
+class SectorSummaryTests(StocksTestCase):
+    def setUp(self):
+        super().setUp()
+        make_stock("UP.NS", [100] * 59 + [110], volumes=[1000] * 60, sentiments=[0.6])
+        make_stock("DOWN.NS", [100] * 59 + [90], volumes=[2000] * 60, sentiments=[-0.4])
+        make_stock("FLAT.NS", [100] * 60)
+        make_stock("NOSECTOR.NS", [50, 60])
+        Stock.objects.filter(ticker="FLAT.NS").update(sector="Energy")
+        Stock.objects.filter(ticker="NOSECTOR.NS").update(sector=None)
+        refresh_health_scores()
+
+    def test_rollups(self):
+        tech = SectorSummary.objects.get(sector="Tech")
+        scores = dict(HealthScore.objects.values_list('stock', 'score'))
+        self.assertEqual(tech.stocks, 2)
+        self.assertEqual((tech.advancers, tech.decliners, tech.unchanged), (1, 1, 0))
+        self.assertEqual(tech.total_volume, 3000)
+        self.assertAlmostEqual(tech.avg_change_pct, 0.0)
+        self.assertAlmostEqual(tech.avg_sentiment, 0.1)
+        self.assertEqual(tech.avg_score, (scores["UP.NS"] + scores["DOWN.NS"]) / 2)
+        self.assertEqual(tech.leaders[0], {'ticker': "UP.NS", 'score': scores["UP.NS"]})
+        self.assertEqual(tech.laggards[0], {'ticker': "DOWN.NS", 'score': scores["DOWN.NS"]})
+        self.assertEqual(tech.as_of, date(2024, 2, 29))
+        self.assertEqual(SectorSummary.objects.get(sector="Energy").unchanged, 1)
+        self.assertEqual(SectorSummary.objects.get(sector="Unknown").advancers, 1)
+
+    def test_members_behind_the_latest_day_are_left_out_of_its_figures(self):
+        # Last traded a week before the rest of Tech, on a big up move
+        make_stock("STALE.NS", [100] * 52 + [150], volumes=[9000] * 53)
+        refresh_health_scores(["STALE.NS"])
+        tech = SectorSummary.objects.get(sector="Tech")
+        self.assertEqual((tech.stocks, tech.as_of), (3, date(2024, 2, 29)))
+        self.assertEqual((tech.advancers, tech.decliners, tech.unchanged), (1, 1, 0))
+        self.assertEqual(tech.total_volume, 3000)
+        self.assertAlmostEqual(tech.avg_change_pct, 0.0)
+
+    def test_moving_a_ticker_updates_both_sectors(self):
+        Stock.objects.filter(ticker="DOWN.NS").update(sector="Energy")
+        refresh_health_scores(["DOWN.NS"])
+        self.assertEqual(SectorSummary.objects.get(sector="Energy").stocks, 2)
+        self.assertEqual(SectorSummary.objects.get(sector="Tech").decliners, 0)
+
+        Stock.objects.filter(ticker__in=["FLAT.NS", "DOWN.NS"]).update(sector="Tech")
+        refresh_health_scores(["FLAT.NS"])
+        self.assertEqual(SectorSummary.objects.get(sector="Tech").stocks, 3)
+        self.assertFalse(SectorSummary.objects.filter(sector="Energy").exists())
+
+    def test_endpoint_is_one_read(self):
+        with self.assertNumQueries(1):
+            res = APIClient().get('/api/stocks/sectors/', {'ordering': '-avg_change_pct'})
+        self.assertEqual(res.status_code, 200)
+        sectors = [row['sector'] for row in res.json()['results']]
+        self.assertEqual(sectors[0], "Unknown")  # +20%
+        self.assertEqual(set(sectors), {"Tech", "Energy", "Unknown"})
+        self.assertEqual(APIClient().get('/api/stocks/sectors/', {'ordering': 'bogus'}).status_code, 400)
+
+
+class StockListQueryCountTests(StocksTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        for i in range(30):
+            make_stock(f"Q{i:02d}.NS", [100 + i + j for j in range(60)], sentiments=[0.5])
+
+    def query_count(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(url)
+        self.assertEqual(res.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_constant_queries_regardless_of_page_size(self):
+        refresh_health_scores()
+        small = self.query_count('/api/stocks/?page_size=5')
+        cache.clear()
+        self.assertEqual(small, self.query_count('/api/stocks/?page_size=30'))
+        cache.clear()
+        self.assertEqual(small, self.query_count('/api/stocks/?ordering=-health_score&page_size=30'))
+        # COUNT, page, windowed prices
+        self.assertEqual(small, 3)
+
+    def test_constant_queries_without_snapshots(self):
+        small = self.query_count('/api/stocks/?page_size=5')
+        cache.clear()
+        self.assertEqual(small, self.query_count('/api/stocks/?page_size=30'))
+
+    def test_prefetched_rows_match_per_object_serialization(self):
+        refresh_health_scores(["Q00.NS"])
+        stocks = list(Stock.objects.filter(ticker__in=["Q00.NS", "Q01.NS"]).order_by('ticker'))
+        bulk = StockSerializer(stocks, many=True).data
+        single = [StockSerializer(stock).data for stock in stocks]
+        self.assertEqual(bulk, single)
+        self.assertEqual(len(bulk[0]['sparkline']), 7)
+
+
+class FlakyProvider(FakeProvider):
+    def fetch_info(self, ticker):
+        if ticker == "TCS.NS":
+            raise RuntimeError("rate limited")
+        return super().fetch_info(ticker)
+
+
+class IngestionPipelineTests(StocksTestCase):
+    def test_concurrent_batched_ingest(self):
+        out = StringIO()
+        call_command('ingest_data', provider='fake', workers=4, batch_size=5, limit=12, stdout=out)
+        self.assertEqual(Stock.objects.count(), 12)
+        self.assertEqual(HealthScore.objects.count(), 12)
+        expected = len(FakeProvider()._frame("RELIANCE.NS", "2024-01-01"))
+        self.assertEqual(StockPrice.objects.filter(ticker="RELIANCE.NS").count(), expected)
+        self.assertIn("Ingested 12/12 tickers", out.getvalue())
+
+        # Re-running only re-reads the last stored day, nothing new gets written
+        report = IngestionPipeline(FakeProvider(), workers=4, batch_size=5).run(NIFTY_100[:12])
+        self.assertEqual(report['changed'], set())
+        self.assertEqual(StockPrice.objects.count(), expected * 12)
+
+    def test_failures_are_reported_per_ticker(self):
+        report = IngestionPipeline(FlakyProvider(end=date(2024, 3, 1)), workers=2, batch_size=2, queue_size=1).run(NIFTY_100[:4])
+        self.assertEqual(set(report['failed']), {"TCS.NS"})
+        self.assertEqual(report['changed'], {"RELIANCE.NS", "HDFCBANK.NS", "ICICIBANK.NS"})
+
+    def test_upsert_inserts_updates_and_skips(self):
+        stock = make_stock("UPS.NS", [100, 101, 102])
+        history = pd.DataFrame(
+            {'Open': [101.0, 102.5, 103.0, float('nan')], 'Close': [101.0, 102.5, 103.0, 104.0], 'Volume': [1000, 1000, 900, 800]},
+            index=pd.to_datetime(["2024-01-02", "2024-01-03", "2024-01-04", "2024-01-05"]).tz_localize("Asia/Kolkata"),
+        )
+        rebuild_indicators(["UPS.NS"])
+        # existing rows, insert + update + indicator state read / write inside a savepoint
+        with self.assertNumQueries(7):
+            stats = upsert_prices(stock, history)
+        self.assertEqual(stats, {'inserted': 1, 'updated': 1, 'skipped': 2})
+        corrected = StockPrice.objects.get(ticker=stock, date=date(2024, 1, 3))
+        self.assertEqual((corrected.open_price, corrected.close_price), (Decimal("102.50"), Decimal("102.50")))
+        self.assertEqual(StockPrice.objects.filter(ticker=stock).count(), 4)
+
+
+class PerfInstrumentationTests(StocksTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        for i in range(3):
+            make_stock(f"P{i}.NS", [100 + i + j for j in range(30)], sentiments=[0.5])
+        metrics.reset()
+
+    def timings(self, response):
+        return {entry.split(';')[0]: entry for entry in response['Server-Timing'].split(', ')}
+
+    def test_server_timing_header(self):
+        # No snapshot yet, the detail view scores live
+        timings = self.timings(self.client.get('/api/stocks/P1.NS/'))
+        self.assertIn('health', timings)
+
+        refresh_health_scores()
+        cache.clear()
+        timings = self.timings(self.client.get('/api/stocks/'))
+        self.assertIn('desc="3 queries"', timings['db'])
+        self.assertIn('serialize', timings)
+        self.assertNotIn('health', timings)  # snapshots were used
+        self.assertIn('total', timings)
+
+    def test_metrics_per_route(self):
+        for _ in range(3):
+            cache.clear()
+            self.client.get('/api/stocks/')
+        self.client.get('/api/stocks/P0.NS/')
+        self.client.get('/api/stocks/NOPE.NS/')
+        routes = self.client.get('/api/stocks/metrics/').json()['routes']
+
+        listing = routes['GET /api/stocks/']
+        self.assertEqual(listing['count'], 3)
+        self.assertEqual(sum(listing['histogram'].values()), 3)
+        self.assertGreater(listing['queries_per_request'], 0)
+        # Routes, not paths: both tickers land on the detail route
+        self.assertEqual(routes['GET /api/stocks/<str:ticker>/']['count'], 2)
+
+    def test_slow_requests_are_logged(self):
+        with override_settings(PERF_SLOW_REQUEST_MS=0), self.assertLogs('stocks.perf', 'WARNING') as logs:
+            self.client.get('/api/stocks/')
+        self.assertIn('Slow request GET /api/stocks/', logs.output[0])
+        self.assertIn('queries', logs.output[0])
+
+    def test_normalize_sql_collapses_in_lists(self):
+        self.assertEqual(
+            normalize_sql('SELECT 1 FROM t WHERE a IN (%s, %s, %s) AND b IN (%s)'),
+            'SELECT 1 FROM t WHERE a IN (...) AND b IN (%s)',
+        )
+
+
+class KeysetPaginationTests(StocksTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        for i in range(23):
+            # Repeating trends give score ties, the last few stay without a snapshot
+            make_stock(f"K{i:02d}.NS", [100 + (i % 3 - 1) * j for j in range(60)], sentiments=[0.5])
+        refresh_health_scores([f"K{i:02d}.NS" for i in range(19)])
+
+    def walk(self, params):
+        tickers, url, pages = [], '/api/stocks/', 0
+        params = {**params, 'cursor': '', 'page_size': 5}
+        while url:
+            body = self.client.get(url, params).json()
+            params = None
+            tickers += [row['ticker'] for row in body['results']]
+            last, url = body, body['next']
+            pages += 1
+        return tickers, last, pages
+
+    def test_pages_follow_page_number_order(self):
+        for ordering in ('health_score', '-health_score', 'ticker', '-ticker'):
+            expected = [row['ticker'] for row in self.client.get('/api/stocks/', {'ordering': ordering, 'page_size': 100}).json()['results']]
+            tickers, last, pages = self.walk({'ordering': ordering})
+            self.assertEqual(tickers, expected, ordering)
+            self.assertEqual(pages, 5)
+
+            # And back again from the last page
+            back, url = [], last['previous']
+            while url:
+                body = self.client.get(url).json()
+                back = [row['ticker'] for row in body['results']] + back
+                url = body['previous']
+            self.assertEqual(back, expected[:len(back)], ordering)
+            self.assertEqual(len(back), 20)
+
+    def test_search_filters_and_count(self):
+        tickers, _, _ = self.walk({'search': 'K1', 'ordering': '-health_score'})
+        self.assertEqual(sorted(tickers), [f"K{i}.NS" for i in range(10, 20)])
+        with CaptureQueriesContext(connection) as queries:
+            body = self.client.get('/api/stocks/', {'cursor': '', 'min_score': 50}).json()
+        self.assertNotIn('count', body)
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries.captured_queries))
+        self.assertEqual(self.client.get('/api/stocks/', {'cursor': '', 'count': 'true'}).json()['count'], 23)
+
+    def test_invalid_cursors(self):
+        self.assertEqual(self.client.get('/api/stocks/', {'cursor': 'garbage'}).status_code, 404)
+        cursor = self.client.get('/api/stocks/', {'cursor': '', 'ordering': 'ticker'}).json()['next'].split('cursor=')[1]
+        cache.clear()
+        self.assertEqual(self.client.get('/api/stocks/', {'cursor': cursor, 'ordering': '-ticker'}).status_code, 404)
+
+    def test_history_pages(self):
+        make_stock("PAGED.NS", [100 + i for i in range(25)])
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        for store_dir in (None, tmp.name):
+            with override_settings(PRICE_STORE_DIR=store_dir):
+                if store_dir:
+                    call_command('build_price_store', 'PAGED.NS', stdout=StringIO())
+                closes, url, params = [], '/api/stocks/PAGED.NS/history/', {'cursor': '', 'page_size': 10}
+                while url:
+                    cache.clear()
+                    body = self.client.get(url, params).json()
+                    closes.append(body['close'])
+                    url, params = body['next'], None
+                self.assertEqual([len(page) for page in closes], [10, 10, 5])
+                self.assertEqual(sum(closes, []), [float(100 + i) for i in range(25)])
+
+                cache.clear()
+                previous = self.client.get(body['previous']).json()
+                self.assertEqual(previous['close'], closes[1])
+                self.assertEqual(self.client.get(previous['previous']).json()['previous'], None)
+
+        # Binary pages carry their cursors in headers, a cached hit must repeat them
+        cache.clear()
+        params = {'cursor': '', 'page_size': 10, 'encoding': 'binary'}
+        first, again = (self.client.get('/api/stocks/PAGED.NS/history/', params) for _ in range(2))
+        self.assertTrue(first['X-Next-Cursor'])
+        self.assertEqual(again.content, first.content)
+        self.assertEqual((again['X-Next-Cursor'], again['X-Previous-Cursor']), (first['X-Next-Cursor'], first['X-Previous-Cursor']))
+
+
+class WarmupTests(StocksTestCase):
+    def test_warm_up_scores_and_primes_list_rows(self):
+        for i in range(3):
+            make_stock(f"W{i}.NS", [100 + i + j for j in range(30)])
+        report = warm_up(['scores', 'search', 'rows'])
+        self.assertEqual(report['scores']['result'], 3)
+        self.assertEqual(report['rows']['result'], 3)
+        self.assertEqual(HealthScore.objects.count(), 3)
+
+        # Rows come from the cache, only COUNT and the page are queried
+        with self.assertNumQueries(2):
+            self.assertEqual(APIClient().get('/api/stocks/').status_code, 200)
+
+    def test_failing_step_is_reported_not_raised(self):
+        def broken():
+            raise RuntimeError("no lexicon")
+        with patch.dict(STEPS, {'lexicon': broken}):
+            report = warm_up(['lexicon', 'search'])
+        self.assertEqual(report['lexicon']['error'], "RuntimeError: no lexicon")
+        self.assertEqual(report['search']['result'], 0)
+
+    def test_request_path_stays_free_of_heavy_imports(self):
+        out = StringIO()
+        call_command('boot_report', '--steps=', '--json', stdout=out)
+        self.assertEqual(json.loads(out.getvalue())['heavy_on_request_path'], [])
+
+    def test_report_only_runs_steps_without_side_effects_by_default(self):
+        options = BootReportCommand().create_parser('manage.py', 'boot_report').parse_args([])
+        self.assertEqual(options.steps.split(','), ['imports', 'lexicon', 'search'])
+
+
+class ExportTests(StocksTestCase):
+    def setUp(self):
+        super().setUp()
+        make_stock("AAA.NS", [100, 101.5, 102], volumes=[10, 20, 30], sentiments=[0.5])
+        make_stock("BBB.NS", [50, 49.25])
+
+    def test_csv_is_streamed_in_chunks(self):
+        export = Export('prices', 'csv', chunk_size=2)
+        chunks = list(export)
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(export.rows, 5)
+        self.assertEqual(b''.join(chunks).decode().splitlines(), [
+            "ticker,date,open,close,volume",
+            "AAA.NS,2024-01-01,100.00,100.00,10",
+            "AAA.NS,2024-01-02,101.50,101.50,20",
+            "AAA.NS,2024-01-03,102.00,102.00,30",
+            "BBB.NS,2024-01-01,50.00,50.00,1000",
+            "BBB.NS,2024-01-02,49.25,49.25,1000",
+        ])
+
+    def test_endpoint_filters_tickers_and_dates(self):
+        response = self.client.get('/api/stocks/export/prices/', {'tickers': 'AAA.NS', 'start': '2024-01-02'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="prices.csv"')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([line.split(',')[1] for line in lines[1:]], ["2024-01-02", "2024-01-03"])
+
+        news = b''.join(self.client.get('/api/stocks/export/news/').streaming_content).decode().splitlines()
+        self.assertEqual(news[1].split(',')[2], "AAA.NS news 0.5")
+
+    def test_bad_requests(self):
+        self.assertEqual(self.client.get('/api/stocks/export/trades/').status_code, 400)
+        self.assertEqual(self.client.get('/api/stocks/export/prices/', {'format': 'xls'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/stocks/export/prices/', {'tickers': 'NOPE.NS'}).status_code, 404)
+
+    @skipUnless(find_spec('pyarrow'), "pyarrow is not installed")
+    def test_arrow_formats_round_trip(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        arrow = b''.join(Export('prices', 'arrow', chunk_size=2))
+        table = pa.ipc.open_stream(arrow).read_all()
+        self.assertEqual(table.column('close').to_pylist(), [100.0, 101.5, 102.0, 50.0, 49.25])
+        parquet = pq.ParquetFile(pa.BufferReader(b''.join(Export('prices', 'parquet', chunk_size=2))))
+        self.assertEqual(parquet.metadata.num_row_groups, 3)
+        self.assertEqual(parquet.read().column('ticker').to_pylist()[-1], "BBB.NS")
+
+
+class BackfillTests(StocksTestCase):
+    def setUp(self):
+        super().setUp()
+        make_stock("AAA.NS", [100, 101, 102])
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def write(self, name, text):
+        path = f"{self.dir.name}/{name}"
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def closes(self, ticker):
+        return [float(c) for c in StockPrice.objects.filter(ticker=ticker).order_by('date').values_list('close_price', flat=True)]
+
+    def test_multi_ticker_file_is_validated_deduped_and_merged(self):
+        path = self.write("dump.csv", "\n".join([
+            "Ticker,Date,Open,Close,Volume",
+            "AAA.NS,2024-01-02,101,101,1000",  # unchanged
+            "AAA.NS,2024-01-03,102,103.25,1000",  # corrected close
+            "NEW.NS,2024-01-01,10,10.5,500",
+            "NEW.NS,2024-01-01,10,11,500",  # later duplicate wins
+            "NEW.NS,2024-01-02 00:00:00+05:30,11,12,600",
+            "NEW.NS,not a date,1,1,1",
+            "NEW.NS,2024-01-03,-5,1,1",
+            ",2024-01-03,1,1,1",
+        ]))
+        out = StringIO()
+        call_command('import_prices', path, stdout=out)
+        self.assertIn("3 bars written, 1 unchanged, 3 invalid, 1 duplicates", out.getvalue())
+        self.assertEqual(self.closes("AAA.NS"), [100, 101, 103.25])
+        self.assertEqual(self.closes("NEW.NS"), [11, 12])
+        self.assertEqual(Stock.objects.get(ticker="NEW.NS").company_name, "NEW.NS")
+        self.assertTrue(HealthScore.objects.filter(stock="NEW.NS").exists())
+
+    def test_single_ticker_file_takes_the_ticker_from_its_name(self):
+        path = self.write("XYZ.NS.csv", "Date,Open,High,Low,Close,Adj Close,Volume\n2024-03-01,5,6,4,5.5,5.5,10\n")
+        call_command('import_prices', path, '--no-refresh', stdout=StringIO())
+        self.assertEqual(self.closes("XYZ.NS"), [5.5])
+
+    def test_resumes_after_the_checkpoint(self):
+        rows = [f"RES.NS,2024-01-0{day},{day},{day},1" for day in range(1, 7)]
+        path = self.write("resume.csv", "ticker,date,open,close,volume\n" + "\n".join(rows))
+        # A run that committed two chunks of two rows before it was interrupted
+        stat = os.stat(path)
+        ImportCheckpoint.objects.create(path=os.path.realpath(path), size=stat.st_size, modified=stat.st_mtime,
+                                        chunk_size=2, chunks_done=2, rows_done=4)
+        report = PriceImporter(chunk_size=1000).run([path])
+        self.assertEqual((report['read'], report['resumed']), (2, 4))
+        self.assertEqual(self.closes("RES.NS"), [5, 6])
+
+        self.assertEqual(PriceImporter().run([path])['read'], 0)  # finished, skipped
+        self.assertEqual(PriceImporter(restart=True).run([path])['written'], 4)
+
+    def test_backfilled_days_get_score_history_and_fresh_versions(self):
+        refresh_health_scores(["AAA.NS"])
+        self.assertEqual(HealthScoreHistory.objects.filter(stock="AAA.NS").count(), 3)
+        path = self.write("AAA.NS.csv", "Date,Open,Close,Volume\n2023-12-29,90,90,10\n2024-01-02,99,99,10\n")
+        call_command('import_prices', path, stdout=StringIO())
+        history = dict(HealthScoreHistory.objects.filter(stock="AAA.NS").values_list('date', 'sma_50'))
+        self.assertEqual(len(history), 4)
+        self.assertIn(date(2023, 12, 29), history)
+
+        versions = get_versions(["AAA.NS"])
+        path = self.write("AAA.NS.2.csv", "Date,Open,Close,Volume\n2024-01-04,98,98,10\n")
+        call_command('import_prices', path, '--ticker', 'AAA.NS', '--no-refresh', stdout=StringIO())
+        self.assertNotEqual(get_versions(["AAA.NS"]), versions)
+
+    def test_resumed_run_rebuilds_what_the_interrupted_one_loaded(self):
+        path = self.write("two.csv", "ticker,date,open,close,volume\n" + "\n".join([
+            "FST.NS,2024-01-01,10,10,1", "FST.NS,2024-01-02,11,11,1",
+            "SND.NS,2024-01-01,20,20,1", "SND.NS,2024-01-02,21,21,1",
+        ]))
+        importer = PriceImporter(chunk_size=2)
+        load, calls = importer.load, []
+
+        def interrupted(rows):
+            calls.append(rows)
+            if len(calls) == 2:
+                raise OSError("disk full")
+            return load(rows)
+        importer.load = interrupted
+        with self.assertRaises(OSError):
+            importer.run([path])
+        self.assertFalse(HealthScore.objects.filter(stock="FST.NS").exists())
+
+        report = PriceImporter(chunk_size=2).run([path])
+        self.assertEqual((report['read'], report['tickers'], report['refreshed']), (2, {"FST.NS", "SND.NS"}, 2))
+        self.assertEqual(set(IndicatorState.objects.values_list('stock', flat=True)), {"FST.NS", "SND.NS"})
+        # Done: a rerun has nothing left to rebuild
+        self.assertEqual(PriceImporter(chunk_size=2).run([path])['tickers'], set())
+
+    @skipUnless(find_spec('pyarrow'), "pyarrow is not installed")
+    def test_parquet_export_round_trips(self):
+        path = f"{self.dir.name}/prices.parquet"
+        with open(path, 'wb') as f:
+            f.writelines(Export('prices', 'parquet', chunk_size=2))
+        StockPrice.objects.filter(date__gte=date(2024, 1, 2)).delete()
+        report = PriceImporter().run([path])
+        self.assertEqual((report['written'], report['unchanged']), (2, 1))
+        self.assertEqual(self.closes("AAA.NS"), [100, 101, 102])
+
+
+class SentimentEngineTests(StocksTestCase):
+    def test_matches_fresh_analyzer_and_caches_by_headline(self):
+        headlines = ["Reliance shares SOAR after record profit", "TCS slumps on weak guidance", "Markets flat"]
+        expected = [SentimentIntensityAnalyzer().polarity_scores(h)['compound'] for h in headlines]
+
+        engine = SentimentEngine(cache_size=2)
+        self.assertEqual(engine.analyze_many(headlines), expected)
+        self.assertEqual(engine.stats()['misses'], 3)
+        self.assertEqual(engine.stats()['cached'], 2)  # LRU bound
+
+        # Whitespace variants of a cached wire headline are cache hits
+        self.assertEqual(engine.analyze("  Markets   flat "), expected[2])
+        self.assertEqual(engine.stats()['hits'], 1)
+        self.assertEqual(analyze_text(headlines[0]), expected[0])
+
+
+class NewsPipelineTests(StocksTestCase):
+    def setUp(self):
+        super().setUp()
+        self.stocks = [
+            Stock.objects.create(ticker=ticker, company_name=f"{ticker} Ltd") for ticker in ("AAA.NS", "BBB.NS", "CCC.NS")
+        ]
+        make_stock("DDD.NS", [100] * 5)
+
+    def test_parallel_fetch_dedupes_and_skips_unchanged_feeds(self):
+        wire = "Sensex rallies as banks surge"
+        feeds = {
+            "AAA.NS": rss_feed(["AAA posts record profit", wire, "AAA posts record profit"]),
+            "BBB.NS": rss_feed([wire, "BBB faces probe"]),
+            "CCC.NS": rss_feed([]),
+        }
+        with FixtureFeedServer(feeds) as server:
+            report = NewsPipeline(workers=4, url_template=server.url).run(self.stocks)
+            self.assertEqual(report['added'], {"AAA.NS": 2, "BBB.NS": 2})
+            self.assertEqual(NewsArticle.objects.count(), 4)
+            self.assertEqual(set(NewsFeedState.objects.values_list('stock_id', 'last_status')),
+                             {("AAA.NS", 200), ("BBB.NS", 200), ("CCC.NS", 200)})
+
+            # Only BBB's feed changed: the others answer 304, the repeated headline is not re-inserted
+            feeds["BBB.NS"] = rss_feed(["BBB faces probe", "BBB wins big order"])
+            report = NewsPipeline(workers=4, url_template=server.url).run(self.stocks)
+            self.assertEqual(report['not_modified'], {"AAA.NS", "CCC.NS"})
+            self.assertEqual(report['added'], {"BBB.NS": 1})
+            self.assertEqual(NewsArticle.objects.filter(ticker="BBB.NS").count(), 3)
+
+    def test_long_headlines_hash_like_the_stored_ones(self):
+        title = "AAA " + "very " * 150 + "long headline"
+        with FixtureFeedServer({"AAA.NS": rss_feed([title])}) as server:
+            NewsPipeline(url_template=server.url, conditional=False).run(self.stocks[:1])
+            article = NewsArticle.objects.get(ticker="AAA.NS")
+            self.assertEqual(article.headline_hash, headline_hash(article.headline))
+            self.assertEqual(NewsPipeline(url_template=server.url, conditional=False).run(self.stocks[:1])['added'], {})
+        self.assertEqual(NewsArticle.objects.count(), 1)
+
+    def test_fetch_news_command_refreshes_scores(self):
+        feeds = {"DDD.NS": rss_feed(["DDD stock soars on excellent results"])}
+        with FixtureFeedServer(feeds) as server:
+            out = StringIO()
+            call_command('fetch_news', feed_url=server.url, workers=2, stdout=out)
+        self.assertIn("Added 1 articles for DDD.NS", out.getvalue())
+        self.assertGreater(HealthScore.objects.get(stock_id="DDD.NS").sentiment_avg, 0.2)
+
+
+class StoryTests(StocksTestCase):
+    def setUp(self):
+        super().setUp()
+        make_stock("EEE.NS", [100] * 5)
+
+    def test_reworded_headlines_join_one_story(self):
+        feeds = {"EEE.NS": rss_feed([
+            "EEE shares surge 8% after Q2 profit beats estimates - Reuters",
+            "EEE Shares Surge 8% After Q2 Profit Beats Estimates - Mint",
+            "EEE shares jump 8% after Q2 profit beats estimates",
+            "Regulator opens probe into EEE accounting",
+        ])}
+        with FixtureFeedServer(feeds) as server:
+            report = NewsPipeline(workers=1, url_template=server.url).run(Stock.objects.filter(ticker="EEE.NS"))
+            self.assertEqual(report['joined'], 2)
+            # A later fetch matches against the stored headlines
+            feeds["EEE.NS"] = rss_feed(["EEE shares surge 8% after Q2 profit beats estimates - Business Standard"])
+            self.assertEqual(NewsPipeline(workers=1, url_template=server.url).run(Stock.objects.filter(ticker="EEE.NS"))['joined'], 1)
+
+        articles = NewsArticle.objects.filter(ticker="EEE.NS")
+        self.assertEqual(articles.count(), 5)
+        self.assertEqual(articles.values('story_hash').distinct().count(), 2)
+        self.assertTrue(all(len(article.minhash) == stories.NUM_PERM * 4 for article in articles))
+
+    def test_score_takes_one_vote_per_story(self):
+        stock = Stock.objects.get(ticker="EEE.NS")
+        for i, sentiment in enumerate([0.9, 0.7, 0.8]):
+            NewsArticle.objects.create(ticker=stock, headline=f"copy {i}", story_hash="good", sentiment_score=sentiment)
+        NewsArticle.objects.create(ticker=stock, headline="other", sentiment_score=-0.4)
+        self.assertAlmostEqual(health_snapshot(stock)['sentiment_avg'], (0.8 - 0.4) / 2)
+        self.assertEqual(calculate_health_scores(["EEE.NS"])["EEE.NS"], health_snapshot(stock))
+
+        self.assertEqual(stories.story_sentiments([("a", 1), ("b", 0), ("a", 0), ("c", 1)], stories=2), [0.5, 0])
+
+    def test_cluster_news_regroups_stored_headlines(self):
+        stock = Stock.objects.get(ticker="EEE.NS")
+        for headline in ["EEE wins Rs 500 crore order - Reuters", "EEE wins Rs 500 crore order - Mint", "EEE CEO resigns"]:
+            NewsArticle.objects.create(ticker=stock, headline=headline, sentiment_score=0.5)
+        self.assertEqual(NewsArticle.objects.values('story_hash').distinct().count(), 3)
+
+        out = StringIO()
+        call_command('cluster_news', stdout=out)
+        self.assertIn("Grouped 3 headlines of 1 tickers into 2 stories", out.getvalue())
+        self.assertEqual(NewsArticle.objects.values('story_hash').distinct().count(), 2)
+        self.assertTrue(HealthScore.objects.filter(stock=stock).exists())
+
+
+class IndicatorTests(StocksTestCase):
+    def test_streaming_updates_match_vectorized_recompute(self):
+        rng = random.Random(3)
+        opens, closes = [], []
+        close = 50000
+        for _ in range(300):
+            close = max(100, close + rng.randint(-900, 1000))
+            closes.append(close)
+            opens.append(close + rng.randint(-300, 300))
+        expected = compute_indicators(opens, closes)
+
+        indicators = Indicators()
+        for i, (open_paise, close_paise) in enumerate(zip(opens, closes)):
+            # Through JSON on every bar, like the stored state
+            indicators = Indicators(json.loads(json.dumps(indicators.state())))
+            indicators.update(open_paise, close_paise, 1000)
+            for field, value in indicators.values().items():
+                if pd.isna(expected[field][i]):
+                    self.assertIsNone(value, (i, field))
+                else:
+                    self.assertAlmostEqual(value, expected[field][i], places=6, msg=(i, field))
+
+    def test_ingest_keeps_stored_state_in_step(self):
+        IngestionPipeline(FakeProvider(end=date(2024, 9, 1))).run(["RELIANCE.NS"])
+        IngestionPipeline(FakeProvider(end=date(2024, 9, 20))).run(["RELIANCE.NS"])
+        stock = Stock.objects.get(ticker="RELIANCE.NS")
+        bars = list(stock.prices.order_by('-date')[:10])
+        state = IndicatorState.objects.get(stock=stock)
+        self.assertEqual((state.as_of, state.bars), (bars[0].date, stock.prices.count()))
+        self.assertEqual(verify_indicators(["RELIANCE.NS"]), {})
+
+        # A corrected last bar replaces the one folded in, an older correction replays the history
+        for bar in (bars[0], bars[9]):
+            history = pd.DataFrame(
+                {'Open': [float(bar.open_price)], 'Close': [float(bar.close_price) + 5], 'Volume': [bar.volume]},
+                index=pd.to_datetime([bar.date]).tz_localize("Asia/Kolkata"),
+            )
+            upsert_prices(stock, history)
+            self.assertEqual(verify_indicators(["RELIANCE.NS"]), {})
+        self.assertEqual(IndicatorState.objects.get(stock=stock).bars, state.bars)
+
+        out = StringIO()
+        call_command('build_indicators', check=True, stdout=out)
+        self.assertIn("Indicators of 1 tickers match", out.getvalue())
+
+    def test_detail_and_score_read_stored_state(self):
+        IngestionPipeline(FakeProvider(end=date(2024, 12, 31))).run(["TCS.NS"])
+        stock = Stock.objects.select_related('indicators').get(ticker="TCS.NS")
+        with self.assertNumQueries(2):  # latest bar, headlines
+            snapshot = health_snapshot(stock)
+        self.assertIsNotNone(snapshot['sma_200'])
+        self.assertEqual(snapshot, calculate_health_scores(["TCS.NS"])["TCS.NS"])
+
+        client = APIClient()
+        indicators = client.get('/api/stocks/TCS.NS/').data['indicators']
+        self.assertEqual(indicators['as_of'], stock.indicators.as_of)
+        self.assertLessEqual(set(INDICATORS), set(indicators))
+        self.assertTrue(0 <= indicators['rsi'] <= 100)
+        self.assertGreater(indicators['bollinger_upper'], indicators['bollinger_lower'])
+
+        # Bars written past the engine (same last bar, one more before it) aren't read from the state
+        first = stock.prices.order_by('date').first()
+        StockPrice.objects.create(ticker=stock, date=first.date - timedelta(days=1), open_price=1, close_price=1, volume=1)
+        stock = Stock.objects.select_related('indicators').get(ticker="TCS.NS")
+        self.assertIsNone(stored_windows(stock, latest_bar(stock)))
+        self.assertEqual(health_snapshot(stock), calculate_health_scores(["TCS.NS"])["TCS.NS"])
+
+        # Stocks the pipeline hasn't seen yet are replayed from their bars once, and the state kept
+        make_stock("NEW.NS", [100 + i for i in range(30)])
+        indicators = client.get('/api/stocks/NEW.NS/').data['indicators']
+        self.assertEqual((indicators['bars'], indicators['rsi'], indicators['sma_50']), (30, 100.0, None))
+        self.assertEqual(IndicatorState.objects.get(stock="NEW.NS").bars, 30)
+        self.assertEqual(indicator_values(Stock.objects.get(ticker="NEW.NS"))['bars'], 30)
+
+
+@override_settings(INGEST_EMBEDDED_WORKER=False, INGEST_HTTP_PROVIDERS=["yahoo", "fake"])
+class IngestJobTests(StocksTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+
+    def test_endpoint_enqueues_and_worker_drains(self):
+        res = self.client.get('/api/stocks/setup/ingest/?limit=3&offset=1&provider=fake&workers=2')
+        self.assertEqual(res.status_code, 202)
+        job_id = res.data['job_id']
+        status = self.client.get(res.data['status_url']).data
+        self.assertEqual((status['status'], status['total'], status['completed']), ('queued', 3, 0))
+        self.assertEqual(Stock.objects.count(), 0)  # nothing ran inside the request
+
+        call_command('run_jobs', once=True, stdout=StringIO())
+        status = self.client.get(f'/api/stocks/setup/jobs/{job_id}/').data
+        self.assertEqual((status['status'], status['completed'], status['progress']), ('done', 3, 100.0))
+        self.assertEqual(sorted(status['results']), sorted(NIFTY_100[1:4]))
+        self.assertEqual(HealthScore.objects.count(), 3)
+
+    def test_endpoint_rejects_out_of_range_parameters(self):
+        for query in ('workers=9', 'workers=0', 'batch_size=51', 'batch_size=-1', 'offset=-5'):
+            res = self.client.get(f'/api/stocks/setup/ingest/?provider=fake&{query}')
+            self.assertEqual(res.status_code, 400, query)
+        self.assertFalse(IngestJob.objects.exists())
+        res = self.client.get('/api/stocks/setup/ingest/?provider=fake&limit=1&workers=8&batch_size=50')
+        self.assertEqual(res.status_code, 202)
+
+    def test_endpoint_only_queues_real_providers_by_default(self):
+        with override_settings(INGEST_HTTP_PROVIDERS=["yahoo"]):
+            self.assertEqual(self.client.get('/api/stocks/setup/ingest/?provider=fake').status_code, 400)
+            self.assertFalse(IngestJob.objects.exists())
+            self.assertEqual(self.client.get('/api/stocks/setup/ingest/?limit=1').status_code, 202)
+        self.assertEqual(IngestJob.objects.get().options['provider'], 'yahoo')
+
+    def test_interrupted_job_resumes_from_checkpoint(self):
+        job = enqueue_ingest(NIFTY_100[:4], provider='fake')
+        # Simulate a worker that died after checkpointing two tickers
+        IngestJob.objects.filter(pk=job.pk).update(
+            status=IngestJob.RUNNING, position=2, heartbeat_at=timezone.now() - timedelta(hours=1),
+            results={t: {'inserted': 1, 'updated': 0, 'skipped': 0} for t in NIFTY_100[:2]},
+        )
+        self.assertIsNone(claim_next_job(stale_after=timedelta(days=1)))  # not stale yet under a long timeout
+
+        call_command('run_jobs', once=True, stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.position, job.attempts), (IngestJob.DONE, 4, 1))
+        self.assertEqual(sorted(Stock.objects.values_list('ticker', flat=True)), sorted(NIFTY_100[2:4]))
+
+
+class ResponseCacheTests(StocksTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        make_stock("AAA.NS", [100 + i for i in range(20)])
+        make_stock("BBB.NS", [200 - i for i in range(20)])
+        refresh_health_scores()
+
+    def test_etag_revalidation_skips_database(self):
+        res = self.client.get('/api/stocks/AAA.NS/')
+        etag = res['ETag']
+        self.assertTrue(etag.startswith('"'))
+        with self.assertNumQueries(0):
+            res = self.client.get('/api/stocks/AAA.NS/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 304)
+        with self.assertNumQueries(0):
+            res = self.client.get('/api/stocks/AAA.NS/')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()['ticker'], "AAA.NS")
+
+    def test_racing_bumps_never_reuse_a_version(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        file_cache = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': tmp.name}}
+        with override_settings(CACHES=file_cache):
+            self.bump_twice_from_the_same_read()
+
+    def bump_twice_from_the_same_read(self):
+        # Two processes that both read the counter before either wrote it
+        seen = get_versions(["AAA.NS"])
+        stale = cache.get('ms:v:t:AAA.NS')
+        versions = [seen]
+        for _ in range(2):
+            with patch.object(cache, 'get', return_value=stale):
+                bump_data_version(["AAA.NS"])
+            versions.append(get_versions(["AAA.NS"]))
+        self.assertEqual(len({tuple(v) for v in versions}), 3)
+
+    def test_invalidation_is_scoped_to_touched_tickers(self):
+        aaa = self.client.get('/api/stocks/AAA.NS/')['ETag']
+        bbb = self.client.get('/api/stocks/BBB.NS/')['ETag']
+        listing = self.client.get('/api/stocks/')['ETag']
+        compare = self.client.get('/api/stocks/api/compare/?ticker1=AAA.NS&ticker2=BBB.NS')['ETag']
+
+        StockPrice.objects.filter(ticker="AAA.NS").update(close_price=1)
+        refresh_health_scores(["AAA.NS"])
+
+        self.assertEqual(self.client.get('/api/stocks/BBB.NS/', HTTP_IF_NONE_MATCH=bbb).status_code, 304)
+        for url, etag in [('/api/stocks/AAA.NS/', aaa), ('/api/stocks/', listing),
+                          ('/api/stocks/api/compare/?ticker1=AAA.NS&ticker2=BBB.NS', compare)]:
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(res.status_code, 200, url)
+        self.assertEqual(self.client.get('/api/stocks/AAA.NS/').json()['current_price'], 1.0)
+
+    def test_list_rows_reuse_cached_fragments(self):
+        self.client.get('/api/stocks/?ordering=ticker')
+        refresh_health_scores(["AAA.NS"])
+        with CaptureQueriesContext(connection) as ctx:
+            rows = self.client.get('/api/stocks/?ordering=ticker').json()['results']
+        # Only AAA.NS is re-serialized: the windowed price query is limited to it
+        price_queries = [q['sql'] for q in ctx.captured_queries if 'stocks_stockprice' in q['sql']]
+        self.assertEqual(len(price_queries), 1)
+        self.assertIn("'AAA.NS'", price_queries[0])
+        self.assertNotIn("'BBB.NS'", price_queries[0])
+        self.assertEqual([row['ticker'] for row in rows], ["AAA.NS", "BBB.NS"])
+
+
+class SuggestTests(StocksTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        for ticker, name in [("RELIANCE.NS", "Reliance Industries Limited"), ("HDFCBANK.NS", "HDFC Bank Limited"),
+                             ("HDFCLIFE.NS", "HDFC Life Insurance Company Limited"), ("TCS.NS", "Tata Consultancy Services Limited"),
+                             ("TATASTEEL.NS", "Tata Steel Limited"), ("SBIN.NS", "State Bank of India")]:
+            Stock.objects.create(ticker=ticker, company_name=name, sector="Test")
+
+    def suggest(self, q):
+        res = self.client.get('/api/stocks/suggest/', {'q': q})
+        self.assertEqual(res.status_code, 200)
+        return [row['ticker'] for row in res.data['results']]
+
+    def test_prefix_alias_and_fuzzy_matches(self):
+        self.assertEqual(self.suggest("rel")[0], "RELIANCE.NS")
+        self.assertEqual(self.suggest("Reliance")[0], "RELIANCE.NS")
+        self.assertEqual(self.suggest("hdfc")[:2], ["HDFCBANK.NS", "HDFCLIFE.NS"])
+        self.assertEqual(self.suggest("SBI"), ["SBIN.NS"])
+        self.assertEqual(self.suggest("tata")[:2], ["TATASTEEL.NS", "TCS.NS"])
+        self.assertEqual(self.suggest("steel"), ["TATASTEEL.NS"])
+        self.assertEqual(self.suggest("relaince")[0], "RELIANCE.NS")  # typo
+        self.assertEqual(self.suggest(""), [])
+
+    def test_payload_is_small_and_index_refreshes_on_ingest(self):
+        res = self.client.get('/api/stocks/suggest/', {'q': 'tcs'})
+        self.assertEqual(set(res.data['results'][0]), {'ticker', 'company_name', 'sector', 'health_badge'})
+        Stock.objects.create(ticker="INFY.NS", company_name="Infosys Limited")
+        self.assertEqual(self.suggest("infosys"), [])  # index is only rebuilt on a data version bump
+        refresh_health_scores(["INFY.NS"])
+        self.assertEqual(self.suggest("infosys"), ["INFY.NS"])
+        with self.assertNumQueries(0):
+            self.suggest("inf")
+        for limit in (0, -3):
+            self.assertEqual(self.client.get('/api/stocks/suggest/', {'q': 'tcs', 'limit': limit}).status_code, 400)
+
+
+class PriceHistoryTests(StocksTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        # 5 years of daily bars with a spike and a crash the chart must keep
+        closes = [100 + (i % 50) for i in range(1800)]
+        closes[700] = 500
+        closes[1200] = 10
+        make_stock("AAA.NS", closes)
+
+    def test_downsampling_keeps_endpoints_and_extremes(self):
+        import numpy as np
+        y = np.array([100 + (i % 50) for i in range(1800)], dtype=float)
+        y[700], y[1200] = 500, 10
+        x = np.arange(1800)
+        for indices in (lttb(x, y, 200), minmax(y, 200)):
+            self.assertLessEqual(len(indices), 201)
+            self.assertIn(700, indices)
+            self.assertIn(1200, indices)
+            self.assertTrue(np.all(np.diff(indices) > 0))
+        self.assertEqual(lttb(x, y, 200)[0], 0)
+        self.assertEqual(lttb(x, y, 200)[-1], 1799)
+        self.assertEqual(lttb(x, y, 2).tolist(), [0, 1799])
+        self.assertEqual(lttb(x, y, 1).tolist(), [1799])
+        for n in (1000, 1001, 1799):
+            for max_points in (1, 2, 3, 10, 11, 200):
+                for indices in (lttb(x[:n], y[:n], max_points), minmax(y[:n], max_points)):
+                    self.assertLessEqual(len(indices), max_points, (n, max_points))
+
+    def test_columnar_range_query(self):
+        response = self.client.get("/api/stocks/AAA.NS/history/",
+                                   {"start": "2025-01-01", "end": "2025-12-31", "max_points": 100})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["total"], 365)
+        self.assertEqual(data["points"], 100)
+        self.assertEqual(data["dates"][0], "2025-01-01")
+        self.assertEqual(data["dates"][-1], "2025-12-31")
+        self.assertEqual(len(data["close"]), len(data["volume"]))
+
+        self.assertEqual(self.client.get("/api/stocks/AAA.NS/history/", {"start": "jan"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/stocks/AAA.NS/history/", {"method": "avg"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/stocks/AAA.NS/history/", {"max_points": -1}).status_code, 400)
+        self.assertEqual(self.client.get("/api/stocks/AAA.NS/history/", {"max_points": 2}).json()["points"], 2)
+
+    def test_binary_payload(self):
+        response = self.client.get("/api/stocks/AAA.NS/history/", {"max_points": 300, "encoding": "binary"})
+        self.assertEqual(response["Content-Type"], "application/octet-stream")
+        self.assertEqual(response["X-Total-Points"], "1800")
+        cached = self.client.get("/api/stocks/AAA.NS/history/", {"max_points": 300, "encoding": "binary"})
+        self.assertEqual((cached.content, cached["X-Total-Points"]), (response.content, "1800"))
+        columns = from_binary(response.content)
+        self.assertEqual(len(columns["close"]), 300)
+        self.assertEqual(columns["close"].max(), 500)
+        self.assertLess(len(response.content), 10 * 1024)
+
+
+class PriceStoreTests(StocksTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.tickers = NIFTY_100[:4]
+
+    def db_bars(self, ticker):
+        return [
+            [day.toordinal() - date(1970, 1, 1).toordinal(), int(op * 100), int(cl * 100), vol]
+            for day, op, cl, vol in StockPrice.objects.filter(ticker=ticker).order_by('date')
+            .values_list('date', 'open_price', 'close_price', 'volume')
+        ]
+
+    def test_ingest_keeps_store_in_sync_and_readers_match_the_database(self):
+        with override_settings(PRICE_STORE_DIR=self.tmp.name):
+            store = get_store()
+            IngestionPipeline(FakeProvider(end=date(2024, 6, 1))).run(self.tickers)
+            # Second run re-reads the last day and appends the rest
+            IngestionPipeline(FakeProvider(end=date(2024, 12, 31))).run(self.tickers)
+            for ticker in self.tickers:
+                self.assertEqual(store.read(ticker).T.tolist(), self.db_bars(ticker))
+
+            with self.assertNumQueries(1):  # only the news window, prices come from the store
+                from_store = calculate_health_scores(self.tickers)
+            history = self.client.get(f"/api/stocks/{self.tickers[0]}/history/",
+                                      {"start": "2024-03-01", "max_points": 0}).json()
+        self.assertEqual(from_store, calculate_health_scores(self.tickers))
+        cache.clear()
+        self.assertEqual(history, self.client.get(f"/api/stocks/{self.tickers[0]}/history/",
+                                                  {"start": "2024-03-01", "max_points": 0}).json())
+
+    def test_rebuild_from_database(self):
+        IngestionPipeline(FakeProvider(end=date(2024, 6, 1))).run(self.tickers)
+        with override_settings(PRICE_STORE_DIR=self.tmp.name):
+            store = get_store()
+            store.write("GONE.NS", [[1], [1], [1], [1]])
+            out = StringIO()
+            call_command('build_price_store', stdout=out)
+            self.assertEqual(store.tickers(), sorted(self.tickers))
+            for ticker in self.tickers:
+                self.assertEqual(store.read(ticker).T.tolist(), self.db_bars(ticker))
+            self.assertIn("for 4 tickers", out.getvalue())
+
+
+class CompareTests(StocksTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        IngestionPipeline(FakeProvider(end=date(2025, 12, 31))).run(NIFTY_100[:12])
+        refresh_health_scores()
+        cache.clear()
+
+    def test_many_tickers_in_a_fixed_number_of_queries(self):
+        tickers = NIFTY_100[:12]
+        with self.assertNumQueries(2):  # stocks + one history query
+            response = self.client.get("/api/stocks/api/compare/",
+                                       {"tickers": ",".join(tickers), "start": "2024-01-01", "end": "2025-12-31"})
+        data = response.json()
+        self.assertEqual(data["tickers"], tickers)
+        self.assertEqual([row["ticker"] for row in data["stocks"]], tickers)
+        self.assertEqual(len(data["correlation"]), 12)
+        for i in range(12):
+            self.assertAlmostEqual(data["correlation"][i][i], 1.0)
+
+        # Metrics match a straightforward per-ticker computation
+        row = data["stocks"][0]
+        closes = [float(p) for p in StockPrice.objects.filter(ticker=tickers[0]).order_by('date')
+                  .values_list('close_price', flat=True)]
+        peak, drawdown = closes[0], 0
+        for close in closes:
+            peak = max(peak, close)
+            drawdown = min(drawdown, close / peak - 1)
+        self.assertAlmostEqual(row["total_return"], closes[-1] / closes[0] - 1, places=5)
+        self.assertAlmostEqual(row["max_drawdown"], drawdown, places=5)
+        self.assertEqual(row["health_score"], HealthScore.objects.get(stock=tickers[0]).score)
+
+    def test_alignment_and_validation(self):
+        # A listing with a shorter history narrows the common window
+        make_stock("NEW.NS", [10, 11, 12, 11, 13], start=date(2025, 12, 24))
+        data = self.client.get("/api/stocks/api/compare/", {"tickers": f"{NIFTY_100[0]},NEW.NS", "end": "2025-12-31"}).json()
+        self.assertEqual(data["start"], "2025-12-24")
+        self.assertEqual(data["end"], "2025-12-31")
+        self.assertEqual(data["stocks"][1]["total_return"], 0.3)
+
+        self.assertEqual(self.client.get("/api/stocks/api/compare/", {"tickers": "TCS.NS"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/stocks/api/compare/", {"tickers": "TCS.NS,NOPE.NS"}).status_code, 404)
+        legacy = self.client.get("/api/stocks/api/compare/", {"ticker1": NIFTY_100[0], "ticker2": NIFTY_100[1]}).json()
+        self.assertEqual(legacy["stock2"]["ticker"], NIFTY_100[1])
+
+
+class StreamTests(StocksTestCase):
+    def setUp(self):
+        super().setUp()
+        make_stock("AAA.NS", [100 + i for i in range(20)], sentiments=[0.5])
+        make_stock("BBB.NS", [200 - i for i in range(20)])
+        refresh_health_scores()
+
+    async def next_event(self, stream):
+        chunk = await asyncio.wait_for(anext(stream), 5)
+        lines = dict(line.split(": ", 1) for line in chunk.strip().splitlines())
+        return lines["event"], json.loads(lines["data"])
+
+    async def test_snapshot_then_deltas_for_subscribed_tickers(self):
+        stream = event_stream(["AAA.NS"])
+        self.assertEqual(await anext(stream), "retry: 5000\n\n")
+        snapshot = dict([await self.next_event(stream) for _ in range(3)])
+        self.assertEqual(snapshot["price"], {"ticker": "AAA.NS", "date": "2024-01-20", "close": 119.0})
+        self.assertEqual(snapshot["news"]["sentiment"], 0.5)
+
+        # Only what changed is pushed, and nothing for tickers we didn't subscribe to
+        def write():
+            StockPrice.objects.create(ticker_id="BBB.NS", date=date(2024, 1, 21), open_price=1, close_price=1, volume=1)
+            StockPrice.objects.create(ticker_id="AAA.NS", date=date(2024, 1, 21), open_price=120, close_price=120.5, volume=1)
+            refresh_health_scores(["AAA.NS", "BBB.NS"])  # bumps the data versions
+        await sync_to_async(write)()
+        self.assertEqual(await self.next_event(stream),
+                         ("price", {"ticker": "AAA.NS", "date": "2024-01-21", "close": 120.5}))
+
+        broker = get_broker()
+        self.assertEqual(broker.subscriber_count, 1)
+        await stream.aclose()
+        self.assertEqual(broker.subscriber_count, 0)
+        await asyncio.wait_for(broker.task, 5)
+
+    def test_needs_asgi(self):
+        self.assertEqual(self.client.get("/api/stocks/stream/", {"tickers": "AAA.NS"}).status_code, 501)
+
+
+class AlertEngineTests(StocksTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create(username="trader")
+
+    def watch(self, ticker, *prices):
+        return [Watchlist.objects.create(user=self.user, ticker_id=ticker, alert_price=price).pk for price in prices]
+
+    def test_fires_once_per_crossing(self):
+        make_stock("AAA.NS", [100, 105, 98, 110])
+        w102, w108, w90, w100 = self.watch("AAA.NS", "102", "108", "90", "100")
+        make_stock("BBB.NS", [100, 100])
+        self.watch("BBB.NS", "100")
+
+        # Bars from Jan 2 are new: 100 -> 105 -> 98 -> 110
+        # BBB.NS never moved, so not even its range query runs
+        with self.assertNumQueries(4):  # history, one range query per moving ticker, already fired, insert
+            report = evaluate_alerts({"AAA.NS": date(2024, 1, 2), "BBB.NS": date(2024, 1, 2)})
+        self.assertEqual(report, {'checked': 3, 'fired': 6, 'duplicates': 0})
+        fired = set(FiredAlert.objects.values_list('watchlist_id', 'date', 'direction'))
+        self.assertEqual(fired, {
+            (w102, date(2024, 1, 2), 'up'), (w102, date(2024, 1, 3), 'down'), (w102, date(2024, 1, 4), 'up'),
+            (w100, date(2024, 1, 3), 'down'), (w100, date(2024, 1, 4), 'up'), (w108, date(2024, 1, 4), 'up'),
+        })
+
+        # The next ingest re-reads the last day: nothing fires twice
+        report = evaluate_alerts({"AAA.NS": date(2024, 1, 4)})
+        self.assertEqual((report['fired'], report['duplicates']), (0, 3))
+
+    def test_catch_up_with_many_crossing_bars(self):
+        # 1299 bars crossing the threshold, more than SQLite allows as OR terms in one query
+        make_stock("CCC.NS", [100 if i % 2 else 110 for i in range(1300)])
+        self.watch("CCC.NS", "105")
+        report = evaluate_alerts({"CCC.NS": date(2024, 1, 2)})
+        self.assertEqual((report['fired'], report['duplicates']), (1299, 0))
+        report = evaluate_alerts({"CCC.NS": date(2024, 1, 2)})
+        self.assertEqual((report['fired'], report['duplicates']), (0, 1299))
+
+    def test_runs_after_each_ingest_batch(self):
+        IngestionPipeline(FakeProvider(end=date(2024, 6, 3))).run(["TCS.NS"])
+        last = StockPrice.objects.filter(ticker="TCS.NS").order_by('-date')[0]
+        frame = FakeProvider(end=date(2024, 6, 10))._frame("TCS.NS", "2024-06-04")
+        next_day, next_close = frame.index[0].date(), Decimal(str(round(frame['Close'].iloc[0], 2)))
+        between = ((last.close_price + next_close) / 2).quantize(Decimal("0.01"))
+        crossed, far = self.watch("TCS.NS", between, last.close_price / 2)
+
+        report = IngestionPipeline(FakeProvider(end=date(2024, 6, 10))).run(["TCS.NS"])
+        self.assertGreaterEqual(report['alerts']['fired'], 1)
+        self.assertTrue(FiredAlert.objects.filter(watchlist_id=crossed, date=next_day).exists())
+        self.assertFalse(FiredAlert.objects.filter(watchlist_id=far).exists())
+
+    def test_failing_alerts_dont_keep_the_old_data_version(self):
+        IngestionPipeline(FakeProvider(end=date(2024, 6, 3))).run(["TCS.NS"])
+        before = get_versions(["TCS.NS"])
+        with patch('stocks.ingestion.evaluate_alerts', side_effect=RuntimeError("boom")), \
+                self.assertLogs('stocks.ingestion', 'ERROR'):
+            report = IngestionPipeline(FakeProvider(end=date(2024, 6, 10))).run(["TCS.NS"])
+        self.assertEqual((report['changed'], report['alerts']), ({"TCS.NS"}, None))
+        self.assertNotEqual(get_versions(["TCS.NS"]), before)
+
+
+class BenchmarkTests(TestCase):
+    def test_query_counts_within_baseline(self):
+        # Timings are too noisy for CI, but query counts on the seeded market are deterministic
+        baseline = load_baseline()
+        tickers = seed_market(**baseline['config'])
+        results = Suite(tickers, years=baseline['config']['years']).run(repeat=1)
+        self.assertEqual(set(results), set(baseline['cases']))
+        for name, result in results.items():
+            self.assertLessEqual(result['queries'], baseline['cases'][name]['queries'], name)
+
+    def test_only_query_counts_are_regressions(self):
+        baseline = {'cases': {'detail': {'ms': 10.0, 'queries': 6}, 'list_plain': {'ms': 10.0, 'queries': 3}}}
+        results = {'detail': {'ms': 40.0, 'queries': 6}, 'list_plain': {'ms': 9.0, 'queries': 4}}
+        regressions, slowdowns = bench_compare(results, baseline, 0.5)
+        self.assertEqual(regressions, ["list_plain: 3 -> 4 queries"])
+        self.assertEqual(len(slowdowns), 1)
+        self.assertTrue(slowdowns[0].startswith("detail: 10.0 -> 40.0 ms"))
@@ -1,9 +1,18 @@
 from django.urls import path
 from . import views
+from .cache import versioned_cache, ticker_scope, compare_scope
 
 urlpatterns = [
     path('setup/ingest/', views.ingest_data_view, name='ingest-data'),
-    path('', views.StockListView.as_view(), name='stock-list'),
-    path('api/compare/', views.compare_stocks, name='stock-compare'),
-    path('<str:ticker>/', views.StockDetailView.as_view(), name='stock-detail'),
+    path('setup/jobs/<int:job_id>/', views.ingest_job_status, name='ingest-job-status'),
+    path('', versioned_cache()(views.StockListView.as_view()), name='stock-list'),
+    path('sectors/', versioned_cache()(views.sector_summaries), name='sector-summaries'),
+    path('suggest/', views.suggest_stocks, name='stock-suggest'),
+    path('metrics/', views.perf_metrics, name='perf-metrics'),
+    path('stream/', views.stream_updates, name='stock-stream'),
+    path('export/<str:dataset>/', views.export_history, name='stock-export'),
+    path('api/compare/', versioned_cache(compare_scope)(views.compare_stocks), name='stock-compare'),
+    path('<str:ticker>/health/history/', versioned_cache(ticker_scope)(views.stock_score_history), name='stock-score-history'),
+    path('<str:ticker>/history/', versioned_cache(ticker_scope)(views.stock_history), name='stock-history'),
+    path('<str:ticker>/', versioned_cache(ticker_scope)(views.StockDetailView.as_view()), name='stock-detail'),
 ]
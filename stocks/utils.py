@@ -1,7 +1,25 @@
 from datetime import timedelta
-from django.db.models import Avg
-from .models import StockPrice, NewsArticle
+import numpy as np
+from django.db.models import Avg, BigIntegerField, F, Window
+from django.db.models.functions import Cast, RowNumber, Round
+from django.utils import timezone
+from .cache import bump_data_version
+from .models import Stock, StockPrice, NewsArticle, HealthScore
+from .indicators import latest_bar, stored_windows
+from .perf import timed
+from .score_history import update_score_history
+from .store import get_store
+from .stories import NEWS_WINDOW, STORY_SCAN, story_sentiments
 
+def get_health_badge(score):
+    if score >= 70:
+        return "Strong Buy"
+    elif score >= 50:
+        return "Hold"
+    else:
+        return "Risky Sell"
+
+@timed('health')
 def calculate_health_score(stock):
     """
     Calculates a 0-100 health score for a stock.
@@ -9,57 +27,252 @@ def calculate_health_score(stock):
     1. Trend: SMA 50 > SMA 200 (+20 points)
     2. Short Term Momentum: Price > SMA 50 (+20 points)
     3. Volume Trend: Buying pressure (+10 points)
-    4. Sentiment: AI Analysis of news (+/- 10 points)
+    4. Sentiment: AI Analysis of news, one vote per story (+/- 10 points)
+    """
+    return health_snapshot(stock)['score']
+
+def health_snapshot(stock):
     """
+    Runs the health score rules for one stock and returns the score together
+    with the inputs it was derived from (the fields stored on HealthScore).
+    """
+    snapshot = {
+        'score': 0,
+        'sma_50': None,
+        'sma_200': None,
+        'volume_ratio': None,
+        'sentiment_avg': None,
+    }
     score = 40 # Base score
-    
+
     # Fetch recent history
     prices = stock.prices.order_by('-date')
-    if not prices.exists():
-        return 0 # No data
-        
-    latest_price = prices[0].close_price
-    
+    latest = latest_bar(stock)
+    if latest is None:
+        return snapshot # No data
+
+    # Closes (in paise) and volumes of the last 200 days, newest first. The indicator engine
+    # keeps them for every ingested stock, the rows are only read when it is behind.
+    windows = stored_windows(stock, latest)
+    if windows is None:
+        prices_list = list(prices[:200]) # Get last 200 days
+        windows = [int(p.close_price * 100) for p in prices_list], [p.volume for p in prices_list]
+    closes, volumes = windows
+    latest_price = closes[0]
+
     # 1. Price Trend (Simple Moving Average)
-    # Calculate SMA 50
-    # Ideally efficient with database aggregation, but Python list slicing is fine for MVP small data
-    prices_list = list(prices[:200]) # Get last 200 days
-    
-    if len(prices_list) >= 50:
-        sma_50 = sum(p.close_price for p in prices_list[:50]) / 50
-        
+    if len(closes) >= 50:
+        sum_50 = sum(closes[:50])
+        snapshot['sma_50'] = sum_50 / 5000
+
         # Rule: Price > SMA 50 (Bullish short term)
-        if latest_price > sma_50:
+        if latest_price * 50 > sum_50:
             score += 20
-            
-    if len(prices_list) >= 200:
-        sma_200 = sum(p.close_price for p in prices_list) / 200
-        
+
+    if len(closes) >= 200:
+        sum_200 = sum(closes)
+        snapshot['sma_200'] = sum_200 / 20000
+
         # Rule: Golden Cross (SMA 50 > SMA 200) - Long term bullish
-        # We need to calculate SMA 50 for the *same* period end? No, just current state.
         # current SMA 50 (already calc) > current SMA 200
-        if 'sma_50' in locals() and sma_50 > sma_200:
+        if sum_50 * 4 > sum_200:
             score += 20
-    
+
     # 2. Volume Trend (Buying Pressure)
     # If recent avg volume > avg volume of last month
-    if len(prices_list) >= 10:
-        recent_vol = sum(p.volume for p in prices_list[:5]) / 5
-        past_vol = sum(p.volume for p in prices_list[5:10]) / 5
-        
+    if len(volumes) >= 10:
+        recent_vol = sum(volumes[:5]) / 5
+        past_vol = sum(volumes[5:10]) / 5
+        if past_vol:
+            snapshot['volume_ratio'] = recent_vol / past_vol
+
         if recent_vol > past_vol:
             score += 10
-            
+
     # 3. Sentiment Analysis (AI)
-    recent_news = stock.news.order_by('-published_at')[:5]
-    if recent_news.exists():
-        avg_sentiment = sum(n.sentiment_score for n in recent_news) / len(recent_news)
-        
+    # Outlets repeat a story under slightly different headlines, so the newest stories vote, not the rows
+    recent_news = stock.news.order_by('-published_at', '-id').values_list('story_hash', 'sentiment_score')[:STORY_SCAN]
+    stories = story_sentiments(recent_news)
+    if stories:
+        avg_sentiment = sum(stories) / len(stories)
+        snapshot['sentiment_avg'] = avg_sentiment
+
         if avg_sentiment > 0.2:
             score += 10
         elif avg_sentiment < -0.2:
             score -= 10
-            
+
     # Cap score at 100
-    return min(max(score, 0), 100)
+    snapshot['score'] = min(max(score, 0), 100)
+    return snapshot
+
+def latest_prices_by_ticker(tickers, limit, fields=('close_price', 'volume')):
+    """
+    Loads the latest `limit` price rows for every ticker in a single windowed query
+    (ROW_NUMBER() OVER (PARTITION BY ticker ORDER BY date DESC)).
+    Returns {ticker: [tuple of fields, ...]} with the newest row first.
+    `close_paise` (close price as an integer number of paise) can be requested as a field;
+    it skips the Decimal conversion, which dominates the cost of large windows.
+    """
+    rows = (
+        StockPrice.objects.filter(ticker__in=list(tickers))
+        .annotate(
+            row_number=Window(RowNumber(), partition_by=F('ticker'), order_by=F('date').desc()),
+            close_paise=Cast(Round(F('close_price') * 100), BigIntegerField()),
+        )
+        .filter(row_number__lte=limit)
+        .order_by('ticker', 'row_number')
+        .values_list('ticker_id', *fields)
+    )
+    windows = {}
+    for row in rows:
+        windows.setdefault(row[0], []).append(row[1:])
+    return windows
+
+def recent_news_by_ticker(tickers, limit, fields=('sentiment_score',), before=None):
+    """Same as latest_prices_by_ticker, for the most recent news articles (published before `before` if given)."""
+    articles = NewsArticle.objects.filter(ticker__in=list(tickers))
+    if before is not None:
+        articles = articles.filter(published_at__lt=before)
+    rows = (
+        articles
+        .annotate(row_number=Window(RowNumber(), partition_by=F('ticker'), order_by=[F('published_at').desc(), F('id').desc()]))
+        .filter(row_number__lte=limit)
+        .order_by('ticker', 'row_number')
+        .values_list('ticker_id', *fields)
+    )
+    windows = {}
+    for row in rows:
+        windows.setdefault(row[0], []).append(row[1:])
+    return windows
+
+@timed('health')
+def calculate_health_scores(stocks):
+    """
+    Bulk version of calculate_health_score for a queryset/list of stocks (or tickers).
+    Loads the last 200 bars and 50 headlines for every ticker in two queries and applies
+    the same rules to the whole universe at once with NumPy.
+    Returns {ticker: snapshot} where snapshot has the same keys as health_snapshot().
+    """
+    tickers = [getattr(stock, 'ticker', stock) for stock in stocks]
+    prices = {}
+    store = get_store()
+    if store is not None:
+        # Zero-copy tails of the memory-mapped columns, reversed to newest first
+        for ticker in tickers:
+            columns = store.columns(ticker)
+            if columns is not None:
+                prices[ticker] = (columns['close'][-200:][::-1], columns['volume'][-200:][::-1])
+    missing = [ticker for ticker in tickers if ticker not in prices]
+    if missing:
+        for ticker, rows in latest_prices_by_ticker(missing, 200, fields=('close_paise', 'volume')).items():
+            prices[ticker] = ([close for close, _ in rows], [volume for _, volume in rows])
+    news = {
+        ticker: [(sentiment,) for sentiment in story_sentiments(rows)]
+        for ticker, rows in recent_news_by_ticker(tickers, STORY_SCAN, fields=('story_hash', 'sentiment_score')).items()
+    }
+    return score_windows(tickers, prices, news)
+
+def score_windows(tickers, prices, news):
+    """
+    Vectorized scoring over preloaded windows: prices is {ticker: (close_paise, volumes)}, newest first,
+    news is {ticker: [(story sentiment,), ...]} (see stories.story_sentiments).
+    Prices are compared as integer paise so the SMA rules give exactly the same answers
+    as the Decimal arithmetic in health_snapshot.
+    """
+    n = len(tickers)
+    closes = np.zeros((n, 200), dtype=np.int64)
+    volumes = np.zeros((n, 10), dtype=np.int64)
+    counts = np.zeros(n, dtype=np.int64)
+    sentiments = np.zeros((n, NEWS_WINDOW), dtype=np.float64)
+    news_counts = np.zeros(n, dtype=np.int64)
+
+    for i, ticker in enumerate(tickers):
+        ticker_closes, ticker_volumes = prices.get(ticker, ((), ()))
+        counts[i] = len(ticker_closes)
+        if counts[i]:
+            closes[i, :counts[i]] = ticker_closes
+            volumes[i, :min(counts[i], 10)] = ticker_volumes[:10]
+        articles = news.get(ticker, ())
+        news_counts[i] = len(articles)
+        if articles:
+            sentiments[i, :len(articles)] = [sentiment for sentiment, in articles]
+
+    has_data = counts > 0
+    has_50 = counts >= 50
+    has_200 = counts >= 200
+    has_10 = counts >= 10
+
+    latest = closes[:, 0]
+    sum_50 = closes[:, :50].sum(axis=1)
+    sum_200 = closes.sum(axis=1)
+
+    score = np.full(n, 40, dtype=np.int64)
+    # Price > SMA 50  <=>  latest * 50 > sum of last 50 closes
+    score += 20 * (has_50 & (latest * 50 > sum_50))
+    # Golden Cross: SMA 50 > SMA 200  <=>  4 * sum50 > sum200
+    score += 20 * (has_200 & (sum_50 * 4 > sum_200))
+
+    recent_vol = volumes[:, :5].sum(axis=1) / 5
+    past_vol = volumes[:, 5:10].sum(axis=1) / 5
+    score += 10 * (has_10 & (recent_vol > past_vol))
+
+    # Add column by column so the float sum runs in the same order as sum() over the articles
+    sentiment_sum = np.zeros(n, dtype=np.float64)
+    for col in range(NEWS_WINDOW):
+        sentiment_sum = sentiment_sum + sentiments[:, col]
+    has_news = news_counts > 0
+    avg_sentiment = np.divide(sentiment_sum, news_counts, out=np.zeros(n), where=has_news)
+    score += 10 * (has_news & (avg_sentiment > 0.2))
+    score -= 10 * (has_news & (avg_sentiment < -0.2))
+
+    score = np.clip(score, 0, 100)
+
+    snapshots = {}
+    for i, ticker in enumerate(tickers):
+        if not has_data[i]:
+            snapshots[ticker] = {'score': 0, 'sma_50': None, 'sma_200': None, 'volume_ratio': None, 'sentiment_avg': None}
+            continue
+        snapshots[ticker] = {
+            'score': int(score[i]),
+            'sma_50': float(sum_50[i] / 5000) if has_50[i] else None,
+            'sma_200': float(sum_200[i] / 20000) if has_200[i] else None,
+            'volume_ratio': float(recent_vol[i] / past_vol[i]) if has_10[i] and past_vol[i] else None,
+            'sentiment_avg': float(avg_sentiment[i]) if has_news[i] else None,
+        }
+    return snapshots
+
+def refresh_health_scores(tickers=None):
+    """
+    Recomputes the HealthScore snapshot for the given tickers (all stocks if None),
+    appends the new days to their score history and rebuilds their sectors' rollups.
+    Returns the number of snapshots written.
+    """
+    from .sectors import refresh_sector_summaries  # sectors imports this module
+    stocks = Stock.objects.all()
+    if tickers is not None:
+        stocks = stocks.filter(ticker__in=list(tickers))
+    tickers = list(stocks.values_list('ticker', flat=True))
+
+    now = timezone.now()
+    snapshots = []
+    for ticker, snapshot in calculate_health_scores(tickers).items():
+        snapshots.append(HealthScore(
+            stock_id=ticker,
+            badge=get_health_badge(snapshot['score']),
+            computed_at=now,
+            **snapshot
+        ))
 
+    if snapshots:
+        HealthScore.objects.bulk_create(
+            snapshots,
+            update_conflicts=True,
+            unique_fields=['stock'],
+            update_fields=['score', 'badge', 'sma_50', 'sma_200', 'volume_ratio', 'sentiment_avg', 'computed_at'],
+        )
+        update_score_history(tickers)
+        refresh_sector_summaries(tickers)
+        # Cached responses / rows of these tickers are stale now
+        bump_data_version(tickers)
+    return len(snapshots)
@@ -3,50 +3,87 @@ from rest_framework.pagination import PageNumberPagination
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.decorators import api_view
+from rest_framework.exceptions import NotFound
+from rest_framework.utils.urls import replace_query_param
+from datetime import date, timedelta
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from .models import Stock
+from django.views.decorators.http import require_GET
+from django.urls import reverse
+from .analytics import align_closes, compare_metrics
+from .export import Export
+from .history import DOWNSAMPLERS, downsample, from_days, load_histories, load_history, load_history_page, to_binary, to_columns
+from .jobs import enqueue_ingest, job_status, start_embedded_worker
+from .models import Stock, IngestJob, SectorSummary
+from .pagination import INVALID_CURSOR, KeysetPagination, decode_cursor, encode_cursor, order_by as keyset_order_by
+from .perf import metrics
+from .providers import NIFTY_100, PROVIDERS
+from .score_history import badge_changes, load_score_history
+from .search import get_index
+from .stream import MAX_TICKERS, event_stream
 from .serializers import StockSerializer, StockDetailSerializer, FinancialSerializer
+from .utils import calculate_health_scores, get_health_badge
 
 class StandardResultsSetPagination(PageNumberPagination):
     page_size = 20
     page_size_query_param = 'page_size'
     max_page_size = 100
 
-from .utils import calculate_health_score
+# Sort keys of the list orderings: (field, descending, nullable), ending in the unique ticker
+LIST_ORDERINGS = {
+    # Low to High (Risky Sell). Stocks without a snapshot have no data, i.e. score 0.
+    'health_score': [('health__score', False, True), ('ticker', False, False)],
+    # High to Low (Strong Buy)
+    '-health_score': [('health__score', True, True), ('ticker', False, False)],
+    '-ticker': [('ticker', True, False)],
+    # Default or ticker ordering, keep it consistent for pagination
+    'ticker': [('ticker', False, False)],
+}
 
 class StockListView(generics.ListAPIView):
+    """
+    Page-number pagination by default; pass `cursor` (empty for the first page) for
+    keyset pagination, which skips the COUNT and the OFFSET scan (see stocks/pagination.py).
+    """
     serializer_class = StockSerializer
     pagination_class = StandardResultsSetPagination
     filter_backends = [filters.SearchFilter]
     search_fields = ['ticker', 'company_name']
 
     def get_queryset(self):
-        return Stock.objects.all()
+        return Stock.objects.select_related('health')
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            cursor = KeysetPagination.cursor_query_param in self.request.query_params
+            self._paginator = KeysetPagination() if cursor else self.pagination_class()
+        return self._paginator
 
     def list(self, request, *args, **kwargs):
         queryset = self.filter_queryset(self.get_queryset())
-        
+
+        # Score filters run against the materialized HealthScore snapshot
+        badge = request.query_params.get('badge')
+        if badge:
+            queryset = queryset.filter(health__badge=badge)
+        try:
+            min_score = request.query_params.get('min_score')
+            if min_score:
+                queryset = queryset.filter(health__score__gte=int(min_score))
+            max_score = request.query_params.get('max_score')
+            if max_score:
+                queryset = queryset.filter(health__score__lte=int(max_score))
+        except ValueError:
+            return Response({"error": "min_score and max_score must be integers"}, status=400)
+
         ordering = request.query_params.get('ordering')
-        if ordering == 'health_score':
-            # Low to High (Risky Sell)
-            stocks = list(queryset)
-            stocks.sort(key=lambda x: calculate_health_score(x))
-            queryset = stocks
-        elif ordering == '-health_score':
-            # High to Low (Strong Buy)
-            stocks = list(queryset)
-            stocks.sort(key=lambda x: calculate_health_score(x), reverse=True)
-            queryset = stocks
-        else:
-            # Default or ticker ordering (already handled by default if set, or we set it here)
-            if ordering == 'ticker':
-                 queryset = queryset.order_by('ticker')
-            elif ordering == '-ticker':
-                 queryset = queryset.order_by('-ticker')
-            # If no ordering, it might use model default or unordered. 
-            # We should ensure consistent default ordering
-            if not ordering and hasattr(queryset, 'order_by'):
-                 queryset = queryset.order_by('ticker')
+        if ordering not in LIST_ORDERINGS:
+            ordering = 'ticker'
+        self.keyset = (ordering, LIST_ORDERINGS[ordering])
+        queryset = queryset.order_by(*keyset_order_by(LIST_ORDERINGS[ordering]))
 
         page = self.paginate_queryset(queryset)
         if page is not None:
@@ -57,24 +94,278 @@ class StockListView(generics.ListAPIView):
         return Response(serializer.data)
 
 class StockDetailView(generics.RetrieveAPIView):
-    queryset = Stock.objects.all()
+    queryset = Stock.objects.select_related('health', 'indicators')
     serializer_class = StockDetailSerializer
     lookup_field = 'ticker'
 
+@api_view(['GET'])
+def stock_history(request, ticker):
+    """
+    Price history for charts as parallel arrays, downsampled on the server.
+    Query params: start, end (YYYY-MM-DD), max_points (default 500, max 5000, 0 = all rows),
+    method (lttb or minmax), encoding=binary for the packed little-endian payload,
+    cursor (empty for the first page) and page_size for raw bars in keyset pages instead
+    """
+    stock = get_object_or_404(Stock, ticker=ticker)
+    try:
+        start = date.fromisoformat(request.query_params['start']) if request.query_params.get('start') else None
+        end = date.fromisoformat(request.query_params['end']) if request.query_params.get('end') else None
+    except ValueError:
+        return Response({"error": "start and end must be YYYY-MM-DD dates"}, status=400)
+    try:
+        max_points = min(int(request.query_params.get('max_points') or 500), 5000)
+    except ValueError:
+        return Response({"error": "max_points must be an integer"}, status=400)
+    if max_points < 0:
+        return Response({"error": "max_points can't be negative"}, status=400)
+    method = request.query_params.get('method') or 'lttb'
+    if method not in DOWNSAMPLERS:
+        return Response({"error": f"Unknown method '{method}'"}, status=400)
+
+    if 'cursor' in request.query_params:
+        return history_page(request, stock, start, end)
+
+    history = load_history(stock.ticker, start, end)
+    total = len(history['dates'])
+    if max_points > 0:
+        history = downsample(history, max_points, method)
+
+    if request.query_params.get('encoding') == 'binary':
+        response = HttpResponse(to_binary(history), content_type='application/octet-stream')
+        response['X-Total-Points'] = total
+        return response
+
+    return Response({
+        "ticker": stock.ticker,
+        "start": start,
+        "end": end,
+        "total": total,
+        "points": len(history['dates']),
+        "method": method,
+        **to_columns(history),
+    })
+
+HISTORY_PAGE_SIZE = 1000
+MAX_HISTORY_PAGE_SIZE = 5000
+
+def history_page(request, stock, start, end):
+    """Keyset pages of raw bars over (ticker, date): no COUNT, no OFFSET, each page reads only its own rows."""
+    try:
+        size = max(1, min(int(request.query_params.get('page_size') or HISTORY_PAGE_SIZE), MAX_HISTORY_PAGE_SIZE))
+    except ValueError:
+        return Response({"error": "page_size must be an integer"}, status=400)
+    after = before = None
+    if request.query_params['cursor']:
+        values, reverse = decode_cursor(request.query_params['cursor'], 'date')
+        try:
+            position = date.fromisoformat(*values)
+        except (TypeError, ValueError):
+            raise NotFound(INVALID_CURSOR)
+        if reverse:
+            before = position
+        else:
+            after = position
+
+    page, more = load_history_page(stock.ticker, size, after=after, before=before, start=start, end=end)
+    dates = page['dates']
+    url = request.build_absolute_uri()
+    next_cursor = previous_cursor = None
+    if len(dates) and (more or before):
+        next_cursor = encode_cursor('date', [from_days(dates[-1]).isoformat()])
+    if len(dates) and (more if before else after):
+        previous_cursor = encode_cursor('date', [from_days(dates[0]).isoformat()], reverse=True)
+
+    if request.query_params.get('encoding') == 'binary':
+        response = HttpResponse(to_binary(page), content_type='application/octet-stream')
+        response['X-Next-Cursor'] = next_cursor or ''
+        response['X-Previous-Cursor'] = previous_cursor or ''
+        return response
+
+    return Response({
+        "ticker": stock.ticker,
+        "next": next_cursor and replace_query_param(url, 'cursor', next_cursor),
+        "previous": previous_cursor and replace_query_param(url, 'cursor', previous_cursor),
+        "points": len(dates),
+        **to_columns(page),
+    })
+
+@api_view(['GET'])
+def stock_score_history(request, ticker):
+    """
+    Daily health score history (the score rules evaluated as of every trading day) as parallel arrays,
+    plus the days the badge changed.
+    Query params: start, end (YYYY-MM-DD)
+    """
+    stock = get_object_or_404(Stock, ticker=ticker)
+    try:
+        start = date.fromisoformat(request.query_params['start']) if request.query_params.get('start') else None
+        end = date.fromisoformat(request.query_params['end']) if request.query_params.get('end') else None
+    except ValueError:
+        return Response({"error": "start and end must be YYYY-MM-DD dates"}, status=400)
+
+    columns = load_score_history(stock.ticker, start, end)
+    return Response({
+        "ticker": stock.ticker,
+        "start": start,
+        "end": end,
+        "points": len(columns['dates']),
+        **columns,
+        "badge_changes": badge_changes(columns),
+    })
+
+SECTOR_ORDERINGS = {
+    'sector': 'sector', 'avg_score': 'avg_score', '-avg_score': '-avg_score',
+    'avg_change_pct': 'avg_change_pct', '-avg_change_pct': '-avg_change_pct',
+    'total_volume': 'total_volume', '-total_volume': '-total_volume',
+}
+
+@api_view(['GET'])
+def sector_summaries(request):
+    """
+    Sector heatmap data, read from the precomputed SectorSummary rollups.
+    Query params: ordering (sector, avg_score, avg_change_pct, total_volume, prefix - for descending)
+    """
+    ordering = request.query_params.get('ordering') or 'sector'
+    if ordering not in SECTOR_ORDERINGS:
+        return Response({"error": f"Unknown ordering '{ordering}'"}, status=400)
+    rows = SectorSummary.objects.order_by(SECTOR_ORDERINGS[ordering], 'sector').values(
+        'sector', 'stocks', 'avg_score', 'median_score', 'advancers', 'decliners', 'unchanged',
+        'total_volume', 'avg_change_pct', 'avg_sentiment', 'leaders', 'laggards', 'as_of', 'computed_at')
+    return Response({"results": list(rows)})
+
+async def stream_updates(request):
+    """
+    Server-Sent Events with live price / score / headline deltas (see stocks/stream.py).
+    Query params: tickers (comma separated, up to 50)
+    """
+    if not isinstance(request, ASGIRequest):
+        # A WSGI worker would be stuck on this connection for as long as the client stays subscribed
+        return JsonResponse({"error": "Streaming needs the ASGI server (marketsentry.asgi)"}, status=501)
+    tickers = list(dict.fromkeys(t.strip() for t in request.GET.get('tickers', '').split(',') if t.strip()))
+    if not tickers or len(tickers) > MAX_TICKERS:
+        return JsonResponse({"error": f"Please provide between 1 and {MAX_TICKERS} tickers"}, status=400)
+
+    response = StreamingHttpResponse(event_stream(tickers), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # don't let a proxy buffer the stream
+    return response
+
+@require_GET
+def export_history(request, dataset):
+    """
+    Streams price or news history as a file download (see stocks/export.py).
+    Query params: tickers (comma separated, default all), start, end (YYYY-MM-DD), format (csv, parquet or arrow)
+    """
+    tickers = list(dict.fromkeys(t.strip() for t in request.GET.get('tickers', '').split(',') if t.strip()))
+    try:
+        start = date.fromisoformat(request.GET['start']) if request.GET.get('start') else None
+        end = date.fromisoformat(request.GET['end']) if request.GET.get('end') else None
+    except ValueError:
+        return JsonResponse({"error": "start and end must be YYYY-MM-DD dates"}, status=400)
+    try:
+        export = Export(dataset, request.GET.get('format') or 'csv', tickers, start, end)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except ImportError as e:
+        return JsonResponse({"error": str(e)}, status=501)
+    if tickers:
+        known = set(Stock.objects.filter(ticker__in=tickers).values_list('ticker', flat=True))
+        unknown = [ticker for ticker in tickers if ticker not in known]
+        if unknown:
+            return JsonResponse({"error": f"Unknown tickers: {', '.join(unknown)}"}, status=404)
+
+    content = export.stream_async() if isinstance(request, ASGIRequest) else export
+    response = StreamingHttpResponse(content, content_type=export.content_type)
+    response['Content-Disposition'] = f'attachment; filename="{export.filename}"'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@api_view(['GET'])
+def suggest_stocks(request):
+    """
+    Typeahead suggestions for the search box, served from the in-memory index.
+    Query params: q, limit (default 8, max 20)
+    """
+    try:
+        limit = min(int(request.query_params.get('limit') or 8), 20)
+    except ValueError:
+        return Response({"error": "limit must be an integer"}, status=400)
+    if limit < 1:
+        return Response({"error": "limit must be at least 1"}, status=400)
+    query = request.query_params.get('q', '')
+    return Response({"query": query, "results": get_index().suggest(query, limit)})
+
+MAX_COMPARE_TICKERS = 20
+COMPARE_DEFAULT_DAYS = 730
+
 @api_view(['GET'])
 def compare_stocks(request):
     """
-    Compare two stocks side-by-side.
-    Query params: ticker1, ticker2
+    Compare stocks side-by-side.
+    Query params: tickers (comma separated, up to 20), start, end (YYYY-MM-DD, default the last two years)
+    The older ticker1/ticker2 form still returns the two full stock details.
     """
+    if not request.query_params.get('tickers'):
+        return compare_pair(request)
+
+    tickers = list(dict.fromkeys(t.strip() for t in request.query_params['tickers'].split(',') if t.strip()))
+    if len(tickers) < 2 or len(tickers) > MAX_COMPARE_TICKERS:
+        return Response({"error": f"Please provide between 2 and {MAX_COMPARE_TICKERS} tickers"}, status=400)
+    try:
+        end = date.fromisoformat(request.query_params['end']) if request.query_params.get('end') else None
+        start = (date.fromisoformat(request.query_params['start']) if request.query_params.get('start')
+                 else (end or date.today()) - timedelta(days=COMPARE_DEFAULT_DAYS))
+    except ValueError:
+        return Response({"error": "start and end must be YYYY-MM-DD dates"}, status=400)
+
+    stocks = {stock.ticker: stock for stock in Stock.objects.select_related('health').filter(ticker__in=tickers)}
+    unknown = [ticker for ticker in tickers if ticker not in stocks]
+    if unknown:
+        return Response({"error": f"Unknown tickers: {', '.join(unknown)}"}, status=404)
+
+    # One query for every history (none when they're all in the price store)
+    histories = load_histories(tickers, start, end)
+    result = compare_metrics(align_closes(histories))
+
+    scores = {}
+    missing = [ticker for ticker in tickers if not hasattr(stocks[ticker], 'health')]
+    if missing:
+        scores = {ticker: snapshot['score'] for ticker, snapshot in calculate_health_scores(missing).items()}
+
+    rows = []
+    for ticker in tickers:
+        stock = stocks[ticker]
+        score = stock.health.score if ticker not in scores else scores[ticker]
+        closes = histories[ticker]['close']
+        rows.append({
+            "ticker": ticker,
+            "company_name": stock.company_name,
+            "sector": stock.sector,
+            "last_close": float(closes[-1]) if len(closes) else None,
+            "health_score": score,
+            "health_badge": get_health_badge(score),
+            **result['metrics'][ticker],
+        })
+
+    return Response({
+        "tickers": tickers,
+        "start": result['start'],
+        "end": result['end'],
+        "days": result['days'],
+        "stocks": rows,
+        "correlation": result['correlation'],
+    })
+
+def compare_pair(request):
     t1 = request.query_params.get('ticker1')
     t2 = request.query_params.get('ticker2')
     
     if not t1 or not t2:
-        return Response({"error": "Please provide ticker1 and ticker2"}, status=400)
+        return Response({"error": "Please provide tickers, or ticker1 and ticker2"}, status=400)
     
-    stock1 = get_object_or_404(Stock, ticker=t1)
-    stock2 = get_object_or_404(Stock, ticker=t2)
+    stocks = StockDetailView.queryset
+    stock1 = get_object_or_404(stocks, ticker=t1)
+    stock2 = get_object_or_404(stocks, ticker=t2)
     
     # Simple partial serializer just for basic comparison
     s1_data = StockDetailSerializer(stock1).data
@@ -85,24 +376,55 @@ def compare_stocks(request):
         "stock2": s2_data
     })
 
-from django.core.management import call_command
+# Each worker holds a database connection and a provider session for the whole job
+MAX_INGEST_WORKERS = 8
+MAX_INGEST_BATCH_SIZE = 50
 
-@api_view(['GET'])
+@api_view(['GET', 'POST'])
 def ingest_data_view(request):
     """
-    Trigger data ingestion manually via URL.
+    Queue a data ingestion job via URL and return its id straight away.
     This is a workaround for lack of Shell access on free hosting.
+    Query params: limit, offset (slice of the NIFTY 100 list), provider (settings.INGEST_HTTP_PROVIDERS),
+    workers, batch_size
     """
     try:
-        limit = request.query_params.get('limit')
-        offset = request.query_params.get('offset')
-        
-        kwargs = {}
-        if limit: kwargs['limit'] = int(limit)
-        if offset: kwargs['offset'] = int(offset)
-        
-        call_command('ingest_data', **kwargs)
-            
-        return Response({"status": f"Data ingestion complete. Processed batch starting at {offset or 0}."})
-    except Exception as e:
-        return Response({"error": str(e)}, status=500)
+        limit = int(request.query_params.get('limit') or 0)
+        offset = int(request.query_params.get('offset') or 0)
+        workers = int(request.query_params.get('workers') or 1)
+        batch_size = int(request.query_params.get('batch_size') or 1)
+    except ValueError:
+        return Response({"error": "limit, offset, workers and batch_size must be integers"}, status=400)
+    if limit < 0 or offset < 0:
+        return Response({"error": "limit and offset can't be negative"}, status=400)
+    if not 1 <= workers <= MAX_INGEST_WORKERS:
+        return Response({"error": f"workers must be between 1 and {MAX_INGEST_WORKERS}"}, status=400)
+    if not 1 <= batch_size <= MAX_INGEST_BATCH_SIZE:
+        return Response({"error": f"batch_size must be between 1 and {MAX_INGEST_BATCH_SIZE}"}, status=400)
+
+    provider = request.query_params.get('provider') or 'yahoo'
+    # The endpoint is open: the synthetic provider would write random walks over the real bars
+    # (and fire real alerts), it stays available to `manage.py ingest_data --provider fake`
+    if provider not in settings.INGEST_HTTP_PROVIDERS or provider not in PROVIDERS:
+        return Response({"error": f"Unknown provider '{provider}'"}, status=400)
+
+    tickers = NIFTY_100[offset : offset + limit] if limit else NIFTY_100[offset:]
+    job = enqueue_ingest(tickers, provider=provider, workers=workers, batch_size=batch_size)
+    start_embedded_worker()
+
+    return Response({
+        "status": f"Data ingestion queued. Batch starting at {offset}.",
+        "job_id": job.pk,
+        "status_url": reverse('ingest-job-status', kwargs={'job_id': job.pk}),
+    }, status=202)
+
+@api_view(['GET'])
+def ingest_job_status(request, job_id):
+    """Progress of a queued ingestion job."""
+    job = get_object_or_404(IngestJob, pk=job_id)
+    return Response(job_status(job))
+
+@api_view(['GET'])
+def perf_metrics(request):
+    """Per-route latency histograms and query totals of this worker process (see stocks/perf.py)."""
+    return Response(metrics.snapshot())
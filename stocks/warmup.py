@@ -0,0 +1,110 @@
+"""
+Boot-time warm-up.
+
+Builds the expensive process-wide structures before the first request instead
+of on it. marketsentry/asgi.py and wsgi.py call warm_up_on_boot() right after
+loading the application. Under gunicorn with preload_app (see gunicorn.conf.py)
+that happens once in the master, so forked workers share the result
+copy-on-write.
+
+Steps (settings.WARMUP_STEPS, in this order):
+
+* imports  - pandas / nltk / feedparser / yfinance, which the request path no
+             longer imports (only ingestion and news processing need them)
+* lexicon  - the VADER lexicon of the sentiment engine
+* scores   - HealthScore snapshots for stocks that have none yet, so no list
+             request falls back to live scoring
+* search   - the suggest index
+* rows     - the cached per-stock list rows, in the file cache shared with
+             the workers (settings.CACHE_DIR)
+
+imports and lexicon only pay off when shared by preloading, the default
+steps are the ones that also help a single process.
+"""
+import importlib
+import logging
+import time
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+HEAVY_MODULES = ('pandas', 'nltk', 'feedparser', 'yfinance')
+
+
+def warm_imports():
+    loaded = []
+    for name in HEAVY_MODULES:
+        try:
+            importlib.import_module(name)
+            loaded.append(name)
+        except ImportError:
+            pass
+    # And the modules of ours that pull them in
+    from . import ingestion, news  # noqa: F401
+    return loaded
+
+
+def warm_lexicon():
+    from .sentiment import engine
+    engine.analyzer
+    return f"{engine.load_seconds:.2f}s"
+
+
+def warm_scores():
+    from .models import Stock
+    from .utils import refresh_health_scores
+    missing = list(Stock.objects.filter(health__isnull=True).values_list('ticker', flat=True))
+    return refresh_health_scores(missing) if missing else 0
+
+
+def warm_search():
+    from .search import get_index
+    return len(get_index().entries)
+
+
+def warm_rows():
+    from .models import Stock
+    from .serializers import StockSerializer
+    return len(StockSerializer(Stock.objects.select_related('health').order_by('ticker'), many=True).data)
+
+
+STEPS = {
+    'imports': warm_imports,
+    'lexicon': warm_lexicon,
+    'scores': warm_scores,
+    'search': warm_search,
+    'rows': warm_rows,
+}
+# The steps without side effects: scores writes HealthScore / history / sector rows, rows fills the shared cache
+READ_ONLY_STEPS = ('imports', 'lexicon', 'search')
+
+
+def warm_up(steps=None):
+    """
+    Runs the steps (all of them if None) and returns {step: {'seconds', 'result'} or {'seconds', 'error'}}.
+    A failing step is reported, not raised: booting must never depend on the warm-up.
+    """
+    report = {}
+    for name in (steps if steps is not None else STEPS):
+        started = time.perf_counter()
+        try:
+            outcome = {'result': STEPS[name]()}
+        except Exception as e:
+            outcome = {'error': f"{type(e).__name__}: {e}"}
+        report[name] = {'seconds': round(time.perf_counter() - started, 3), **outcome}
+    return report
+
+
+def warm_up_on_boot():
+    steps = [step for step in settings.WARMUP_STEPS if step in STEPS]
+    if not steps:
+        return None
+    report = warm_up(steps)
+    # Forked workers must not inherit (and share) the master's database connections
+    connections.close_all()
+    logger.info("Warm-up: %s", ", ".join(
+        f"{name} {step['seconds']:.2f}s ({step.get('error') or step['result']})" for name, step in report.items()
+    ))
+    return report